@@ -0,0 +1,95 @@
+"""
+Caches em memória do processo, com limite de tamanho (LRU) e expiração (TTL).
+
+Cada worker do gunicorn/uvicorn tem os seus próprios caches: invalidações feitas
+em um worker não alcançam os outros, por isso todo cache aqui deve ter um TTL
+curto o bastante para que a defasagem entre workers seja aceitável.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_AUSENTE = object()
+
+# Todos os caches criados, por nome, para exposição de estatísticas
+caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Cache chave → valor com no máximo `maxsize` entradas, cada uma válida por `ttl`
+    segundos (ou pelo TTL informado em `set`). Seguro para uso entre threads.
+    """
+
+    def __init__(self, nome: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.nome = nome
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._dados: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[nome] = self
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                self.misses += 1
+                return default
+            expira_em, valor = item
+            if expira_em <= agora:
+                del self._dados[chave]
+                self.misses += 1
+                return default
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def __contains__(self, chave: Hashable) -> bool:
+        """Se `chave` tem entrada válida, sem contar hit/miss nem renovar a posição no LRU."""
+        with self._lock:
+            item = self._dados.get(chave, _AUSENTE)
+            return item is not _AUSENTE and item[0] > time.monotonic()
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None) -> None:
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira_em, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, chave: Hashable) -> None:
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+    def stats(self) -> dict:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "nome": self.nome,
+                "tamanho": len(self._dados),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / consultas) if consultas else 0.0,
+            }
+
+
+def estatisticas() -> list:
+    """Estatísticas de todos os caches deste processo."""
+    return [cache.stats() for cache in caches.values()]
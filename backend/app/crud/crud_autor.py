@@ -1,34 +1,63 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from .crud_livro import aplicar_limiar_similaridade, autores_ids_cache, filtro_texto, invalidar_livro_detalhe
 import logging
 
 logger = logging.getLogger(__name__)
 
 def get_autor(db: Session, autor_id: int):
-    logger.debug(f"Buscando autor com id: {autor_id}")
+    logger.debug("Buscando autor com id: %s", autor_id)
     autor = db.query(models.Autor).options(
         selectinload(models.Autor.livros)
     ).filter(models.Autor.id_autor == autor_id).first()
     if not autor:
-        logger.warning(f"Autor com id {autor_id} não encontrado.")
+        logger.warning("Autor com id %s não encontrado.", autor_id)
     return autor
 
-def get_autores(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando autores com skip: {skip}, limit: {limit}")
-    return db.query(models.Autor).options(
-        selectinload(models.Autor.livros)
-    ).offset(skip).limit(limit).all()
+def get_autores(db: Session, skip: int = 0, limit: int = 100, nome: str = None, similaridade: float = None):
+    """
+    Lista autores, opcionalmente filtrando por `nome` (substring ou, com `similaridade`,
+    tolerante a erros de digitação; ambos usam o índice de trigramas de autor.nome).
+    Na busca por similaridade os mais parecidos vêm primeiro.
+    """
+    logger.debug("Buscando autores com skip: %s, limit: %s, nome: %s, similaridade: %s", skip, limit, nome, similaridade)
+    query = db.query(models.Autor)
+    if nome:
+        if similaridade is not None:
+            aplicar_limiar_similaridade(db, similaridade)
+            query = query.order_by(func.word_similarity(nome, models.Autor.nome).desc(), models.Autor.id_autor)
+        query = query.filter(filtro_texto(models.Autor.nome, nome, similaridade))
+    return query.offset(skip).limit(limit).all()
 
 def create_autor(db: Session, autor: schemas.AutorCreate):
-    logger.info(f"Tentando criar autor: {autor.nome}")
+    logger.info("Tentando criar autor: %s", autor.nome)
     db_autor_check = db.query(models.Autor).filter(models.Autor.nome == autor.nome).first()
     if db_autor_check:
-        logger.warning(f"Autor com nome '{autor.nome}' já existe.")
+        logger.warning("Autor com nome '%s' já existe.", autor.nome)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Autor com este nome já existe.")
     db_autor = models.Autor(**autor.model_dump())
     db.add(db_autor)
     db.commit()
     db.refresh(db_autor)
-    logger.info(f"Autor '{db_autor.nome}' (ID: {db_autor.id_autor}) criado com sucesso.")
+    # O novo nome pode casar com termos já resolvidos no filtro de autor de livros
+    autores_ids_cache.clear()
+    logger.info("Autor '%s' (ID: %s) criado com sucesso.", db_autor.nome, db_autor.id_autor)
+    return db_autor
+
+def update_autor(db: Session, autor_id: int, autor_update: schemas.AutorCreate):
+    logger.info("Tentando atualizar autor com id: %s", autor_id)
+    db_autor = db.query(models.Autor).filter(models.Autor.id_autor == autor_id).first()
+    if not db_autor:
+        logger.warning("Autor com id %s não encontrado para atualização.", autor_id)
+        return None
+    for key, value in autor_update.model_dump(exclude_unset=True).items():
+        setattr(db_autor, key, value)
+    # Nome do autor aparece nos payloads dos seus livros e no filtro de autor
+    invalidar_livro_detalhe(db=db)
+    db.commit()
+    db.refresh(db_autor)
+    autores_ids_cache.clear()
+    logger.info("Autor ID %s atualizado com sucesso.", autor_id)
     return db_autor
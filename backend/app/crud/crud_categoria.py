@@ -1,46 +1,62 @@
 from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from .crud_livro import invalidar_livro_detalhe
 import logging
 
 logger = logging.getLogger(__name__)
 
 def get_categoria(db: Session, categoria_id: int):
-    logger.debug(f"Buscando categoria com id: {categoria_id}")
+    logger.debug("Buscando categoria com id: %s", categoria_id)
     categoria = db.query(models.Categoria).options(
         selectinload(models.Categoria.livros)
     ).filter(models.Categoria.id_categoria == categoria_id).first()
     if not categoria:
-        logger.warning(f"Categoria com id {categoria_id} não encontrada.")
+        logger.warning("Categoria com id %s não encontrada.", categoria_id)
     return categoria
 
 def get_categorias(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando categorias com skip: {skip}, limit: {limit}")
+    logger.debug("Buscando categorias com skip: %s, limit: %s", skip, limit)
     return db.query(models.Categoria).offset(skip).limit(limit).all()
 
 def create_categoria(db: Session, categoria: schemas.CategoriaCreate):
-    logger.info(f"Tentando criar categoria: {categoria.nome}")
+    logger.info("Tentando criar categoria: %s", categoria.nome)
     db_categoria_check = db.query(models.Categoria).filter(models.Categoria.nome == categoria.nome).first()
     if db_categoria_check:
-        logger.warning(f"Categoria com nome '{categoria.nome}' já existe.")
+        logger.warning("Categoria com nome '%s' já existe.", categoria.nome)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nome da categoria já existe")
     db_categoria = models.Categoria(nome=categoria.nome)
     db.add(db_categoria)
     db.commit()
     db.refresh(db_categoria)
-    logger.info(f"Categoria '{db_categoria.nome}' (ID: {db_categoria.id_categoria}) criada com sucesso.")
+    logger.info("Categoria '%s' (ID: %s) criada com sucesso.", db_categoria.nome, db_categoria.id_categoria)
     return db_categoria
 
 def delete_categoria(db: Session, categoria_id: int):
-    logger.info(f"Tentando excluir categoria com id: {categoria_id}")
+    logger.info("Tentando excluir categoria com id: %s", categoria_id)
     db_categoria = db.query(models.Categoria).options(selectinload(models.Categoria.livros)).filter(models.Categoria.id_categoria == categoria_id).first()
     if db_categoria:
         if db_categoria.livros:
-            logger.warning(f"Não é possível excluir a categoria ID {categoria_id} pois existem {len(db_categoria.livros)} livros associados.")
+            logger.warning("Não é possível excluir a categoria ID %s pois existem %s livros associados.", categoria_id, len(db_categoria.livros))
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não é possível excluir categoria pois existem livros associados a ela.")
         db.delete(db_categoria)
         db.commit()
-        logger.info(f"Categoria com id {categoria_id} excluída com sucesso.")
+        logger.info("Categoria com id %s excluída com sucesso.", categoria_id)
     else:
-        logger.warning(f"Categoria com id {categoria_id} não encontrada para exclusão.")
+        logger.warning("Categoria com id %s não encontrada para exclusão.", categoria_id)
+    return db_categoria
+
+def update_categoria(db: Session, categoria_id: int, categoria_update: schemas.CategoriaCreate):
+    logger.info("Tentando atualizar categoria com id: %s", categoria_id)
+    db_categoria = db.query(models.Categoria).filter(models.Categoria.id_categoria == categoria_id).first()
+    if not db_categoria:
+        logger.warning("Categoria com id %s não encontrada para atualização.", categoria_id)
+        return None
+    for key, value in categoria_update.model_dump(exclude_unset=True).items():
+        setattr(db_categoria, key, value)
+    # O nome da categoria faz parte do payload de cada livro dela
+    invalidar_livro_detalhe(db=db)
+    db.commit()
+    db.refresh(db_categoria)
+    logger.info("Categoria ID %s atualizada com sucesso.", categoria_id)
     return db_categoria
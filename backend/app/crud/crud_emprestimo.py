@@ -1,107 +1,195 @@
+from sqlalchemy import and_, case, exists, insert, literal, null, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from .crud_exemplar import definir_status_exemplar, status_apos_liberacao, travar_exemplar
 import logging
 
 logger = logging.getLogger(__name__)
 
 def get_emprestimo(db: Session, emprestimo_id: int):
-    logger.debug(f"Buscando empréstimo com id: {emprestimo_id}")
+    logger.debug("Buscando empréstimo com id: %s", emprestimo_id)
     emprestimo = db.query(models.Emprestimo).options(
         joinedload(models.Emprestimo.usuario),
         joinedload(models.Emprestimo.exemplar).joinedload(models.Exemplar.livro),
         joinedload(models.Emprestimo.funcionario_registro_emprestimo)
     ).filter(models.Emprestimo.id_emprestimo == emprestimo_id).first()
     if not emprestimo:
-        logger.warning(f"Empréstimo com id {emprestimo_id} não encontrado.")
+        logger.warning("Empréstimo com id %s não encontrado.", emprestimo_id)
     return emprestimo
 
 def get_emprestimos(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando empréstimos com skip: {skip}, limit: {limit}")
+    logger.debug("Buscando empréstimos com skip: %s, limit: %s", skip, limit)
     return db.query(models.Emprestimo).options(
         joinedload(models.Emprestimo.usuario),
         joinedload(models.Emprestimo.exemplar).joinedload(models.Exemplar.livro),
         joinedload(models.Emprestimo.funcionario_registro_emprestimo)
     ).order_by(models.Emprestimo.data_retirada.desc()).offset(skip).limit(limit).all()
 
+# Motivos de recusa de um empréstimo: código → (status HTTP, mensagem). O código volta ao
+# cliente no header X-Codigo-Rejeicao, para que o balcão trate cada caso sem comparar textos.
+REJEICOES_EMPRESTIMO = {
+    "exemplar_nao_encontrado": (status.HTTP_404_NOT_FOUND, "Exemplar com numero_tombo {numero_tombo} não encontrado."),
+    "livro_descatalogado": (status.HTTP_400_BAD_REQUEST, "Não é permitido emprestar exemplares de livros descatalogados."),
+    "reservado_outro_usuario": (status.HTTP_400_BAD_REQUEST, "Exemplar {numero_tombo} está reservado para outro usuário."),
+    "exemplar_indisponivel": (status.HTTP_400_BAD_REQUEST, "Exemplar {numero_tombo} não está disponível para empréstimo."),
+    "usuario_nao_encontrado": (status.HTTP_404_NOT_FOUND, "Usuário com id {id_usuario} não encontrado."),
+    "usuario_inativo": (status.HTTP_400_BAD_REQUEST, "Usuário com id {id_usuario} está inativo."),
+    "funcionario_nao_encontrado": (status.HTTP_404_NOT_FOUND, "Funcionário de registro com id {id_funcionario_registro} não encontrado."),
+    "funcionario_inativo": (status.HTTP_400_BAD_REQUEST, "Funcionário de registro com id {id_funcionario_registro} está inativo."),
+}
+
+def _select_checkout(emprestimo: schemas.EmprestimoCreate):
+    """
+    Valida e registra o empréstimo em um único comando (CTEs com INSERT/UPDATE):
+    trava o exemplar, confere livro, reserva, usuário e funcionário, e só então insere o
+    empréstimo, atende a reserva, marca o exemplar como emprestado e ajusta o contador do livro.
+    Devolve uma linha (codigo, id_emprestimo, id_livro); `codigo` é NULL quando o empréstimo foi criado.
+    """
+    E, L, U, F, R, EM = models.Exemplar, models.Livro, models.Usuario, models.Funcionario, models.Reserva, models.Emprestimo
+
+    ex = select(E.numero_tombo, E.status, E.id_livro, L.status_geral).join(
+        L, L.id_livro == E.id_livro, isouter=True
+    ).where(E.numero_tombo == emprestimo.numero_tombo).with_for_update(of=E).cte("ex")
+    usu = select(U.is_active).where(U.id_usuario == emprestimo.id_usuario).cte("usu")
+    fun = select(F.is_active).where(F.id_funcionario == emprestimo.id_funcionario_registro).cte("fun")
+    res = select(R.id_reserva).where(
+        R.numero_tombo == emprestimo.numero_tombo,
+        R.id_usuario == emprestimo.id_usuario,
+        R.status == "ativa"
+    ).limit(1).cte("res")
+
+    status_ex = select(ex.c.status).scalar_subquery()
+    codigo = case(
+        (~exists(select(ex.c.numero_tombo)), "exemplar_nao_encontrado"),
+        (select(ex.c.status_geral).scalar_subquery() == "descatalogado", "livro_descatalogado"),
+        (and_(status_ex == "reservado", ~exists(select(res.c.id_reserva))), "reservado_outro_usuario"),
+        (status_ex.not_in(("disponivel", "reservado")), "exemplar_indisponivel"),
+        (~exists(select(usu.c.is_active)), "usuario_nao_encontrado"),
+        (~select(usu.c.is_active).scalar_subquery(), "usuario_inativo"),
+        (~exists(select(fun.c.is_active)), "funcionario_nao_encontrado"),
+        (~select(fun.c.is_active).scalar_subquery(), "funcionario_inativo"),
+        else_=null()
+    )
+    validacao = select(codigo.label("codigo")).cte("validacao")
+
+    # O checkout sempre abre um empréstimo ativo: status e devolução enviados pelo cliente são ignorados
+    dados = {**emprestimo.model_dump(), "status_emprestimo": "ativo", "data_efetiva_devolucao": None}
+    colunas = list(dados)
+    novo = insert(EM).from_select(
+        colunas,
+        select(*(literal(dados[c], EM.__table__.c[c].type) for c in colunas)).where(
+            select(validacao.c.codigo).scalar_subquery().is_(None)
+        )
+    ).returning(EM.id_emprestimo).cte("novo")
+    criado = exists(select(novo.c.id_emprestimo))
+
+    reserva_atendida = update(R).where(
+        R.id_reserva.in_(select(res.c.id_reserva)), status_ex == "reservado", criado
+    ).values(status="atendida").returning(R.id_reserva).cte("reserva_atendida")
+    exemplar_emprestado = update(E).where(
+        E.numero_tombo == emprestimo.numero_tombo, criado
+    ).values(status="emprestado").returning(E.numero_tombo).cte("exemplar_emprestado")
+    contador = update(L).where(
+        L.id_livro == select(ex.c.id_livro).scalar_subquery(), status_ex == "disponivel", criado
+    ).values(exemplares_disponiveis=L.exemplares_disponiveis - 1).returning(L.id_livro).cte("contador")
+
+    return select(
+        validacao.c.codigo,
+        select(novo.c.id_emprestimo).scalar_subquery().label("id_emprestimo"),
+        select(ex.c.id_livro).scalar_subquery().label("id_livro"),
+    ).add_cte(reserva_atendida, exemplar_emprestado, contador)
+
 def create_emprestimo(db: Session, emprestimo: schemas.EmprestimoCreate):
-    logger.info(f"Tentando criar empréstimo para exemplar numero_tombo {emprestimo.numero_tombo} por usuário ID {emprestimo.id_usuario}")
-    db_exemplar = db.query(models.Exemplar).filter(models.Exemplar.numero_tombo == emprestimo.numero_tombo).first()
-    if not db_exemplar:
-        logger.error(f"Exemplar com numero_tombo {emprestimo.numero_tombo} não encontrado ao criar empréstimo.")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Exemplar com numero_tombo {emprestimo.numero_tombo} não encontrado.")
-    if db_exemplar.livro and db_exemplar.livro.status_geral == "descatalogado":
-        logger.warning(f"Tentativa de empréstimo de exemplar {emprestimo.numero_tombo} de livro descatalogado.")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não é permitido emprestar exemplares de livros descatalogados.")
-    # Permitir empréstimo se status for 'disponivel' OU (status 'reservado' e reserva ativa para este usuário)
-    if db_exemplar.status == "reservado":
-        reserva_ativa = db.query(models.Reserva).filter(
-            models.Reserva.numero_tombo == emprestimo.numero_tombo,
-            models.Reserva.id_usuario == emprestimo.id_usuario,
-            models.Reserva.status == "ativa"
-        ).first()
-        if not reserva_ativa:
-            logger.warning(f"Exemplar {emprestimo.numero_tombo} está reservado, mas não para este usuário.")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar {emprestimo.numero_tombo} está reservado para outro usuário.")
-        # Atualiza reserva para atendida
-        reserva_ativa.status = "atendida"
-        db.add(reserva_ativa)
-    elif db_exemplar.status != "disponivel":
-        logger.warning(f"Exemplar {emprestimo.numero_tombo} não está disponível (status: {db_exemplar.status}).")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar {emprestimo.numero_tombo} não está disponível para empréstimo.")
-    db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == emprestimo.id_usuario).first()
-    if not db_usuario:
-        logger.error(f"Usuário com id {emprestimo.id_usuario} não encontrado ao criar empréstimo.")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Usuário com id {emprestimo.id_usuario} não encontrado.")
-    if not db_usuario.is_active:
-        logger.warning(f"Usuário com id {emprestimo.id_usuario} está inativo.")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Usuário com id {emprestimo.id_usuario} está inativo.")
-    db_funcionario = db.query(models.Funcionario).filter(models.Funcionario.id_funcionario == emprestimo.id_funcionario_registro).first()
-    if not db_funcionario:
-        logger.error(f"Funcionário de registro com id {emprestimo.id_funcionario_registro} não encontrado ao criar empréstimo.")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Funcionário de registro com id {emprestimo.id_funcionario_registro} não encontrado.")
-    if not db_funcionario.is_active:
-        logger.warning(f"Funcionário de registro com id {emprestimo.id_funcionario_registro} está inativo.")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Funcionário de registro com id {emprestimo.id_funcionario_registro} está inativo.")
-    db_emprestimo = models.Emprestimo(**emprestimo.model_dump())
-    db.add(db_emprestimo)
+    logger.info("Tentando criar empréstimo para exemplar numero_tombo %s por usuário ID %s", emprestimo.numero_tombo, emprestimo.id_usuario)
+    # Permitido se o exemplar estiver 'disponivel' OU 'reservado' com reserva ativa para este usuário
+    # O comando trava o exemplar (FOR UPDATE): checkouts simultâneos do mesmo exemplar são
+    # serializados e o segundo vê o status já 'emprestado'
+    try:
+        resultado = db.execute(_select_checkout(emprestimo)).one()
+        codigo = resultado.codigo
+    except IntegrityError:
+        # uq_emprestimo_ativo_exemplar: segunda linha de defesa contra empréstimo duplo
+        codigo = "exemplar_indisponivel"
+    if codigo is not None:
+        db.rollback()
+        status_code, mensagem = REJEICOES_EMPRESTIMO[codigo]
+        detalhe = mensagem.format(**emprestimo.model_dump())
+        logger.warning("Empréstimo do exemplar %s para usuário ID %s recusado (%s): %s", emprestimo.numero_tombo, emprestimo.id_usuario, codigo, detalhe)
+        raise HTTPException(status_code=status_code, detail=detalhe, headers={"X-Codigo-Rejeicao": codigo})
     db.commit()
-    db.refresh(db_emprestimo)
-    logger.info(f"Empréstimo ID {db_emprestimo.id_emprestimo} criado com sucesso. Exemplar Nº Tombo {db_exemplar.numero_tombo} status atualizado.")
+    db_emprestimo = get_emprestimo(db, resultado.id_emprestimo)
+    logger.info("Empréstimo ID %s criado com sucesso. Exemplar Nº Tombo %s status atualizado.", db_emprestimo.id_emprestimo, emprestimo.numero_tombo)
     return db_emprestimo
 
+async def create_emprestimo_async(db: AsyncSession, emprestimo: schemas.EmprestimoCreate):
+    """
+    Versão async de `create_emprestimo` (run_sync na conexão async). Devolve o EmprestimoRead
+    já serializado, pois os relacionamentos só podem ser carregados dentro do run_sync.
+    """
+    def _criar(sync_db: Session):
+        return schemas.EmprestimoRead.model_validate(create_emprestimo(sync_db, emprestimo))
+    return await db.run_sync(_criar)
+
 def get_emprestimos_by_usuario_id(db: Session, usuario_id: int, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando empréstimos para o usuário ID {usuario_id}, skip: {skip}, limit: {limit}")
+    logger.debug("Buscando empréstimos para o usuário ID %s, skip: %s, limit: %s", usuario_id, skip, limit)
     return db.query(models.Emprestimo).filter(models.Emprestimo.id_usuario == usuario_id).options(
         joinedload(models.Emprestimo.usuario),
         joinedload(models.Emprestimo.exemplar).joinedload(models.Exemplar.livro),
         joinedload(models.Emprestimo.funcionario_registro_emprestimo)
     ).order_by(models.Emprestimo.data_retirada.desc()).offset(skip).limit(limit).all()
 
+async def get_emprestimos_by_usuario_id_async(db: AsyncSession, usuario_id: int, skip: int = 0, limit: int = 100):
+    logger.debug("Buscando empréstimos (async) para o usuário ID %s, skip: %s, limit: %s", usuario_id, skip, limit)
+    result = await db.execute(
+        select(models.Emprestimo).where(models.Emprestimo.id_usuario == usuario_id).options(
+            joinedload(models.Emprestimo.usuario),
+            joinedload(models.Emprestimo.exemplar).joinedload(models.Exemplar.livro),
+            joinedload(models.Emprestimo.funcionario_registro_emprestimo)
+        ).order_by(models.Emprestimo.data_retirada.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
 def delete_emprestimo(db: Session, emprestimo_id: int):
-    logger.info(f"Tentando excluir empréstimo com id: {emprestimo_id}")
+    logger.info("Tentando excluir empréstimo com id: %s", emprestimo_id)
     db_emprestimo = db.query(models.Emprestimo).options(
         selectinload(models.Emprestimo.penalidades_associadas)
     ).filter(models.Emprestimo.id_emprestimo == emprestimo_id).first()
     if not db_emprestimo:
-        logger.warning(f"Empréstimo com id {emprestimo_id} não encontrado para exclusão.")
+        logger.warning("Empréstimo com id %s não encontrado para exclusão.", emprestimo_id)
         return None
     if db_emprestimo.status_emprestimo == "ativo":
-        logger.warning(f"Empréstimo ID {emprestimo_id} está ativo. Exclusão não permitida.")
+        logger.warning("Empréstimo ID %s está ativo. Exclusão não permitida.", emprestimo_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empréstimo ativo não pode ser excluído. Registre a devolução primeiro.")
     if db_emprestimo.penalidades_associadas:
-        logger.warning(f"Empréstimo ID {emprestimo_id} possui penalidades associadas. Exclusão não permitida.")
+        logger.warning("Empréstimo ID %s possui penalidades associadas. Exclusão não permitida.", emprestimo_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empréstimo possui penalidades associadas e não pode ser excluído.")
     db.delete(db_emprestimo)
     db.commit()
-    logger.info(f"Empréstimo com id {emprestimo_id} excluído com sucesso.")
+    logger.info("Empréstimo com id %s excluído com sucesso.", emprestimo_id)
     return db_emprestimo
 
-def marcar_emprestimo_como_devolvido(db: Session, id_emprestimo: int):
-    emprestimo = db.query(models.Emprestimo).filter(models.Emprestimo.id_emprestimo == id_emprestimo).first()
-    if not emprestimo:
-        raise HTTPException(status_code=404, detail="Empréstimo não encontrado")
-    emprestimo.status = "devolvido"
+def cancelar_emprestimo(db: Session, emprestimo_id: int):
+    logger.info("Tentando cancelar empréstimo com id: %s", emprestimo_id)
+    travar_exemplar(db, id_emprestimo=emprestimo_id)
+    db_emprestimo = db.query(models.Emprestimo).populate_existing().filter(
+        models.Emprestimo.id_emprestimo == emprestimo_id
+    ).with_for_update().first()
+    if not db_emprestimo:
+        logger.warning("Empréstimo ID %s não encontrado para cancelamento.", emprestimo_id)
+        return None
+    if db_emprestimo.status_emprestimo == "devolvido":
+        logger.warning("Empréstimo ID %s já devolvido, não pode ser cancelado.", emprestimo_id)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empréstimo já devolvido não pode ser cancelado.")
+    estava_ativo = db_emprestimo.status_emprestimo == "ativo"
+    db_emprestimo.status_emprestimo = "cancelado"
+    db.add(db_emprestimo)
+    db_exemplar = db_emprestimo.exemplar
+    if estava_ativo and db_exemplar and db_exemplar.status == "emprestado":
+        definir_status_exemplar(db, db_exemplar, status_apos_liberacao(db, db_exemplar.numero_tombo))
     db.commit()
-    db.refresh(emprestimo)
-    return emprestimo
+    db.refresh(db_emprestimo)
+    logger.info("Empréstimo ID %s marcado como cancelado.", emprestimo_id)
+    return db_emprestimo
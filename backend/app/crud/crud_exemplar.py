@@ -1,45 +1,289 @@
+from sqlalchemy import event, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from ..schemas_extra import ExemplarWithDevolucao
+from ..cache import TTLCache
+from .crud_livro import ajustar_contadores_exemplares, invalidar_livro_detalhe
+from collections import defaultdict
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Status controlados pela circulação (empréstimos e reservas), nunca definidos manualmente
+STATUS_CIRCULACAO = ("emprestado", "reservado")
+
+# Leituras do balcão por código de barras: codigo_identificacao → ExemplarWithDevolucao
+# serializado. Do cache só se aproveitam os campos estáveis (livro, tombo, dados do
+# exemplar): status e data prevista de devolução são relidos do banco a cada leitura,
+# porque o cache é por worker e a circulação pode ter mudado em outro. Invalidado quando
+# o próprio exemplar é editado ou removido; dados do livro (título etc.) dependem do TTL.
+exemplar_codigo_cache = TTLCache(
+    "exemplar_por_codigo",
+    maxsize=int(os.getenv("EXEMPLAR_CODIGO_CACHE_MAX", "4096")),
+    ttl=float(os.getenv("EXEMPLAR_CODIGO_CACHE_TTL", "60")),
+)
+
+def invalidar_exemplar_codigo(codigo: str, db: Session = None):
+    """Remove o exemplar do cache por código; com `db`, invalida de novo no commit (ver invalidar_livro_detalhe)."""
+    exemplar_codigo_cache.invalidate(codigo)
+    if db is not None:
+        db.info.setdefault("codigos_invalidados", set()).add(codigo)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_codigos_apos_commit(session):
+    for codigo in session.info.pop("codigos_invalidados", ()):
+        exemplar_codigo_cache.invalidate(codigo)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_codigos_invalidados(session):
+    session.info.pop("codigos_invalidados", None)
+
+def definir_status_exemplar(db: Session, db_exemplar: models.Exemplar, novo_status: str):
+    """
+    Grava o novo status do exemplar e ajusta exemplares_disponiveis do livro, sem commit.
+    Todas as mudanças de status passam por aqui para manter os contadores consistentes.
+    """
+    definir_status_exemplares(db, [(db_exemplar, novo_status)])
+
+def definir_status_exemplares(db: Session, mudancas):
+    """
+    Versão em lote de `definir_status_exemplar` para pares (exemplar, novo_status):
+    os deltas são somados por livro, com um UPDATE de contadores por livro afetado.
+    """
+    deltas = defaultdict(int)
+    for db_exemplar, novo_status in mudancas:
+        status_anterior = db_exemplar.status
+        if status_anterior == novo_status:
+            continue
+        db_exemplar.status = novo_status
+        db.add(db_exemplar)
+        deltas[db_exemplar.id_livro] += (novo_status == "disponivel") - (status_anterior == "disponivel")
+        logger.debug("Exemplar %s: status '%s' -> '%s'.", db_exemplar.numero_tombo, status_anterior, novo_status)
+    for id_livro, delta in deltas.items():
+        ajustar_contadores_exemplares(db, id_livro, delta_disponiveis=delta)
+
+def travar_exemplar(db: Session, numero_tombo: int = None, id_emprestimo: int = None):
+    """
+    SELECT ... FOR UPDATE do exemplar (pelo numero_tombo ou pelo empréstimo), recarregando o objeto
+    da sessão com a versão travada. Toda operação de circulação trava primeiro o exemplar e só
+    depois empréstimos/reservas dele: a ordem única evita deadlocks entre workers, e duas
+    operações sobre o mesmo exemplar ficam serializadas sem bloquear os demais.
+    """
+    query = db.query(models.Exemplar).populate_existing().with_for_update()
+    if id_emprestimo is not None:
+        tombo = select(models.Emprestimo.numero_tombo).where(models.Emprestimo.id_emprestimo == id_emprestimo).scalar_subquery()
+        return query.filter(models.Exemplar.numero_tombo == tombo).first()
+    return query.filter(models.Exemplar.numero_tombo == numero_tombo).first()
+
+def status_apos_liberacao(db: Session, numero_tombo: int) -> str:
+    """Status de um exemplar que deixou de estar emprestado/reservado: 'reservado' se ainda houver reserva ativa."""
+    # A sessão não faz autoflush: grava antes as mudanças pendentes (ex.: a reserva recém-cancelada)
+    db.flush()
+    reserva_ativa = db.query(exists().where(
+        models.Reserva.numero_tombo == numero_tombo,
+        models.Reserva.status == "ativa"
+    )).scalar()
+    return "reservado" if reserva_ativa else "disponivel"
+
 def get_exemplar(db: Session, numero_tombo: int):
-    logger.debug(f"Buscando exemplar com numero_tombo: {numero_tombo}")
+    logger.debug("Buscando exemplar com numero_tombo: %s", numero_tombo)
     exemplar = db.query(models.Exemplar).options(
         joinedload(models.Exemplar.livro).joinedload(models.Livro.categoria),
         joinedload(models.Exemplar.livro).selectinload(models.Livro.autores)
     ).filter(models.Exemplar.numero_tombo == numero_tombo).first()
     if not exemplar:
-        logger.warning(f"Exemplar com numero_tombo {numero_tombo} não encontrado.")
+        logger.warning("Exemplar com numero_tombo %s não encontrado.", numero_tombo)
     return exemplar
 
-def get_exemplares_por_livro(db: Session, livro_id: int, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando exemplares para o livro ID {livro_id}, skip: {skip}, limit: {limit}")
-    return db.query(models.Exemplar)\
-        .filter(models.Exemplar.id_livro == livro_id)\
-        .offset(skip).limit(limit).all()
+def get_exemplares_por_livro(db: Session, livro_id: int, skip: int = 0, limit: int = 100, status_exemplar: str = None):
+    logger.debug("Buscando exemplares para o livro ID %s, status: %s, skip: %s, limit: %s", livro_id, status_exemplar, skip, limit)
+    query = db.query(models.Exemplar).filter(models.Exemplar.id_livro == livro_id)
+    if status_exemplar:
+        # Atendido por idx_exemplar_livro_status (id_livro, status)
+        query = query.filter(models.Exemplar.status == status_exemplar)
+    return query.order_by(models.Exemplar.numero_tombo).offset(skip).limit(limit).all()
 
 def get_exemplares(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando exemplares com skip: {skip}, limit: {limit}")
+    logger.debug("Buscando exemplares com skip: %s, limit: %s", skip, limit)
     return db.query(models.Exemplar).options(
         joinedload(models.Exemplar.livro)
     ).offset(skip).limit(limit).all()
 
+def get_exemplares_com_devolucao(db: Session, skip: int = 0, limit: int = 100, livro_id: int = None, status_exemplar: str = None):
+    """
+    Página de exemplares com a data prevista de devolução do empréstimo ativo de cada um,
+    em uma única consulta: a página de exemplares (CTE) é limitada primeiro e o empréstimo ativo
+    vem de um DISTINCT ON (numero_tombo) restrito a ela (idx_emprestimo_ativo_tombo).
+    Com limit=None retorna todos os exemplares do filtro.
+    """
+    logger.debug("Buscando exemplares com devolução: livro ID %s, status: %s, skip: %s, limit: %s", livro_id, status_exemplar, skip, limit)
+    rows = db.execute(_select_exemplares_com_devolucao(skip, limit, livro_id, status_exemplar)).all()
+    return _serializar_exemplares_com_devolucao(rows)
+
+async def get_exemplares_com_devolucao_async(db: AsyncSession, skip: int = 0, limit: int = 100, livro_id: int = None, status_exemplar: str = None):
+    logger.debug("Buscando exemplares com devolução (async): livro ID %s, status: %s, skip: %s, limit: %s", livro_id, status_exemplar, skip, limit)
+    rows = (await db.execute(_select_exemplares_com_devolucao(skip, limit, livro_id, status_exemplar))).all()
+    return _serializar_exemplares_com_devolucao(rows)
+
+async def get_exemplares_por_codigos_async(db: AsyncSession, codigos):
+    """
+    Exemplares (com livro e data prevista de devolução) pelos códigos de barras. Os dados
+    estáveis vêm do cache quando possível; status e devolução vêm sempre de uma consulta
+    leve pelo índice único de codigo_identificacao, e só os códigos fora do cache carregam
+    o exemplar com o livro. Devolve um dict código → payload, só com os códigos encontrados.
+    """
+    encontrados, faltantes = {}, []
+    for codigo in dict.fromkeys(codigos):
+        payload = exemplar_codigo_cache.get(codigo)
+        if payload is not None:
+            encontrados[codigo] = payload
+        else:
+            faltantes.append(codigo)
+    if encontrados:
+        circulacao = {
+            codigo: (status_atual, data_prevista_devolucao)
+            for codigo, status_atual, data_prevista_devolucao in (await db.execute(_select_circulacao_por_codigos(list(encontrados)))).all()
+        }
+        for codigo in list(encontrados):
+            if codigo not in circulacao:
+                # Removido (ou recodificado) por outro worker desde que entrou no cache
+                exemplar_codigo_cache.invalidate(codigo)
+                del encontrados[codigo]
+                continue
+            status_atual, data_prevista_devolucao = circulacao[codigo]
+            encontrados[codigo] = {**encontrados[codigo], "status": status_atual, "data_prevista_devolucao": data_prevista_devolucao}
+    if faltantes:
+        logger.debug("Buscando %s exemplares por código fora do cache.", len(faltantes))
+        rows = (await db.execute(_select_exemplares_com_devolucao(0, None, codigos=faltantes))).all()
+        for payload in _serializar_exemplares_com_devolucao(rows):
+            exemplar_codigo_cache.set(payload["codigo_identificacao"], payload)
+            encontrados[payload["codigo_identificacao"]] = payload
+    return encontrados
+
+def _select_circulacao_por_codigos(codigos):
+    # Mesma data da subconsulta emprestimo_ativo abaixo: a maior entre os empréstimos ativos
+    data_prevista_devolucao = (
+        select(func.max(models.Emprestimo.data_prevista_devolucao))
+        .where(
+            models.Emprestimo.numero_tombo == models.Exemplar.numero_tombo,
+            models.Emprestimo.status_emprestimo == "ativo",
+        )
+        .scalar_subquery()
+    )
+    return select(models.Exemplar.codigo_identificacao, models.Exemplar.status, data_prevista_devolucao)\
+        .where(models.Exemplar.codigo_identificacao.in_(codigos))
+
+def _select_exemplares_com_devolucao(skip: int, limit: int, livro_id: int = None, status_exemplar: str = None, codigos=None):
+    pagina = select(models.Exemplar.numero_tombo)
+    if codigos is not None:
+        pagina = pagina.where(models.Exemplar.codigo_identificacao.in_(codigos))
+    if livro_id is not None:
+        pagina = pagina.where(models.Exemplar.id_livro == livro_id)
+    if status_exemplar:
+        pagina = pagina.where(models.Exemplar.status == status_exemplar)
+    pagina = pagina.order_by(models.Exemplar.numero_tombo).offset(skip).limit(limit).cte("pagina")
+    emprestimo_ativo = (
+        select(models.Emprestimo.numero_tombo, models.Emprestimo.data_prevista_devolucao)
+        .join(pagina, pagina.c.numero_tombo == models.Emprestimo.numero_tombo)
+        .where(models.Emprestimo.status_emprestimo == "ativo")
+        .distinct(models.Emprestimo.numero_tombo)
+        .order_by(models.Emprestimo.numero_tombo, models.Emprestimo.data_prevista_devolucao.desc())
+        .subquery("emprestimo_ativo")
+    )
+    return select(models.Exemplar, emprestimo_ativo.c.data_prevista_devolucao)\
+        .join(pagina, pagina.c.numero_tombo == models.Exemplar.numero_tombo)\
+        .outerjoin(emprestimo_ativo, emprestimo_ativo.c.numero_tombo == models.Exemplar.numero_tombo)\
+        .options(joinedload(models.Exemplar.livro))\
+        .order_by(models.Exemplar.numero_tombo)
+
+def _serializar_exemplares_com_devolucao(rows):
+    exemplares = []
+    for exemplar, data_prevista_devolucao in rows:
+        ex_dict = ExemplarWithDevolucao.model_validate(exemplar).model_dump()
+        ex_dict["data_prevista_devolucao"] = data_prevista_devolucao
+        exemplares.append(ex_dict)
+    return exemplares
+
 def create_exemplar(db: Session, exemplar: schemas.ExemplarCreate):
-    logger.info(f"Tentando criar exemplar com código: {exemplar.codigo_identificacao} para o livro ID: {exemplar.id_livro}")
+    logger.info("Tentando criar exemplar com código: %s para o livro ID: %s", exemplar.codigo_identificacao, exemplar.id_livro)
     db_livro = db.query(models.Livro).filter(models.Livro.id_livro == exemplar.id_livro).first()
     if not db_livro:
-        logger.error(f"Livro com id {exemplar.id_livro} não encontrado ao tentar criar exemplar {exemplar.codigo_identificacao}.")
+        logger.error("Livro com id %s não encontrado ao tentar criar exemplar %s.", exemplar.id_livro, exemplar.codigo_identificacao)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Livro com id {exemplar.id_livro} não encontrado.")
     db_exemplar_check = db.query(models.Exemplar).filter(models.Exemplar.codigo_identificacao == exemplar.codigo_identificacao).first()
     if db_exemplar_check:
-        logger.warning(f"Exemplar com código de identificação {exemplar.codigo_identificacao} já existe.")
+        logger.warning("Exemplar com código de identificação %s já existe.", exemplar.codigo_identificacao)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar com código de identificação {exemplar.codigo_identificacao} já existe.")
+    if exemplar.status in STATUS_CIRCULACAO:
+        logger.warning("Tentativa de criar exemplar %s com status de circulação '%s'.", exemplar.codigo_identificacao, exemplar.status)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Status '{exemplar.status}' é definido por empréstimos e reservas.")
     db_exemplar = models.Exemplar(**exemplar.model_dump())
     db.add(db_exemplar)
+    ajustar_contadores_exemplares(
+        db, exemplar.id_livro, delta_total=1, delta_disponiveis=1 if exemplar.status == "disponivel" else 0
+    )
     db.commit()
     db.refresh(db_exemplar)
-    logger.info(f"Exemplar '{db_exemplar.codigo_identificacao}' (numero_tombo: {db_exemplar.numero_tombo}) criado com sucesso.")
+    logger.info("Exemplar '%s' (numero_tombo: %s) criado com sucesso.", db_exemplar.codigo_identificacao, db_exemplar.numero_tombo)
     return db_exemplar
+
+def update_exemplar(db: Session, exemplar_id: int, exemplar_update: schemas.ExemplarUpdate):
+    logger.info("Tentando atualizar exemplar com numero_tombo: %s", exemplar_id)
+    exemplar = get_exemplar(db, exemplar_id)
+    if not exemplar:
+        logger.warning("Exemplar com numero_tombo %s não encontrado para atualização.", exemplar_id)
+        return None
+    invalidar_exemplar_codigo(exemplar.codigo_identificacao, db)
+    dados = exemplar_update.model_dump(exclude_unset=True)
+    novo_status = dados.pop("status", None)
+    novo_id_livro = dados.pop("id_livro", None)
+    if novo_status is not None and novo_status != exemplar.status:
+        if novo_status in STATUS_CIRCULACAO or exemplar.status in STATUS_CIRCULACAO:
+            logger.warning("Tentativa de alterar manualmente o status de circulação do exemplar %s (%s -> %s).", exemplar_id, exemplar.status, novo_status)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Status 'emprestado' e 'reservado' são controlados por empréstimos e reservas.")
+    # Impede deixar disponível exemplar de livro descatalogado; nesse caso o status é forçado para 'descartado'
+    db_livro = exemplar.livro
+    if db_livro and db_livro.status_geral == "descatalogado":
+        if novo_status == "disponivel":
+            logger.warning("Tentativa de atualizar exemplar para disponível em livro descatalogado (ID: %s).", db_livro.id_livro)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não é permitido deixar exemplar disponível para livro descatalogado.")
+        if exemplar.status not in STATUS_CIRCULACAO:
+            novo_status = "descartado"
+    if novo_id_livro is not None and novo_id_livro != exemplar.id_livro:
+        if not db.query(models.Livro.id_livro).filter(models.Livro.id_livro == novo_id_livro).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Livro com id {novo_id_livro} não encontrado.")
+        disponivel = 1 if exemplar.status == "disponivel" else 0
+        ajustar_contadores_exemplares(db, exemplar.id_livro, delta_total=-1, delta_disponiveis=-disponivel)
+        ajustar_contadores_exemplares(db, novo_id_livro, delta_total=1, delta_disponiveis=disponivel)
+        exemplar.id_livro = novo_id_livro
+    if novo_status is not None:
+        definir_status_exemplar(db, exemplar, novo_status)
+    for key, value in dados.items():
+        setattr(exemplar, key, value)
+    invalidar_exemplar_codigo(exemplar.codigo_identificacao, db)
+    invalidar_livro_detalhe(exemplar.id_livro, db)
+    db.commit()
+    db.refresh(exemplar)
+    logger.info("Exemplar numero_tombo %s atualizado com sucesso.", exemplar_id)
+    return exemplar
+
+def delete_exemplar(db: Session, exemplar_id: int):
+    logger.info("Tentando excluir exemplar com numero_tombo: %s", exemplar_id)
+    exemplar = get_exemplar(db, exemplar_id)
+    if not exemplar:
+        logger.warning("Exemplar com numero_tombo %s não encontrado para exclusão.", exemplar_id)
+        return None
+    if exemplar.status == "emprestado":
+        logger.warning("Exemplar %s está emprestado. Exclusão não permitida.", exemplar_id)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Exemplar emprestado não pode ser excluído.")
+    ajustar_contadores_exemplares(
+        db, exemplar.id_livro, delta_total=-1, delta_disponiveis=-1 if exemplar.status == "disponivel" else 0
+    )
+    invalidar_exemplar_codigo(exemplar.codigo_identificacao, db)
+    db.delete(exemplar)
+    db.commit()
+    logger.info("Exemplar com numero_tombo %s excluído com sucesso.", exemplar_id)
+    return exemplar
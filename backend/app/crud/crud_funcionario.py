@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas, security
@@ -8,22 +10,28 @@ logger = logging.getLogger(__name__)
 def get_funcionario_by_matricula_funcional(db: Session, matricula_funcional: str):
     return db.query(models.Funcionario).filter(models.Funcionario.matricula_funcional == matricula_funcional).first()
 
+async def get_funcionario_by_matricula_funcional_async(db: AsyncSession, matricula_funcional: str):
+    result = await db.execute(
+        select(models.Funcionario).where(models.Funcionario.matricula_funcional == matricula_funcional)
+    )
+    return result.scalars().first()
+
 def get_funcionario(db: Session, funcionario_id: int):
-    logger.debug(f"Buscando funcionário com id: {funcionario_id}")
+    logger.debug("Buscando funcionário com id: %s", funcionario_id)
     funcionario = db.query(models.Funcionario).filter(models.Funcionario.id_funcionario == funcionario_id).first()
     if not funcionario:
-        logger.warning(f"Funcionário com id {funcionario_id} não encontrado.")
+        logger.warning("Funcionário com id %s não encontrado.", funcionario_id)
     return funcionario
 
 def get_funcionarios(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando funcionários com skip: {skip}, limit: {limit}")
+    logger.debug("Buscando funcionários com skip: %s, limit: %s", skip, limit)
     return db.query(models.Funcionario).offset(skip).limit(limit).all()
 
 def create_funcionario(db: Session, funcionario: schemas.FuncionarioCreate):
-    logger.info(f"Tentando criar funcionário com matrícula funcional: {funcionario.matricula_funcional}")
+    logger.info("Tentando criar funcionário com matrícula funcional: %s", funcionario.matricula_funcional)
     db_funcionario_check = get_funcionario_by_matricula_funcional(db, matricula_funcional=funcionario.matricula_funcional)
     if db_funcionario_check:
-        logger.warning(f"Funcionário com matrícula funcional {funcionario.matricula_funcional} já existe.")
+        logger.warning("Funcionário com matrícula funcional %s já existe.", funcionario.matricula_funcional)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Funcionário com matrícula funcional {funcionario.matricula_funcional} já existe.")
     hashed_password = security.get_password_hash(funcionario.password)
     db_funcionario_data = funcionario.model_dump(exclude={"password"})
@@ -31,48 +39,52 @@ def create_funcionario(db: Session, funcionario: schemas.FuncionarioCreate):
     db.add(db_funcionario)
     db.commit()
     db.refresh(db_funcionario)
-    logger.info(f"Funcionário '{db_funcionario.nome}' (ID: {db_funcionario.id_funcionario}, Matrícula: {db_funcionario.matricula_funcional}) criado com sucesso.")
+    logger.info("Funcionário '%s' (ID: %s, Matrícula: %s) criado com sucesso.", db_funcionario.nome, db_funcionario.id_funcionario, db_funcionario.matricula_funcional)
     return db_funcionario
 
 def update_funcionario(db: Session, funcionario_id: int, funcionario_update: schemas.FuncionarioUpdate):
-    logger.info(f"Tentando atualizar funcionário com ID: {funcionario_id}")
+    logger.info("Tentando atualizar funcionário com ID: %s", funcionario_id)
     db_funcionario = get_funcionario(db, funcionario_id)
     if not db_funcionario:
-        logger.warning(f"Funcionário com ID {funcionario_id} não encontrado para atualização.")
+        logger.warning("Funcionário com ID %s não encontrado para atualização.", funcionario_id)
         return None
+    matricula_anterior = db_funcionario.matricula_funcional
     update_data = funcionario_update.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]:
         hashed_password = security.get_password_hash(update_data["password"])
         db_funcionario.hashed_password = hashed_password
         del update_data["password"]
-        logger.info(f"Senha do funcionário ID {funcionario_id} atualizada.")
+        logger.info("Senha do funcionário ID %s atualizada.", funcionario_id)
     for key, value in update_data.items():
         setattr(db_funcionario, key, value)
     db.commit()
     db.refresh(db_funcionario)
-    logger.info(f"Funcionário ID {funcionario_id} atualizado com sucesso.")
+    # is_active e cargo valem para a autenticação: o cache de principais não pode servir o cadastro antigo
+    security.invalidar_principal("funcionario", matricula_anterior, db_funcionario.matricula_funcional)
+    logger.info("Funcionário ID %s atualizado com sucesso.", funcionario_id)
     return db_funcionario
 
 def delete_funcionario(db: Session, funcionario_id: int):
-    logger.info(f"Tentando excluir funcionário com id: {funcionario_id}")
+    logger.info("Tentando excluir funcionário com id: %s", funcionario_id)
     db_funcionario = db.query(models.Funcionario).options(
         selectinload(models.Funcionario.emprestimos_registrados),
         selectinload(models.Funcionario.reservas_registradas),
         selectinload(models.Funcionario.devolucoes_registradas)
     ).filter(models.Funcionario.id_funcionario == funcionario_id).first()
     if not db_funcionario:
-        logger.warning(f"Funcionário com id {funcionario_id} não encontrado para exclusão.")
+        logger.warning("Funcionário com id %s não encontrado para exclusão.", funcionario_id)
         return None
     if db_funcionario.emprestimos_registrados:
-        logger.warning(f"Funcionário ID {funcionario_id} registrou empréstimos. Exclusão não permitida.")
+        logger.warning("Funcionário ID %s registrou empréstimos. Exclusão não permitida.", funcionario_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário possui empréstimos registrados e não pode ser excluído.")
     if db_funcionario.reservas_registradas:
-        logger.warning(f"Funcionário ID {funcionario_id} registrou reservas. Exclusão não permitida.")
+        logger.warning("Funcionário ID %s registrou reservas. Exclusão não permitida.", funcionario_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário possui reservas registradas e não pode ser excluído.")
     if db_funcionario.devolucoes_registradas:
-        logger.warning(f"Funcionário ID {funcionario_id} registrou devoluções. Exclusão não permitida.")
+        logger.warning("Funcionário ID %s registrou devoluções. Exclusão não permitida.", funcionario_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário possui devoluções registradas e não pode ser excluído.")
     db.delete(db_funcionario)
     db.commit()
-    logger.info(f"Funcionário com id {funcionario_id} excluído com sucesso.")
+    security.invalidar_principal("funcionario", db_funcionario.matricula_funcional)
+    logger.info("Funcionário com id %s excluído com sucesso.", funcionario_id)
     return db_funcionario
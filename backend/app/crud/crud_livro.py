@@ -1,20 +1,143 @@
-from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import Double, and_, cast, event, exists, false, func, select, tablesample, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, joinedload, noload, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from ..cache import TTLCache
+import base64
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Payloads de LivroRead já serializados, por id_livro (GET /livros/{id}). Do cache só se
+# aproveitam os dados estáveis (livro, autores, categoria, exemplares): os contadores e o
+# status de cada exemplar são relidos a cada requisição, porque o cache é por worker e a
+# circulação pode ter mudado em outro. Escritas no livro, autores, categoria ou exemplares
+# invalidam; o TTL limita a defasagem dessas edições entre workers.
+livro_detalhe_cache = TTLCache(
+    "livro_detalhe",
+    maxsize=int(os.getenv("LIVRO_DETALHE_CACHE_MAX", "2048")),
+    ttl=float(os.getenv("LIVRO_DETALHE_CACHE_TTL", "300")),
+)
+
+def invalidar_livro_detalhe(livro_id: int = None, db: Session = None):
+    """
+    Remove o payload do livro do cache; sem `livro_id`, esvazia o cache (ex.: autor ou
+    categoria renomeados). Com `db`, invalida de novo no commit da sessão, para que uma
+    leitura concorrente feita antes do commit não deixe no cache o estado antigo.
+    """
+    if livro_id is None:
+        livro_detalhe_cache.clear()
+    else:
+        livro_detalhe_cache.invalidate(livro_id)
+    if db is not None:
+        db.info.setdefault("livros_invalidados", set()).add(livro_id)
+
+# Livros alterados há pouco: leituras feitas em réplica podem ainda não refletir a
+# alteração, então não populam o cache até a janela de atraso de replicação passar.
+# A chave TODOS_OS_LIVROS marca uma alteração que atinge qualquer livro (autor ou categoria).
+TODOS_OS_LIVROS = "todos"
+livros_alterados_recentemente = TTLCache(
+    "livros_alterados_recentemente",
+    maxsize=int(os.getenv("LIVRO_DETALHE_CACHE_MAX", "2048")),
+    ttl=float(os.getenv("DB_JANELA_PRIMARIO_APOS_ESCRITA", "5")),
+)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_livros_apos_commit(session):
+    for livro_id in session.info.pop("livros_invalidados", ()):
+        if livro_id is None:
+            livro_detalhe_cache.clear()
+            livros_alterados_recentemente.set(TODOS_OS_LIVROS, True)
+        else:
+            livro_detalhe_cache.invalidate(livro_id)
+            livros_alterados_recentemente.set(livro_id, True)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_livros_invalidados(session):
+    session.info.pop("livros_invalidados", None)
+
+def get_livro_detalhe(db: Session, livro_id: int):
+    """
+    LivroRead serializado do livro; None se o livro não existe. Com o payload em cache,
+    só contadores e status dos exemplares vêm do banco (uma consulta pelo índice de
+    exemplar por livro); se os exemplares do livro mudaram, o payload é recarregado.
+    """
+    payload = livro_detalhe_cache.get(livro_id)
+    if payload is None:
+        return _carregar_livro_detalhe(db, livro_id)
+    rows = db.query(
+        models.Livro.total_exemplares, models.Livro.exemplares_disponiveis,
+        models.Exemplar.numero_tombo, models.Exemplar.status
+    ).outerjoin(models.Exemplar, models.Exemplar.id_livro == models.Livro.id_livro)\
+        .filter(models.Livro.id_livro == livro_id).all()
+    if not rows:
+        livro_detalhe_cache.invalidate(livro_id)
+        logger.warning("Livro com id %s não encontrado.", livro_id)
+        return None
+    status_exemplares = {numero_tombo: status_atual for _, _, numero_tombo, status_atual in rows if numero_tombo is not None}
+    if status_exemplares.keys() != {ex["numero_tombo"] for ex in payload["exemplares"]}:
+        # Exemplar criado, removido ou transferido em outro worker
+        return _carregar_livro_detalhe(db, livro_id)
+    total_exemplares, exemplares_disponiveis = rows[0][0], rows[0][1]
+    return {
+        **payload,
+        "total_exemplares": total_exemplares,
+        "exemplares_disponiveis": exemplares_disponiveis,
+        "exemplares": [{**ex, "status": status_exemplares[ex["numero_tombo"]]} for ex in payload["exemplares"]],
+    }
+
+async def get_livro_detalhe_async(db: AsyncSession, livro_id: int):
+    """Versão async de `get_livro_detalhe` (run_sync na conexão async)."""
+    return await db.run_sync(get_livro_detalhe, livro_id)
+
+def _carregar_livro_detalhe(db: Session, livro_id: int):
+    livro = db.query(models.Livro).options(
+        joinedload(models.Livro.categoria),
+        selectinload(models.Livro.autores),
+        selectinload(models.Livro.exemplares)
+    ).filter(models.Livro.id_livro == livro_id).first()
+    if not livro:
+        logger.warning("Livro com id %s não encontrado.", livro_id)
+        return None
+    payload = schemas.LivroRead.model_validate(livro).model_dump(mode="json")
+    if not (db.info.get("replica") and (livro_id in livros_alterados_recentemente or TODOS_OS_LIVROS in livros_alterados_recentemente)):
+        livro_detalhe_cache.set(livro_id, payload)
+    return payload
+
 def get_livro(db: Session, livro_id: int):
-    logger.debug(f"Buscando livro com id: {livro_id}")
+    logger.debug("Buscando livro com id: %s", livro_id)
     livro = db.query(models.Livro).options(
         joinedload(models.Livro.categoria),
         selectinload(models.Livro.autores)
     ).filter(models.Livro.id_livro == livro_id).first()
     if not livro:
-        logger.warning(f"Livro com id {livro_id} não encontrado.")
+        logger.warning("Livro com id %s não encontrado.", livro_id)
     return livro
 
+def ajustar_contadores_exemplares(db: Session, id_livro: int, delta_total: int = 0, delta_disponiveis: int = 0):
+    """
+    Soma os deltas aos contadores de exemplares do livro com um UPDATE atômico, sem commit:
+    o ajuste entra na transação da operação que mudou a disponibilidade do exemplar.
+    Contadores e status são relidos a cada GET /livros/{id}; só a entrada ou saída de
+    exemplares (delta_total) invalida o payload do livro.
+    """
+    if not delta_total and not delta_disponiveis:
+        return
+    db.execute(
+        update(models.Livro)
+        .where(models.Livro.id_livro == id_livro)
+        .values(
+            total_exemplares=models.Livro.total_exemplares + delta_total,
+            exemplares_disponiveis=models.Livro.exemplares_disponiveis + delta_disponiveis,
+        )
+    )
+    if delta_total:
+        invalidar_livro_detalhe(id_livro, db)
+    logger.debug("Contadores do livro ID %s ajustados: total %+d, disponíveis %+d.", id_livro, delta_total, delta_disponiveis)
+
 def get_livros(db: Session, skip: int = 0, limit: int = 20, titulo: str = None, autor: str = None, categoria_id: int = None, sort_by: str = "titulo", sort_dir: str = "asc"):
     query = db.query(models.Livro).options(
         joinedload(models.Livro.categoria),
@@ -25,7 +148,7 @@ def get_livros(db: Session, skip: int = 0, limit: int = 20, titulo: str = None,
     if categoria_id:
         query = query.filter(models.Livro.id_categoria == categoria_id)
     if autor:
-        query = query.join(models.Livro.autores).filter(models.Autor.nome.ilike(f"%{autor}%"))
+        query = query.filter(filtro_autor(db, autor))
     sort_col = getattr(models.Livro, sort_by, models.Livro.titulo)
     if sort_dir == "desc":
         sort_col = sort_col.desc()
@@ -35,10 +158,10 @@ def get_livros(db: Session, skip: int = 0, limit: int = 20, titulo: str = None,
     return query.offset(skip).limit(limit).all()
 
 def create_livro(db: Session, livro: schemas.LivroCreate):
-    logger.info(f"Tentando criar livro: {livro.titulo}")
+    logger.info("Tentando criar livro: %s", livro.titulo)
     db_categoria = db.query(models.Categoria).filter(models.Categoria.id_categoria == livro.id_categoria).first()
     if not db_categoria:
-        logger.error(f"Categoria com id {livro.id_categoria} não encontrada ao tentar criar livro {livro.titulo}.")
+        logger.error("Categoria com id %s não encontrada ao tentar criar livro %s.", livro.id_categoria, livro.titulo)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Categoria com id {livro.id_categoria} não encontrada.")
     db_livro = models.Livro(
         titulo=livro.titulo,
@@ -48,86 +171,513 @@ def create_livro(db: Session, livro: schemas.LivroCreate):
     )
     db.add(db_livro)
     db.commit()
-    logger.info(f"Livro '{db_livro.titulo}' (ID: {db_livro.id_livro}) criado parcialmente, antes de associar autores.")
+    logger.info("Livro '%s' (ID: %s) criado parcialmente, antes de associar autores.", db_livro.titulo, db_livro.id_livro)
     if livro.ids_autores:
         autores = db.query(models.Autor).filter(models.Autor.id_autor.in_(livro.ids_autores)).all()
         if len(autores) != len(livro.ids_autores):
             found_ids = {a.id_autor for a in autores}
             missing_ids = set(livro.ids_autores) - found_ids
-            logger.warning(f"Alguns autores não encontrados para o livro '{db_livro.titulo}': IDs {missing_ids}")
+            logger.warning("Alguns autores não encontrados para o livro '%s': IDs %s", db_livro.titulo, missing_ids)
         db_livro.autores.extend(autores)
         db.commit()
-        logger.info(f"Autores associados ao livro '{db_livro.titulo}'.")
+        logger.info("Autores associados ao livro '%s'.", db_livro.titulo)
     db.refresh(db_livro)
-    logger.info(f"Livro '{db_livro.titulo}' (ID: {db_livro.id_livro}) criado com sucesso.")
+    logger.info("Livro '%s' (ID: %s) criado com sucesso.", db_livro.titulo, db_livro.id_livro)
     return db_livro
 
+def update_livro(db: Session, livro_id: int, livro_update: schemas.LivroUpdate):
+    logger.info("Tentando atualizar livro com id: %s", livro_id)
+    db_livro = db.query(models.Livro).filter(models.Livro.id_livro == livro_id).first()
+    if not db_livro:
+        logger.warning("Livro com id %s não encontrado para atualização.", livro_id)
+        return None
+    dados = livro_update.model_dump(exclude_unset=True)
+    ids_autores = dados.pop("ids_autores", None)
+    if dados.get("id_categoria") is not None and dados["id_categoria"] != db_livro.id_categoria:
+        db_categoria = db.query(models.Categoria).filter(models.Categoria.id_categoria == dados["id_categoria"]).first()
+        if not db_categoria:
+            logger.error("Categoria com id %s não encontrada ao atualizar livro ID %s.", dados['id_categoria'], livro_id)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Categoria com id {dados['id_categoria']} não encontrada.")
+    for key, value in dados.items():
+        setattr(db_livro, key, value)
+    if ids_autores is not None:
+        autores = db.query(models.Autor).filter(models.Autor.id_autor.in_(ids_autores)).all()
+        if len(autores) != len(set(ids_autores)):
+            missing_ids = set(ids_autores) - {a.id_autor for a in autores}
+            logger.warning("Alguns autores não encontrados ao atualizar o livro ID %s: IDs %s", livro_id, missing_ids)
+        db_livro.autores = autores
+    invalidar_livro_detalhe(livro_id, db)
+    db.commit()
+    logger.info("Livro ID %s atualizado com sucesso.", livro_id)
+    return get_livro(db, livro_id)
+
 def delete_livro(db: Session, livro_id: int):
-    logger.info(f"Tentando excluir livro com id: {livro_id}")
+    logger.info("Tentando excluir livro com id: %s", livro_id)
     db_livro = db.query(models.Livro).options(selectinload(models.Livro.exemplares)).filter(models.Livro.id_livro == livro_id).first()
     if db_livro:
         if db_livro.exemplares:
-            logger.warning(f"Não é possível excluir o livro ID {livro_id} pois existem {len(db_livro.exemplares)} exemplares associados.")
+            logger.warning("Não é possível excluir o livro ID %s pois existem %s exemplares associados.", livro_id, len(db_livro.exemplares))
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não é possível excluir o livro pois existem exemplares associados.")
         if db_livro.autores:
             db_livro.autores.clear()
             db.commit()
-            logger.info(f"Associações de autores removidas para o livro ID {livro_id}.")
+            logger.info("Associações de autores removidas para o livro ID %s.", livro_id)
+        invalidar_livro_detalhe(livro_id, db)
         db.delete(db_livro)
         db.commit()
-        logger.info(f"Livro com id {livro_id} excluído com sucesso.")
+        logger.info("Livro com id %s excluído com sucesso.", livro_id)
     else:
-        logger.warning(f"Livro com id {livro_id} não encontrado para exclusão.")
+        logger.warning("Livro com id %s não encontrado para exclusão.", livro_id)
     return db_livro
 
-def get_livros_paginados(
+# Configuração de busca textual criada em init.sql (stemming português + unaccent)
+FTS_CONFIG = "portuguese_unaccent"
+
+# Estratégia de contagem do total em get_livros_paginados:
+# acima deste número de linhas estimadas pelo planejador, o total devolvido é a estimativa
+LIMITE_CONTAGEM_EXATA = int(os.getenv("LIVRO_LIMITE_CONTAGEM_EXATA", "50000"))
+# Contagens exatas ficam em cache por filtro normalizado
+contagem_cache = TTLCache(
+    "livro_contagem",
+    maxsize=int(os.getenv("LIVRO_CONTAGEM_CACHE_MAX", "1024")),
+    ttl=float(os.getenv("LIVRO_CONTAGEM_CACHE_TTL", "60")),
+)
+
+def _chave_filtros(**filtros) -> tuple:
+    """Chave normalizada de um conjunto de filtros: ignora vazios, caixa e espaços das buscas textuais."""
+    normalizados = []
+    for nome, valor in sorted(filtros.items()):
+        if valor is None or valor == "":
+            continue
+        if isinstance(valor, str) and nome != "isbn":
+            valor = " ".join(valor.lower().split())
+        normalizados.append((nome, valor))
+    return tuple(normalizados)
+
+def _estimativa_tabela_livro(db: Session):
+    """Número de linhas de `livro` segundo as estatísticas (reltuples); None se a tabela nunca foi analisada."""
+    estimativa = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'livro'::regclass")).scalar()
+    return int(estimativa) if estimativa is not None and estimativa >= 0 else None
+
+def _estimativa_planejador(db: Session, query) -> int:
+    """Linhas que o planejador espera para `query` (EXPLAIN sem executar a consulta)."""
+    compiled = query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    plano = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+def _contar_livros(db: Session, query, chave: tuple, contagem: str = "auto"):
+    """
+    Total de livros de `query` e se ele é exato.
+
+    - "exata": sempre conta (com cache por `chave`).
+    - "estimada": reltuples sem filtros, estimativa do planejador com filtros.
+    - "auto": estimativa quando não há filtros ou quando o planejador espera mais de
+      LIMITE_CONTAGEM_EXATA linhas; contagem exata (com cache) para filtros seletivos.
+    """
+    if contagem != "exata":
+        if not chave:
+            estimativa = _estimativa_tabela_livro(db)
+            if estimativa is not None:
+                return estimativa, False
+        else:
+            estimativa = _estimativa_planejador(db, query)
+            if contagem == "estimada" or estimativa > LIMITE_CONTAGEM_EXATA:
+                return estimativa, False
+    total = contagem_cache.get(chave)
+    if total is None:
+        total = query.count()
+        contagem_cache.set(chave, total)
+    return total, True
+
+# Quantidade máxima de sugestões "você quis dizer" por campo
+LIMITE_SUGESTOES = 5
+
+def aplicar_limiar_similaridade(db: Session, similaridade: float):
+    """
+    Define pg_trgm.word_similarity_threshold só para a transação corrente, usado pelo
+    operador %> (indexável pelos índices GIN gin_trgm_ops).
+    """
+    db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(similaridade), True)))
+
+def filtro_texto(coluna, termo: str, similaridade: float = None):
+    """
+    Filtro de texto para buscas digitadas: substring (ILIKE) ou, com `similaridade`,
+    tolerante a erros de digitação. Os dois servidos pelos índices de trigramas.
+    """
+    if similaridade is not None:
+        return coluna.op("%>")(termo)
+    return coluna.ilike(f"%{termo}%")
+
+def sugerir_termos(db: Session, coluna, termo: str, limite: int = LIMITE_SUGESTOES):
+    """Sugestões "você quis dizer" para `termo`: valores distintos de `coluna` mais parecidos."""
+    similaridade = func.word_similarity(termo, coluna)
+    rows = db.query(coluna).filter(coluna.op("%>")(termo)).group_by(coluna).order_by(similaridade.desc()).limit(limite).all()
+    return [valor for (valor,) in rows]
+
+# Filtro por autor: os IDs dos autores que casam com o termo são resolvidos uma vez e ficam em
+# cache; o filtro de livros vira um EXISTS em escrito_por sobre esses IDs. Acima deste número
+# de autores o termo é amplo demais para uma lista de IDs e o EXISTS filtra pelo nome.
+LIMITE_IDS_AUTORES = int(os.getenv("LIVRO_LIMITE_IDS_AUTORES", "1000"))
+autores_ids_cache = TTLCache(
+    "autor_ids_por_nome",
+    maxsize=int(os.getenv("AUTOR_IDS_CACHE_MAX", "1024")),
+    ttl=float(os.getenv("AUTOR_IDS_CACHE_TTL", "300")),
+)
+
+def resolver_ids_autores(db: Session, autor: str, similaridade: float = None):
+    """
+    IDs dos autores cujo nome casa com `autor` (mesma regra de `filtro_texto`), ou None
+    quando passam de LIMITE_IDS_AUTORES. Com `similaridade` o limiar já deve ter sido
+    aplicado na transação (`aplicar_limiar_similaridade`).
+    """
+    chave = (" ".join(autor.lower().split()), similaridade)
+    ids = autores_ids_cache.get(chave, default=False)
+    if ids is False:
+        rows = db.query(models.Autor.id_autor)\
+            .filter(filtro_texto(models.Autor.nome, autor, similaridade))\
+            .order_by(models.Autor.id_autor).limit(LIMITE_IDS_AUTORES + 1).all()
+        ids = [id_autor for (id_autor,) in rows] if len(rows) <= LIMITE_IDS_AUTORES else None
+        autores_ids_cache.set(chave, ids)
+        logger.debug("Autores para '%s': %s IDs resolvidos.", autor, 'mais de ' + str(LIMITE_IDS_AUTORES) if ids is None else len(ids))
+    return ids
+
+def filtro_autor(db: Session, autor: str, similaridade: float = None, livro=models.Livro):
+    """
+    Semi-join de livros com autores que casam com `autor`: EXISTS em escrito_por, sem
+    duplicar livros com mais de um autor correspondente.
+    """
+    ids = resolver_ids_autores(db, autor, similaridade)
+    if ids is None:
+        return exists().where(
+            models.escrito_por.c.id_livro == livro.id_livro,
+            models.escrito_por.c.id_autor == models.Autor.id_autor,
+            filtro_texto(models.Autor.nome, autor, similaridade),
+        )
+    if not ids:
+        return false()
+    return exists().where(
+        models.escrito_por.c.id_livro == livro.id_livro,
+        models.escrito_por.c.id_autor.in_(ids),
+    )
+
+def filtros_livros(
     db: Session,
-    skip: int = 0,
-    limit: int = 20,
+    livro=models.Livro,
     titulo: str = None,
     autor: str = None,
     categoria_id: int = None,
     isbn: str = None,
     editora: str = None,
     ano_publicacao: int = None,
-    sort_by: str = "titulo",
-    sort_dir: str = "asc"
-):
+    q: str = None,
+    similaridade: float = None
+) -> list:
     """
-    Retorna um dicionário com total de livros e os livros da página atual, incluindo contagem de exemplares.
+    Condições WHERE da busca de livros sobre `livro` (models.Livro ou um alias dele).
+    Com `similaridade`, o limiar deve ser aplicado antes (`aplicar_limiar_similaridade`).
     """
-    query = db.query(models.Livro)
+    condicoes = []
+    if q:
+        condicoes.append(livro.busca_vector.op("@@")(func.websearch_to_tsquery(FTS_CONFIG, q)))
     if titulo:
-        query = query.filter(models.Livro.titulo.ilike(f"%{titulo}%"))
+        condicoes.append(filtro_texto(livro.titulo, titulo, similaridade))
     if categoria_id:
-        query = query.filter(models.Livro.id_categoria == categoria_id)
+        condicoes.append(livro.id_categoria == categoria_id)
     if autor:
-        query = query.join(models.Livro.autores).filter(models.Autor.nome.ilike(f"%{autor}%"))
+        condicoes.append(filtro_autor(db, autor, similaridade, livro))
     if isbn:
-        query = query.filter(models.Livro.isbn == isbn)
+        condicoes.append(livro.isbn == isbn)
     if editora:
-        query = query.filter(models.Livro.editora.ilike(f"%{editora}%"))
+        condicoes.append(filtro_texto(livro.editora, editora, similaridade))
     if ano_publicacao:
-        query = query.filter(models.Livro.ano_publicacao == ano_publicacao)
-    total = query.count()
-    query = query.options(
+        condicoes.append(livro.ano_publicacao == ano_publicacao)
+    return condicoes
+
+# Colunas aceitas em sort_by. A paginação por cursor sempre desempata por id_livro.
+COLUNAS_ORDENACAO = {
+    "titulo": models.Livro.titulo,
+    "editora": models.Livro.editora,
+    "edicao": models.Livro.edicao,
+    "isbn": models.Livro.isbn,
+    "ano_publicacao": models.Livro.ano_publicacao,
+    "id_livro": models.Livro.id_livro,
+}
+# Colunas que podem ser NULL: o Postgres as ordena por último em ASC e primeiro em DESC.
+COLUNAS_ORDENACAO_NULAVEIS = {"editora", "edicao", "isbn", "ano_publicacao"}
+
+cursor_invalido_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Cursor de paginação inválido.",
+)
+
+def _codificar_cursor(sort_by: str, sort_dir: str, valor, id_livro: int, direcao: str) -> str:
+    payload = {"s": sort_by, "o": sort_dir, "v": valor, "id": id_livro, "d": direcao}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, sort_by: str, sort_dir: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        id_livro = int(payload["id"])
+        direcao = payload["d"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Cursor de paginação malformado recebido: %s", cursor[:40])
+        raise cursor_invalido_exception
+    if direcao not in ("next", "prev") or payload.get("s") != sort_by or payload.get("o") != sort_dir:
+        # O cursor só é válido para a mesma ordenação em que foi emitido
+        logger.warning("Cursor emitido para outra ordenação (%s/%s) usado com %s/%s.", payload.get('s'), payload.get('o'), sort_by, sort_dir)
+        raise cursor_invalido_exception
+    return {"valor": payload.get("v"), "id_livro": id_livro, "direcao": direcao}
+
+def _trechos_apos_cursor(sort_col, nulavel: bool, valor, id_livro: int, ascendente: bool) -> list:
+    """
+    Condições de keyset equivalentes a "linhas depois de (valor, id_livro)" na ordem
+    (sort_col, id_livro), com NULLS LAST em ASC e NULLS FIRST em DESC.
+    Devolve os trechos dessa ordem que vêm depois do cursor, na sequência em que são
+    percorridos: o trecho com valores e o trecho de NULLs. Cada um é uma única faixa do
+    índice composto (sort_col, id_livro); juntá-los com OR impediria a busca no índice.
+    """
+    pk = models.Livro.id_livro
+    if ascendente:
+        if valor is None:
+            return [and_(sort_col.is_(None), pk > id_livro)]
+        depois = tuple_(sort_col, pk) > tuple_(valor, id_livro)
+        return [depois, sort_col.is_(None)] if nulavel else [depois]
+    if valor is None:
+        return [and_(sort_col.is_(None), pk < id_livro), sort_col.isnot(None)]
+    return [tuple_(sort_col, pk) < tuple_(valor, id_livro)]
+
+def _ordenacao(sort_col, ascendente: bool):
+    pk = models.Livro.id_livro
+    if ascendente:
+        return [sort_col.asc().nullslast(), pk.asc()]
+    return [sort_col.desc().nullsfirst(), pk.desc()]
+
+def get_livros_paginados(
+    db: Session,
+    skip: int = 0,
+    limit: int = 20,
+    titulo: str = None,
+    autor: str = None,
+    categoria_id: int = None,
+    isbn: str = None,
+    editora: str = None,
+    ano_publicacao: int = None,
+    sort_by: str = None,
+    sort_dir: str = "asc",
+    cursor: str = None,
+    q: str = None,
+    similaridade: float = None,
+    contagem: str = "auto"
+):
+    """
+    Retorna um dicionário com total de livros e os livros da página atual, incluindo contagem de exemplares.
+
+    Sem `cursor`, pagina por OFFSET (`skip`). Com `cursor`, pagina por keyset a partir da
+    tupla (coluna de ordenação, id_livro) codificada nele, e `skip` é ignorado: o custo
+    da página não depende da sua profundidade. A resposta traz `next_cursor` e
+    `prev_cursor` para navegar nos dois sentidos.
+
+    `q` faz busca textual (full-text) em título, autores e editora usando o índice GIN
+    de `livro.busca_vector`; nesse caso a ordenação padrão é por relevância.
+
+    `titulo`, `autor` e `editora` buscam por substring; com `similaridade` (0 a 1) a busca
+    passa a tolerar erros de digitação (similaridade de palavra do pg_trgm). Quando a
+    primeira página vem vazia, `sugestoes` traz termos parecidos existentes no acervo.
+
+    `contagem` escolhe como `total` é obtido (veja `_contar_livros`); `total_exato`
+    indica se o valor devolvido é uma contagem ou uma estimativa.
+    """
+    tsquery = func.websearch_to_tsquery(FTS_CONFIG, q) if q else None
+    if sort_by not in COLUNAS_ORDENACAO and not (sort_by == "relevancia" and tsquery is not None):
+        sort_by = "relevancia" if tsquery is not None else "titulo"
+    if sort_by == "relevancia":
+        # Mais relevantes primeiro; sort_dir não se aplica à relevância
+        sort_dir = "desc"
+        sort_expr = cast(func.ts_rank_cd(models.Livro.busca_vector, tsquery), Double)
+    else:
+        sort_dir = "desc" if sort_dir == "desc" else "asc"
+        sort_expr = COLUNAS_ORDENACAO[sort_by]
+    nulavel = sort_by in COLUNAS_ORDENACAO_NULAVEIS
+    if similaridade is not None:
+        aplicar_limiar_similaridade(db, similaridade)
+    query = db.query(models.Livro).filter(*filtros_livros(
+        db, titulo=titulo, autor=autor, categoria_id=categoria_id, isbn=isbn, editora=editora,
+        ano_publicacao=ano_publicacao, q=q, similaridade=similaridade
+    ))
+    chave = _chave_filtros(
+        titulo=titulo, autor=autor, categoria_id=categoria_id, isbn=isbn, editora=editora,
+        ano_publicacao=ano_publicacao, q=q, similaridade=similaridade
+    )
+    total, total_exato = _contar_livros(db, query, chave, contagem)
+    # O valor de ordenação vem junto de cada linha para montar os cursores.
+    # Os contadores de exemplares são colunas de livro: a lista de exemplares não é carregada.
+    query = query.add_columns(sort_expr.label("valor_ordenacao")).options(
         joinedload(models.Livro.categoria),
         selectinload(models.Livro.autores),
-        selectinload(models.Livro.exemplares)
+        noload(models.Livro.exemplares)
     )
-    sort_col = getattr(models.Livro, sort_by, models.Livro.titulo)
-    if sort_dir == "desc":
-        sort_col = sort_col.desc()
+    ascendente = sort_dir == "asc"
+    direcao = "next"
+    if cursor:
+        posicao = _decodificar_cursor(cursor, sort_by, sort_dir)
+        direcao = posicao["direcao"]
+        # Página anterior: percorre a ordem invertida a partir do cursor e desinverte no fim
+        ordem_asc = ascendente if direcao == "next" else not ascendente
+        query = query.order_by(*_ordenacao(sort_expr, ordem_asc))
+        # Uma linha extra indica se há mais páginas no sentido percorrido; o trecho
+        # seguinte só é consultado se o anterior não completar a página
+        rows = []
+        for trecho in _trechos_apos_cursor(sort_expr, nulavel, posicao["valor"], posicao["id_livro"], ordem_asc):
+            rows += query.filter(trecho).limit(limit + 1 - len(rows)).all()
+            if len(rows) > limit:
+                break
     else:
-        sort_col = sort_col.asc()
-    query = query.order_by(sort_col)
-    items = query.offset(skip).limit(limit).all()
-    livros_result = []
-    for livro in items:
-        total_exemplares = len(livro.exemplares)
-        exemplares_disponiveis = sum(1 for ex in livro.exemplares if ex.status == "disponivel")
-        livro_dict = schemas.LivroRead.model_validate(livro).model_dump()
-        livro_dict["total_exemplares"] = total_exemplares
-        livro_dict["exemplares_disponiveis"] = exemplares_disponiveis
-        livros_result.append(livro_dict)
-    return {"total": total, "items": livros_result}
+        query = query.order_by(*_ordenacao(sort_expr, ascendente))
+        rows = query.offset(skip).limit(limit + 1).all()
+    tem_mais = len(rows) > limit
+    rows = rows[:limit]
+    if direcao == "prev":
+        rows.reverse()
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, bool(cursor) or skip > 0
+    next_cursor = prev_cursor = None
+    if rows and tem_proxima:
+        ultimo, valor = rows[-1]
+        next_cursor = _codificar_cursor(sort_by, sort_dir, valor, ultimo.id_livro, "next")
+    if rows and tem_anterior:
+        primeiro, valor = rows[0]
+        prev_cursor = _codificar_cursor(sort_by, sort_dir, valor, primeiro.id_livro, "prev")
+    livros_result = [schemas.LivroRead.model_validate(livro).model_dump() for livro, _ in rows]
+    sugestoes = []
+    if not rows and not cursor and skip == 0:
+        sugestoes = _sugestoes_busca(db, titulo=titulo or q, autor=autor, editora=editora)
+    return {
+        "total": total,
+        "total_exato": total_exato,
+        "items": livros_result,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "sugestoes": sugestoes,
+    }
+
+async def get_livros_paginados_async(db: AsyncSession, **parametros):
+    """
+    Versão async de `get_livros_paginados`: a mesma consulta roda na conexão async via
+    run_sync (greenlet), sem bloquear o event loop durante o I/O com o banco.
+    """
+    return await db.run_sync(get_livros_paginados, **parametros)
+
+def _sugestoes_busca(db: Session, titulo: str = None, autor: str = None, editora: str = None):
+    sugestoes = []
+    for coluna, termo in (
+        (models.Livro.titulo, titulo),
+        (models.Autor.nome, autor),
+        (models.Livro.editora, editora),
+    ):
+        if termo:
+            sugestoes.extend(s for s in sugerir_termos(db, coluna, termo) if s not in sugestoes)
+    logger.debug("Busca sem resultados; %s sugestões encontradas.", len(sugestoes))
+    return sugestoes
+
+# Facetas da busca (GET /livros/facetas): quantidade de livros por categoria, editora e ano.
+# Acima deste número de livros estimados para o filtro, as contagens vêm de uma amostra
+# (TABLESAMPLE SYSTEM) com esse tamanho aproximado, escaladas para o total.
+LIMITE_FACETAS_EXATAS = int(os.getenv("LIVRO_LIMITE_FACETAS_EXATAS", "200000"))
+# A amostra lê páginas da tabela inteira, sem usar os índices dos filtros: para ter
+# LIMITE_FACETAS_EXATAS livros do filtro, lê essa fração dividida pela seletividade.
+# Filtros que selecionam menos que esta fração da tabela são contados de forma exata.
+SELETIVIDADE_MINIMA_AMOSTRA = float(os.getenv("LIVRO_SELETIVIDADE_MINIMA_AMOSTRA", "0.1"))
+# Valores por faceta devolvidos, dos mais frequentes para os menos
+LIMITE_VALORES_FACETA = 20
+facetas_cache = TTLCache(
+    "livro_facetas",
+    maxsize=int(os.getenv("LIVRO_FACETAS_CACHE_MAX", "256")),
+    ttl=float(os.getenv("LIVRO_FACETAS_CACHE_TTL", "300")),
+)
+
+# Bits de GROUPING(id_categoria, editora, ano_publicacao) de cada conjunto agrupado
+_GRUPO_FACETA = {0b011: "categoria", 0b101: "editora", 0b110: "ano_publicacao"}
+
+def get_facetas_livros(
+    db: Session,
+    titulo: str = None,
+    autor: str = None,
+    categoria_id: int = None,
+    isbn: str = None,
+    editora: str = None,
+    ano_publicacao: int = None,
+    q: str = None,
+    similaridade: float = None,
+    limite: int = LIMITE_VALORES_FACETA
+):
+    """
+    Contagens por categoria, editora e ano de publicação dos livros que atendem aos filtros
+    (os mesmos de `get_livros_paginados`), calculadas em uma única passada com GROUPING SETS.
+
+    Quando o planejador estima mais de LIMITE_FACETAS_EXATAS livros para o filtro e ele não
+    é seletivo (ver SELETIVIDADE_MINIMA_AMOSTRA), a agregação roda sobre uma amostra de
+    páginas da tabela e as contagens são escaladas (`total_exato` = False).
+    O resultado fica em cache por filtro normalizado.
+    """
+    filtros = dict(
+        titulo=titulo, autor=autor, categoria_id=categoria_id, isbn=isbn, editora=editora,
+        ano_publicacao=ano_publicacao, q=q, similaridade=similaridade
+    )
+    chave_filtros = _chave_filtros(**filtros)
+    chave = (chave_filtros, limite)
+    facetas = facetas_cache.get(chave)
+    if facetas is not None:
+        logger.debug("Facetas de livros servidas do cache para %s.", chave_filtros)
+        return facetas
+    if similaridade is not None:
+        aplicar_limiar_similaridade(db, similaridade)
+    estimativa_tabela = _estimativa_tabela_livro(db)
+    if chave_filtros:
+        estimativa = _estimativa_planejador(db, db.query(models.Livro).filter(*filtros_livros(db, **filtros)))
+    else:
+        estimativa = estimativa_tabela
+    livro = models.Livro
+    fracao = 1.0
+    if estimativa is not None and estimativa > LIMITE_FACETAS_EXATAS and estimativa_tabela:
+        if estimativa / estimativa_tabela >= SELETIVIDADE_MINIMA_AMOSTRA:
+            # Fração de páginas que rende ~LIMITE_FACETAS_EXATAS livros do filtro
+            fracao = min(1.0, LIMITE_FACETAS_EXATAS / estimativa)
+    if fracao < 1.0:
+        livro = aliased(models.Livro, tablesample(models.Livro, func.system(fracao * 100), name="amostra"))
+    grupo = func.grouping(livro.id_categoria, livro.editora, livro.ano_publicacao).label("grupo")
+    rows = db.query(livro.id_categoria, livro.editora, livro.ano_publicacao, grupo, func.count().label("total"))\
+        .filter(*filtros_livros(db, livro, **filtros))\
+        .group_by(func.grouping_sets(
+            tuple_(livro.id_categoria), tuple_(livro.editora), tuple_(livro.ano_publicacao), tuple_()
+        )).all()
+    total = 0
+    valores = {"categoria": [], "editora": [], "ano_publicacao": []}
+    for id_categoria, editora_valor, ano, bits, quantidade in rows:
+        quantidade = round(quantidade / fracao)
+        faceta = _GRUPO_FACETA.get(bits)
+        if faceta is None:
+            total = quantidade
+            continue
+        valor = {"categoria": id_categoria, "editora": editora_valor, "ano_publicacao": ano}[faceta]
+        valores[faceta].append({"valor": valor, "rotulo": None, "total": quantidade})
+    for faceta in valores:
+        valores[faceta] = sorted(valores[faceta], key=lambda item: item["total"], reverse=True)[:limite]
+    ids_categorias = [item["valor"] for item in valores["categoria"] if item["valor"] is not None]
+    if ids_categorias:
+        nomes = dict(db.query(models.Categoria.id_categoria, models.Categoria.nome)
+                     .filter(models.Categoria.id_categoria.in_(ids_categorias)).all())
+        for item in valores["categoria"]:
+            item["rotulo"] = nomes.get(item["valor"])
+    facetas = {"total": total, "total_exato": fracao == 1.0, **valores}
+    facetas_cache.set(chave, facetas)
+    logger.debug("Facetas de livros calculadas para %s (fração amostrada: %.4f).", chave_filtros, fracao)
+    return facetas
+
+async def get_facetas_livros_async(db: AsyncSession, **parametros):
+    """Versão async de `get_facetas_livros` (run_sync na conexão async)."""
+    return await db.run_sync(get_facetas_livros, **parametros)
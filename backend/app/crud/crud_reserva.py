@@ -1,45 +1,76 @@
+from sqlalchemy import and_, exists
 from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException, status
 from .. import models, schemas
+from .crud_exemplar import definir_status_exemplar, status_apos_liberacao, travar_exemplar
 import logging
 
 logger = logging.getLogger(__name__)
 
 def get_reserva(db: Session, reserva_id: int):
-    logger.debug(f"Buscando reserva com id: {reserva_id}")
+    logger.debug("Buscando reserva com id: %s", reserva_id)
     reserva = db.query(models.Reserva).options(
         joinedload(models.Reserva.usuario),
         joinedload(models.Reserva.exemplar).joinedload(models.Exemplar.livro),
         joinedload(models.Reserva.funcionario_registro_reserva)
     ).filter(models.Reserva.id_reserva == reserva_id).first()
     if not reserva:
-        logger.warning(f"Reserva com id {reserva_id} não encontrada.")
+        logger.warning("Reserva com id %s não encontrada.", reserva_id)
     return reserva
 
 def get_reservas(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando reservas com skip: {skip}, limit: {limit}")
+    logger.debug("Buscando reservas com skip: %s, limit: %s", skip, limit)
     return db.query(models.Reserva).options(
         joinedload(models.Reserva.usuario),
         joinedload(models.Reserva.exemplar).joinedload(models.Exemplar.livro),
         joinedload(models.Reserva.funcionario_registro_reserva)
     ).order_by(models.Reserva.data_reserva.desc()).offset(skip).limit(limit).all()
 
+def _escolher_exemplar_para_reserva(db: Session, id_livro: int, id_usuario: int):
+    """
+    Exemplar do livro a reservar, escolhido e travado no banco (FOR UPDATE SKIP LOCKED: exemplares
+    em uso por outra operação ficam de fora). Prefere um exemplar disponível; senão, o emprestado
+    com a devolução prevista mais próxima e sem reserva ativa de outro usuário. Os dois passos usam
+    idx_exemplar_livro_status e idx_emprestimo_ativo_tombo, sem carregar os exemplares do livro.
+    """
+    disponivel = db.query(models.Exemplar).filter(
+        models.Exemplar.id_livro == id_livro,
+        models.Exemplar.status == "disponivel"
+    ).limit(1).with_for_update(skip_locked=True).first()
+    if disponivel:
+        return disponivel
+    reservado_por_outro = exists().where(
+        models.Reserva.numero_tombo == models.Exemplar.numero_tombo,
+        models.Reserva.status == "ativa",
+        models.Reserva.id_usuario != id_usuario
+    )
+    return db.query(models.Exemplar).join(
+        models.Emprestimo,
+        and_(models.Emprestimo.numero_tombo == models.Exemplar.numero_tombo, models.Emprestimo.status_emprestimo == "ativo")
+    ).filter(
+        models.Exemplar.id_livro == id_livro,
+        models.Exemplar.status == "emprestado",
+        ~reservado_por_outro
+    ).order_by(
+        models.Emprestimo.data_prevista_devolucao, models.Exemplar.numero_tombo
+    ).limit(1).with_for_update(of=models.Exemplar, skip_locked=True).first()
+
 def create_reserva(db: Session, reserva: schemas.ReservaCreate):
-    logger.info(f"Tentando criar reserva para usuário ID {reserva.id_usuario}, numero_tombo {getattr(reserva, 'numero_tombo', None)}, livro ID {getattr(reserva, 'id_livro', None)}")
+    logger.info("Tentando criar reserva para usuário ID %s, numero_tombo %s, livro ID %s", reserva.id_usuario, getattr(reserva, 'numero_tombo', None), getattr(reserva, 'id_livro', None))
     db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == reserva.id_usuario).first()
     if not db_usuario:
-        logger.error(f"Usuário com id {reserva.id_usuario} não encontrado ao criar reserva.")
+        logger.error("Usuário com id %s não encontrado ao criar reserva.", reserva.id_usuario)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Usuário com id {reserva.id_usuario} não encontrado.")
     if not db_usuario.is_active:
-        logger.warning(f"Usuário com id {reserva.id_usuario} está inativo.")
+        logger.warning("Usuário com id %s está inativo.", reserva.id_usuario)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Usuário com id {reserva.id_usuario} está inativo.")
     if reserva.id_funcionario_registro:
         db_funcionario = db.query(models.Funcionario).filter(models.Funcionario.id_funcionario == reserva.id_funcionario_registro).first()
         if not db_funcionario:
-            logger.error(f"Funcionário de registro com id {reserva.id_funcionario_registro} não encontrado ao criar reserva.")
+            logger.error("Funcionário de registro com id %s não encontrado ao criar reserva.", reserva.id_funcionario_registro)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Funcionário de registro com id {reserva.id_funcionario_registro} não encontrado.")
         if not db_funcionario.is_active:
-            logger.warning(f"Funcionário de registro com id {reserva.id_funcionario_registro} está inativo.")
+            logger.warning("Funcionário de registro com id %s está inativo.", reserva.id_funcionario_registro)
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Funcionário de registro com id {reserva.id_funcionario_registro} está inativo.")
     numero_tombo = reserva.numero_tombo
     db_exemplar = None
@@ -47,30 +78,25 @@ def create_reserva(db: Session, reserva: schemas.ReservaCreate):
     if not numero_tombo:
         if not reserva.id_livro:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="É obrigatório informar o numero_tombo do exemplar ou o id_livro do livro.")
-        # Seleciona exemplar disponível ou emprestado para o livro
-        db_exemplar = db.query(models.Exemplar).filter(
-            models.Exemplar.id_livro == reserva.id_livro
-        ).all()
-        # Filtra exemplares disponíveis ou emprestados via property dinâmica
-        db_exemplar = next((ex for ex in db_exemplar if ex.status in ["disponivel", "emprestado"]), None)
+        db_exemplar = _escolher_exemplar_para_reserva(db, reserva.id_livro, reserva.id_usuario)
         if not db_exemplar:
-            logger.warning(f"Nenhum exemplar disponível ou emprestado para o livro {reserva.id_livro}.")
+            logger.warning("Nenhum exemplar disponível ou emprestado para o livro %s.", reserva.id_livro)
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não há exemplares disponíveis ou emprestados para reserva deste livro.")
         numero_tombo = db_exemplar.numero_tombo
     else:
-        db_exemplar = db.query(models.Exemplar).filter(models.Exemplar.numero_tombo == numero_tombo).first()
+        db_exemplar = travar_exemplar(db, numero_tombo)
         if not db_exemplar:
-            logger.error(f"Exemplar com numero_tombo {numero_tombo} não encontrado ao criar reserva.")
+            logger.error("Exemplar com numero_tombo %s não encontrado ao criar reserva.", numero_tombo)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Exemplar com numero_tombo {numero_tombo} não encontrado.")
         if db_exemplar.status not in ["disponivel", "emprestado"]:
-            logger.warning(f"Exemplar {numero_tombo} não está disponível nem emprestado para reserva (status: {db_exemplar.status}).")
+            logger.warning("Exemplar %s não está disponível nem emprestado para reserva (status: %s).", numero_tombo, db_exemplar.status)
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar {numero_tombo} não está disponível nem emprestado para reserva.")
     existing_active_reserva_exemplar = db.query(models.Reserva).filter(
         models.Reserva.numero_tombo == numero_tombo,
         models.Reserva.status == "ativa"
     ).first()
     if existing_active_reserva_exemplar and existing_active_reserva_exemplar.id_usuario != reserva.id_usuario:
-         logger.warning(f"Exemplar {numero_tombo} já possui uma reserva ativa por outro usuário.")
+         logger.warning("Exemplar %s já possui uma reserva ativa por outro usuário.", numero_tombo)
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar {numero_tombo} já está reservado ativamente por outro usuário.")
     import datetime
     hoje = datetime.date.today()
@@ -98,14 +124,17 @@ def create_reserva(db: Session, reserva: schemas.ReservaCreate):
     reserva_data.pop("id_livro", None)
     db_reserva = models.Reserva(**reserva_data)
     db.add(db_reserva)
+    # Reserva sobre exemplar emprestado mantém o status; o exemplar fica reservado ao ser devolvido
+    if db_exemplar.status == "disponivel":
+        definir_status_exemplar(db, db_exemplar, "reservado")
     db.commit()
     db.refresh(db_reserva)
     db_reserva.data_prevista_devolucao_emprestimo = data_prevista_devolucao_emprestimo
-    logger.info(f"Reserva ID {db_reserva.id_reserva} criada com sucesso para exemplar {numero_tombo}.")
+    logger.info("Reserva ID %s criada com sucesso para exemplar %s.", db_reserva.id_reserva, numero_tombo)
     return db_reserva
 
 def get_reservas_by_usuario_id(db: Session, usuario_id: int, skip: int = 0, limit: int = 100):
-    logger.debug(f"Buscando reservas para o usuário ID {usuario_id}, skip: {skip}, limit: {limit}")
+    logger.debug("Buscando reservas para o usuário ID %s, skip: %s, limit: %s", usuario_id, skip, limit)
     reservas = db.query(models.Reserva).options(
         joinedload(models.Reserva.usuario),
         joinedload(models.Reserva.exemplar).joinedload(models.Exemplar.livro).joinedload(models.Livro.autores),
@@ -124,19 +153,35 @@ def get_reservas_by_usuario_id(db: Session, usuario_id: int, skip: int = 0, limi
         reservas_read.append(reserva_dict)
     return reservas_read
 
+def cancelar_reserva(db: Session, db_reserva: models.Reserva):
+    """Cancela uma reserva ativa, devolvendo o exemplar à disponibilidade se ele não estiver emprestado."""
+    db_exemplar = travar_exemplar(db, db_reserva.numero_tombo)
+    db.refresh(db_reserva)
+    if db_reserva.status != "ativa":
+        logger.warning("Reserva ID %s deixou de estar ativa (%s) antes do cancelamento.", db_reserva.id_reserva, db_reserva.status)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Só é possível cancelar reservas ativas")
+    db_reserva.status = "cancelada"
+    db.add(db_reserva)
+    if db_exemplar and db_exemplar.status == "reservado":
+        definir_status_exemplar(db, db_exemplar, status_apos_liberacao(db, db_exemplar.numero_tombo))
+    db.commit()
+    db.refresh(db_reserva)
+    logger.info("Reserva ID %s cancelada.", db_reserva.id_reserva)
+    return db_reserva
+
 def delete_reserva(db: Session, reserva_id: int):
-    logger.info(f"Tentando excluir reserva com id: {reserva_id}")
+    logger.info("Tentando excluir reserva com id: %s", reserva_id)
     db_reserva = db.query(models.Reserva).filter(models.Reserva.id_reserva == reserva_id).first()
     if db_reserva:
         exemplar = None
         if db_reserva.numero_tombo:
             exemplar = db.query(models.Exemplar).filter(models.Exemplar.numero_tombo == db_reserva.numero_tombo).first()
         if db_reserva.status == "ativa":
-            logger.warning(f"Reserva ID {reserva_id} está ativa ou atendida. Exclusão não permitida diretamente. Cancele primeiro.")
+            logger.warning("Reserva ID %s está ativa ou atendida. Exclusão não permitida diretamente. Cancele primeiro.", reserva_id)
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reserva ativa ou atendida não pode ser excluída. Cancele-a ou marque como expirada primeiro.")
         db.delete(db_reserva)
         db.commit()
-        logger.info(f"Reserva com id {reserva_id} (status: {db_reserva.status}) excluída com sucesso.")
+        logger.info("Reserva com id %s (status: %s) excluída com sucesso.", reserva_id, db_reserva.status)
     else:
-        logger.warning(f"Reserva com id {reserva_id} não encontrada para exclusão.")
+        logger.warning("Reserva com id %s não encontrada para exclusão.", reserva_id)
     return db_reserva
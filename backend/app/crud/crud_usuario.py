@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException, status
 from .. import models, schemas, security
@@ -8,13 +10,17 @@ logger = logging.getLogger(__name__)
 def get_usuario_by_matricula(db: Session, matricula: str):
     return db.query(models.Usuario).filter(models.Usuario.matricula == matricula).first()
 
+async def get_usuario_by_matricula_async(db: AsyncSession, matricula: str):
+    result = await db.execute(select(models.Usuario).where(models.Usuario.matricula == matricula))
+    return result.scalars().first()
+
 def get_usuario(db: Session, usuario_id: int):
-    logger.debug(f"Buscando usuário com id: {usuario_id}")
+    logger.debug("Buscando usuário com id: %s", usuario_id)
     usuario = db.query(models.Usuario).options(
         joinedload(models.Usuario.curso)
     ).filter(models.Usuario.id_usuario == usuario_id).first()
     if not usuario:
-        logger.warning(f"Usuário com id {usuario_id} não encontrado.")
+        logger.warning("Usuário com id %s não encontrado.", usuario_id)
     return usuario
 
 def get_usuarios(db: Session, skip: int = 0, limit: int = 20, nome_like: str = None, sort_by: str = "nome", sort_dir: str = "asc"):
@@ -32,15 +38,15 @@ def get_usuarios(db: Session, skip: int = 0, limit: int = 20, nome_like: str = N
     return query.offset(skip).limit(limit).all()
 
 def create_usuario(db: Session, usuario: schemas.UsuarioCreate):
-    logger.info(f"Tentando criar usuário com matrícula: {usuario.matricula}")
+    logger.info("Tentando criar usuário com matrícula: %s", usuario.matricula)
     db_usuario_check = get_usuario_by_matricula(db, matricula=usuario.matricula)
     if db_usuario_check:
-        logger.warning(f"Usuário com matrícula {usuario.matricula} já existe.")
+        logger.warning("Usuário com matrícula %s já existe.", usuario.matricula)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Usuário com matrícula {usuario.matricula} já existe.")
     if usuario.id_curso:
         curso = db.query(models.Curso).filter(models.Curso.id_curso == usuario.id_curso).first()
         if not curso:
-            logger.error(f"Curso com id {usuario.id_curso} não encontrado ao tentar criar usuário {usuario.matricula}.")
+            logger.error("Curso com id %s não encontrado ao tentar criar usuário %s.", usuario.id_curso, usuario.matricula)
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Curso com id {usuario.id_curso} não encontrado.")
     hashed_password = security.get_password_hash(usuario.password)
     db_usuario_data = usuario.model_dump(exclude={"password"})
@@ -48,27 +54,28 @@ def create_usuario(db: Session, usuario: schemas.UsuarioCreate):
     db.add(db_usuario)
     db.commit()
     db.refresh(db_usuario)
-    logger.info(f"Usuário '{db_usuario.nome}' (ID: {db_usuario.id_usuario}, Matrícula: {db_usuario.matricula}) criado com sucesso.")
+    logger.info("Usuário '%s' (ID: %s, Matrícula: %s) criado com sucesso.", db_usuario.nome, db_usuario.id_usuario, db_usuario.matricula)
     return db_usuario
 
 def delete_usuario(db: Session, usuario_id: int):
-    logger.info(f"Tentando excluir usuário com id: {usuario_id}")
+    logger.info("Tentando excluir usuário com id: %s", usuario_id)
     db_usuario = db.query(models.Usuario).options(
         selectinload(models.Usuario.emprestimos),
         selectinload(models.Usuario.reservas)
     ).filter(models.Usuario.id_usuario == usuario_id).first()
     if not db_usuario:
-        logger.warning(f"Usuário com id {usuario_id} não encontrado para exclusão.")
+        logger.warning("Usuário com id %s não encontrado para exclusão.", usuario_id)
         return None
     active_emprestimos = [e for e in db_usuario.emprestimos if e.status_emprestimo == "ativo"]
     if active_emprestimos:
-        logger.warning(f"Usuário ID {usuario_id} possui {len(active_emprestimos)} empréstimos ativos. Exclusão não permitida.")
+        logger.warning("Usuário ID %s possui %s empréstimos ativos. Exclusão não permitida.", usuario_id, len(active_emprestimos))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário possui empréstimos ativos e não pode ser excluído.")
     active_reservas = [r for r in db_usuario.reservas if r.status == "ativa"]
     if active_reservas:
-        logger.warning(f"Usuário ID {usuario_id} possui {len(active_reservas)} reservas ativas. Exclusão não permitida.")
+        logger.warning("Usuário ID %s possui %s reservas ativas. Exclusão não permitida.", usuario_id, len(active_reservas))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário possui reservas ativas e não pode ser excluído.")
     db.delete(db_usuario)
     db.commit()
-    logger.info(f"Usuário com id {usuario_id} excluído com sucesso.")
+    security.invalidar_principal("usuario_cliente", db_usuario.matricula)
+    logger.info("Usuário com id %s excluído com sucesso.", usuario_id)
     return db_usuario
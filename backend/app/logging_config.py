@@ -0,0 +1,80 @@
+"""
+Configuração de logging da API.
+
+As chamadas de log só enfileiram o registro (QueueHandler). Formatação e escrita no
+stream ficam com uma thread de fundo (QueueListener), fora do caminho da requisição.
+Por isso o registro vai para a fila sem formatar: use o estilo preguiçoso
+`logger.debug("... %s", valor)` com argumentos simples (números, strings), nunca
+objetos ORM, que seriam lidos depois em outra thread.
+
+Variáveis de ambiente:
+  LOG_LEVEL               nível do logger raiz (padrão INFO)
+  LOG_FORMATO             "json" (uma linha JSON por registro, padrão) ou "texto"
+  LOG_AMOSTRA_SUCESSO     fração (0 a 1) das requisições bem-sucedidas registradas pelo
+                          middleware; erros e requisições lentas são sempre registrados
+  LOG_REQUISICAO_LENTA_MS duração a partir da qual a requisição é sempre registrada
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json")
+LOG_AMOSTRA_SUCESSO = float(os.getenv("LOG_AMOSTRA_SUCESSO", "1.0"))
+LOG_REQUISICAO_LENTA_MS = float(os.getenv("LOG_REQUISICAO_LENTA_MS", "1000"))
+
+FORMATO_TEXTO = "%(asctime)s - %(levelname)s - %(name)s - %(module)s - %(funcName)s - line %(lineno)d - %(message)s"
+
+_listener = None
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro; campos passados em `extra={"campos": {...}}` vão no nível de cima."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+            "modulo": record.module,
+            "funcao": record.funcName,
+            "linha": record.lineno,
+            "pid": record.process,
+        }
+        campos = getattr(record, "campos", None)
+        if campos:
+            dados.update(campos)
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerPreguicoso(logging.handlers.QueueHandler):
+    """QueueHandler que não formata a mensagem ao enfileirar: o listener formata depois."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configurar_logging() -> None:
+    """Instala o QueueHandler no logger raiz e inicia o listener (uma vez por processo)."""
+    global _listener
+    if _listener is not None:
+        return
+    saida = logging.StreamHandler()
+    saida.setFormatter(FormatadorJSON() if LOG_FORMATO == "json" else logging.Formatter(FORMATO_TEXTO))
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    raiz.setLevel(LOG_LEVEL)
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(_QueueHandlerPreguicoso(fila))
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+    _listener.start()
+    # Esvazia a fila ao encerrar o processo, para não perder os últimos registros
+    atexit.register(_listener.stop)
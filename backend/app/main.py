@@ -1,29 +1,25 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import os # Import os to access environment variables
 import logging # Import logging
+import random
 import time # For request timing
 
 # Ajuste: todos os imports de routers no topo
-from app.routers import livros, categorias, usuarios, emprestimos, reservas, auth, funcionarios, devolucoes, autores, exemplares, cursos
-from app import models # To create tables if needed
-from app.database import engine # Import engine if you uncomment create_all
+from app.routers import livros, categorias, usuarios, emprestimos, reservas, auth, funcionarios, devolucoes, autores, exemplares, cursos, admin
+from app import metrics, models # To create tables if needed
+from app.database import engine, marcar_escrita # Import engine if you uncomment create_all
+from app.logging_config import LOG_AMOSTRA_SUCESSO, LOG_REQUISICAO_LENTA_MS, configurar_logging
 
 # Create database tables (Only for development/initial setup if not using Alembic)
 # models.Base.metadata.create_all(bind=engine)
 
 # --- Logging Configuration ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(module)s - %(funcName)s - line %(lineno)d - %(message)s",
-    handlers=[
-        logging.StreamHandler() # Logs to console
-        # You can add logging.FileHandler("app.log") here to log to a file
-    ]
-)
+# Fila + listener em background, saída JSON por padrão (ver app/logging_config.py)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Bibliodex API")
@@ -31,10 +27,7 @@ app = FastAPI(title="Bibliodex API")
 # --- Exception Handlers ---
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    logger.error(
-        f"HTTPException: {exc.status_code} {exc.detail} "
-        f"for {request.method} {request.url}"
-    )
+    logger.error("HTTPException: %s %s for %s %s", exc.status_code, exc.detail, request.method, request.url.path)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
@@ -49,8 +42,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         message = error['msg']
         error_messages.append(f"Field '{field}': {message}")
     logger.error(
-        f"RequestValidationError: {error_messages} "
-        f"for {request.method} {request.url} - Body: {await request.body()}"
+        "RequestValidationError: %s for %s %s - Body: %s",
+        error_messages, request.method, request.url, await request.body(),
     )
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -60,7 +53,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     logger.exception(
-        f"UnhandledException: {exc} for {request.method} {request.url}"
+        "UnhandledException: %s for %s %s", exc, request.method, request.url
     )  # Logs stack trace
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,28 +61,62 @@ async def generic_exception_handler(request: Request, exc: Exception):
     )
 
 # --- Request Logging Middleware ---
+# Uma linha por requisição, com os dados em campos estruturados. Requisições bem-sucedidas
+# e rápidas são amostradas (LOG_AMOSTRA_SUCESSO); erros e lentas sempre entram no log.
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    client_host = request.client.host if request.client else "unknown"
-    user_agent = request.headers.get("user-agent", "unknown")
-    logger.info(
-        f"Requisição recebida: {request.method} {request.url} | IP: {client_host} | User-Agent: {user_agent}"
-    )
+    inicio = time.perf_counter()
     try:
         response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"Requisição finalizada: {request.method} {request.url} | Status: {response.status_code} | "
-            f"IP: {client_host} | User-Agent: {user_agent} | Duração: {process_time:.4f}s"
-        )
-    except Exception as e:
-        process_time = time.time() - start_time
+    except Exception:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
         logger.exception(
-            f"Erro durante a requisição: {request.method} {request.url} | IP: {client_host} | "
-            f"User-Agent: {user_agent} | Duração: {process_time:.4f}s"
+            "Erro durante a requisição: %s %s (%.1fms)", request.method, request.url.path, duracao_ms,
+            extra={"campos": _campos_requisicao(request, 500, duracao_ms)},
         )
-        raise e
+        raise
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    registrar = (
+        response.status_code >= 400
+        or duracao_ms >= LOG_REQUISICAO_LENTA_MS
+        or LOG_AMOSTRA_SUCESSO >= 1
+        or random.random() < LOG_AMOSTRA_SUCESSO
+    )
+    if registrar and logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Requisição finalizada: %s %s | Status: %s | Duração: %.1fms",
+            request.method, request.url.path, response.status_code, duracao_ms,
+            extra={"campos": _campos_requisicao(request, response.status_code, duracao_ms)},
+        )
+    return response
+
+def _campos_requisicao(request: Request, status_code: int, duracao_ms: float) -> dict:
+    return {
+        "metodo": request.method,
+        "caminho": request.url.path,
+        "query": request.url.query or None,
+        "status": status_code,
+        "duracao_ms": round(duracao_ms, 2),
+        "ip": request.client.host if request.client else "unknown",
+        "user_agent": request.headers.get("user-agent", "unknown"),
+    }
+
+# --- Métricas (Prometheus) ---
+app.middleware("http")(metrics.medir_requisicao)
+
+@app.get("/metrics", include_in_schema=False)
+def expor_metricas():
+    """Métricas no formato texto do Prometheus (ver app/metrics.py)."""
+    corpo, content_type = metrics.gerar_metricas()
+    return Response(content=corpo, media_type=content_type)
+
+# --- Read-your-writes com réplicas ---
+# Após uma escrita bem-sucedida, as leituras do cliente ficam no primário por alguns segundos
+@app.middleware("http")
+async def primario_apos_escrita(request: Request, call_next):
+    response = await call_next(request)
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        marcar_escrita(request, response)
     return response
 
 # Adicionando CORS para permitir requisições do frontend
@@ -117,6 +144,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Codigo-Rejeicao", "Retry-After"], # Motivo de recusa do empréstimo e espera após limite de login, lidos pelo frontend
 )
 
 # Include Routers
@@ -131,6 +159,7 @@ app.include_router(devolucoes.router)
 app.include_router(autores.router, prefix="/autores", tags=["Autores"])
 app.include_router(exemplares.router, prefix="/exemplares", tags=["Exemplares"])
 app.include_router(cursos.router, prefix="/cursos", tags=["Cursos"])
+app.include_router(admin.router)
 # ... include other routers for Funcionario, Devolucao, Penalidade, Curso
 
 @app.get("/")
@@ -0,0 +1,171 @@
+"""
+Métricas no formato do Prometheus, expostas em GET /metrics.
+
+- Latência por rota (template, ex. /livros/{livro_id}), método e status, e requisições
+  em andamento por método;
+- Consultas ao banco por requisição: quantidade e tempo total, por rota;
+- Estado dos pools de conexão (app/pool.py) e dos caches em memória (app/cache.py).
+
+Com vários workers do gunicorn, defina PROMETHEUS_MULTIPROC_DIR (o gunicorn.conf.py faz
+isso): cada worker grava as métricas em arquivos nesse diretório e qualquer worker que
+receber o scrape soma os de todos. Pools e caches são lidos do estado de cada worker,
+que os copia para gauges no máximo a cada METRICAS_INTERVALO_GAUGES segundos.
+"""
+import contextvars
+import os
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import cache, pool
+
+MULTIPROCESSO = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+METRICAS_INTERVALO_GAUGES = float(os.getenv("METRICAS_INTERVALO_GAUGES", "5"))
+# Rótulo das requisições que não casaram com nenhuma rota (404), para não explodir a cardinalidade
+ROTA_DESCONHECIDA = "desconhecida"
+
+requisicao_duracao = Histogram(
+    "bibliodex_http_requisicao_duracao_segundos",
+    "Duração das requisições HTTP",
+    ["metodo", "rota", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+requisicoes_em_andamento = Gauge(
+    "bibliodex_http_requisicoes_em_andamento",
+    "Requisições HTTP em processamento",
+    ["metodo"],
+    multiprocess_mode="livesum",
+)
+db_consultas = Counter(
+    "bibliodex_db_consultas",
+    "Consultas executadas no banco",
+    ["rota"],
+)
+db_consultas_por_requisicao = Histogram(
+    "bibliodex_db_consultas_por_requisicao",
+    "Consultas ao banco feitas por uma requisição",
+    ["rota"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+db_tempo_por_requisicao = Histogram(
+    "bibliodex_db_tempo_por_requisicao_segundos",
+    "Tempo total em consultas ao banco durante uma requisição",
+    ["rota"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+pool_conexoes = Gauge(
+    "bibliodex_db_pool_conexoes",
+    "Conexões do pool por estado (em_uso, ociosas, overflow)",
+    ["pool", "estado"],
+    multiprocess_mode="livesum",
+)
+pool_eventos = Gauge(
+    "bibliodex_db_pool_eventos",
+    "Contadores acumulados do pool (checkouts, timeouts, conexões abertas/fechadas/invalidadas)",
+    ["pool", "evento"],
+    multiprocess_mode="livesum",
+)
+cache_consultas = Gauge(
+    "bibliodex_cache_consultas",
+    "Consultas acumuladas aos caches em memória, por resultado (hit, miss)",
+    ["cache", "resultado"],
+    multiprocess_mode="livesum",
+)
+cache_entradas = Gauge(
+    "bibliodex_cache_entradas",
+    "Entradas atuais nos caches em memória",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+
+
+class _ConsultasDaRequisicao:
+    __slots__ = ("quantidade", "tempo")
+
+    def __init__(self):
+        self.quantidade = 0
+        self.tempo = 0.0
+
+
+# Consultas da requisição atual; o contexto acompanha a rota para o threadpool e para as sessões async
+_consultas_atuais: contextvars.ContextVar = contextvars.ContextVar("consultas_da_requisicao", default=None)
+
+
+# Vale para todas as engines (primário, réplicas, síncronas e assíncronas)
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_metricas = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    consultas = _consultas_atuais.get()
+    if consultas is not None:
+        consultas.quantidade += 1
+        inicio = getattr(context, "_inicio_metricas", None)
+        if inicio is not None:
+            consultas.tempo += time.perf_counter() - inicio
+
+
+_gauges_lock = threading.Lock()
+_gauges_atualizados_em = 0.0
+
+
+def atualizar_gauges(forcar: bool = False) -> None:
+    """Copia o estado dos pools e caches deste worker para os gauges (no máximo a cada intervalo)."""
+    global _gauges_atualizados_em
+    agora = time.monotonic()
+    if not forcar and agora - _gauges_atualizados_em < METRICAS_INTERVALO_GAUGES:
+        return
+    with _gauges_lock:
+        _gauges_atualizados_em = agora
+        for p in pool.estatisticas():
+            for estado in ("em_uso", "ociosas", "overflow"):
+                if p[estado] is not None:
+                    pool_conexoes.labels(p["nome"], estado).set(p[estado])
+            for evento in ("checkouts", "timeouts", "conexoes_abertas", "conexoes_fechadas", "conexoes_invalidadas"):
+                pool_eventos.labels(p["nome"], evento).set(p[evento])
+        for c in cache.estatisticas():
+            cache_consultas.labels(c["nome"], "hit").set(c["hits"])
+            cache_consultas.labels(c["nome"], "miss").set(c["misses"])
+            cache_entradas.labels(c["nome"]).set(c["tamanho"])
+
+
+async def medir_requisicao(request, call_next):
+    """Middleware HTTP: latência, requisições em andamento e consultas ao banco por rota."""
+    em_andamento = requisicoes_em_andamento.labels(request.method)
+    em_andamento.inc()
+    consultas = _ConsultasDaRequisicao()
+    token = _consultas_atuais.set(consultas)
+    inicio = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        duracao = time.perf_counter() - inicio
+        _consultas_atuais.reset(token)
+        em_andamento.dec()
+        rota = getattr(request.scope.get("route"), "path", ROTA_DESCONHECIDA)
+        requisicao_duracao.labels(request.method, rota, str(status_code)).observe(duracao)
+        if consultas.quantidade:
+            db_consultas.labels(rota).inc(consultas.quantidade)
+        db_consultas_por_requisicao.labels(rota).observe(consultas.quantidade)
+        db_tempo_por_requisicao.labels(rota).observe(consultas.tempo)
+        atualizar_gauges()
+
+
+def gerar_metricas() -> tuple:
+    """Corpo e content-type da resposta de /metrics (somando todos os workers no modo multiprocesso)."""
+    atualizar_gauges(forcar=True)
+    if MULTIPROCESSO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return generate_latest(registro), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
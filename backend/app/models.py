@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Table, Float, Boolean # Adicionado Boolean
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Table, Float, Boolean, Index, text # Adicionado Boolean
 from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from typing import Optional, List as PyList
 from datetime import date as PyDate
@@ -9,11 +10,26 @@ Base = declarative_base()
 escrito_por = Table(
     "escrito_por", Base.metadata,
     Column("id_autor", Integer, ForeignKey("autor.id_autor"), primary_key=True),
-    Column("id_livro", Integer, ForeignKey("livro.id_livro"), primary_key=True)
+    Column("id_livro", Integer, ForeignKey("livro.id_livro"), primary_key=True),
+    # A PK (id_autor, id_livro) serve a busca de livros por autor; este índice serve o caminho
+    # inverso (EXISTS por livro no filtro de autor, autores de uma página de livros)
+    Index("idx_escrito_por_livro_autor", "id_livro", "id_autor")
 )
 
 class Livro(Base):
     __tablename__ = "livro"
+    __table_args__ = (
+        # Paginação por keyset: (coluna de ordenação, id_livro)
+        Index("idx_livro_titulo_id", "titulo", "id_livro"),
+        Index("idx_livro_editora_id", "editora", "id_livro"),
+        Index("idx_livro_ano_publicacao_id", "ano_publicacao", "id_livro"),
+        Index("idx_livro_edicao_id", "edicao", "id_livro"),
+        Index("idx_livro_isbn_id", "isbn", "id_livro"),
+        Index("idx_livro_busca_vector", "busca_vector", postgresql_using="gin"),
+        # Trigramas: ILIKE '%termo%' e busca por similaridade
+        Index("idx_livro_titulo_trgm", "titulo", postgresql_using="gin", postgresql_ops={"titulo": "gin_trgm_ops"}),
+        Index("idx_livro_editora_trgm", "editora", postgresql_using="gin", postgresql_ops={"editora": "gin_trgm_ops"}),
+    )
     id_livro: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     titulo: Mapped[str] = mapped_column(String)
     edicao: Mapped[Optional[str]] = mapped_column(String, nullable=True)
@@ -22,12 +38,21 @@ class Livro(Base):
     ano_publicacao: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     status_geral: Mapped[Optional[str]] = mapped_column(String, nullable=True, comment="Status geral do título, ex: ativo, descatalogado")
     id_categoria: Mapped[int] = mapped_column(Integer, ForeignKey("categoria.id_categoria"))
+    # Contadores de exemplares, atualizados na mesma transação de cada empréstimo, devolução,
+    # reserva e criação/exclusão de exemplar (crud_livro.ajustar_contadores_exemplares)
+    total_exemplares: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    exemplares_disponiveis: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # Mantido por triggers no banco (título, autores e editora); nunca escrito pela aplicação
+    busca_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True, comment="Documento full-text de título, autores e editora")
     categoria: Mapped["Categoria"] = relationship("Categoria", back_populates="livros")
     autores: Mapped[PyList["Autor"]] = relationship("Autor", secondary=escrito_por, back_populates="livros")
     exemplares: Mapped[PyList["Exemplar"]] = relationship("Exemplar", back_populates="livro")
 
 class Autor(Base):
     __tablename__ = "autor"
+    __table_args__ = (
+        Index("idx_autor_nome_trgm", "nome", postgresql_using="gin", postgresql_ops={"nome": "gin_trgm_ops"}),
+    )
     id_autor: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String)
     ano_nasc: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -81,8 +106,13 @@ class Funcionario(Base):
 
 class Exemplar(Base):
     __tablename__ = "exemplar"
+    __table_args__ = (
+        Index("idx_exemplar_livro_status", "id_livro", "status"),
+    )
     numero_tombo: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     codigo_identificacao: Mapped[str] = mapped_column(String, unique=True, index=True, comment="Código único do exemplar, ex: código de barras")
+    # Gravado pelas operações de circulação (crud_exemplar.definir_status_exemplar)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="disponivel", server_default="disponivel", comment="Status: disponivel, emprestado, reservado, em_manutencao, perdido, descartado")
     data_aquisicao: Mapped[Optional[PyDate]] = mapped_column(Date, nullable=True)
     observacoes: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     localizacao: Mapped[Optional[str]] = mapped_column(String, nullable=True, comment="Localização física do exemplar na biblioteca.")
@@ -91,19 +121,19 @@ class Exemplar(Base):
     emprestimos: Mapped[PyList["Emprestimo"]] = relationship("Emprestimo", back_populates="exemplar")
     reservas: Mapped[PyList["Reserva"]] = relationship("Reserva", foreign_keys="[Reserva.numero_tombo]", back_populates="exemplar")
 
-    @property
-    def status(self):
-        # 1. Se há empréstimo ativo, status é 'emprestado'
-        if self.emprestimos and any(e.status_emprestimo == 'ativo' for e in self.emprestimos):
-            return 'emprestado'
-        # 2. Se há reserva ativa, status é 'reservado'
-        if self.reservas and any(r.status == 'ativa' for r in self.reservas):
-            return 'reservado'
-        # 3. Caso contrário, está disponível
-        return 'disponivel'
-
 class Emprestimo(Base):
     __tablename__ = "emprestimo"
+    __table_args__ = (
+        Index(
+            "idx_emprestimo_ativo_tombo", "numero_tombo", text("data_prevista_devolucao DESC"),
+            postgresql_where=text("status_emprestimo = 'ativo'")
+        ),
+        # No máximo um empréstimo ativo por exemplar
+        Index(
+            "uq_emprestimo_ativo_exemplar", "numero_tombo", unique=True,
+            postgresql_where=text("status_emprestimo = 'ativo'")
+        ),
+    )
     id_emprestimo: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     data_retirada: Mapped[PyDate] = mapped_column(Date, nullable=False)
     data_prevista_devolucao: Mapped[PyDate] = mapped_column(Date, nullable=False)
@@ -120,6 +150,12 @@ class Emprestimo(Base):
 
 class Reserva(Base):
     __tablename__ = "reserva"
+    __table_args__ = (
+        Index(
+            "idx_reserva_ativa_tombo", "numero_tombo", "data_reserva", "id_reserva",
+            postgresql_where=text("status = 'ativa'")
+        ),
+    )
     id_reserva: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     data_reserva: Mapped[PyDate] = mapped_column(Date, nullable=False)
     data_validade_reserva: Mapped[PyDate] = mapped_column(Date, nullable=False)
@@ -0,0 +1,182 @@
+"""
+Configuração e métricas do pool de conexões com o PostgreSQL.
+
+Os parâmetros do pool vêm de um perfil (DB_POOL_PERFIL: desenvolvimento ou producao)
+e cada um pode ser sobrescrito por variável de ambiente. Cada worker do gunicorn tem o
+seu próprio pool, então o total de conexões é aproximadamente
+workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW) por engine, e deve caber em `max_connections`.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+PERFIS_POOL = {
+    "desenvolvimento": {
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 10.0,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    },
+    "producao": {
+        "pool_size": 10,
+        "max_overflow": 5,
+        "pool_timeout": 5.0,
+        "pool_pre_ping": True,
+        "pool_recycle": 900,
+    },
+}
+
+# Esperas por conexão acima deste limite (segundos) são registradas em log
+LIMITE_ESPERA_ALERTA = float(os.getenv("DB_POOL_ESPERA_ALERTA", "0.5"))
+
+# Métricas de todos os pools criados, por nome da engine
+metricas: Dict[str, "MetricasPool"] = {}
+
+
+def _env_bool(nome: str, padrao: bool) -> bool:
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def config_pool() -> dict:
+    """Parâmetros de pool para create_engine, conforme o perfil e as variáveis de ambiente."""
+    perfil = os.getenv("DB_POOL_PERFIL", "desenvolvimento")
+    if perfil not in PERFIS_POOL:
+        raise RuntimeError(f"DB_POOL_PERFIL inválido: '{perfil}'. Use um de: {', '.join(PERFIS_POOL)}")
+    base = PERFIS_POOL[perfil]
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", base["pool_size"])),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", base["max_overflow"])),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", base["pool_timeout"])),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", base["pool_pre_ping"]),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", base["pool_recycle"])),
+    }
+
+
+class MetricasPool:
+    """Contadores de uso de um pool, alimentados pelos eventos do SQLAlchemy. Seguro entre threads."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.pool = None
+        self.iniciado_em = time.monotonic()
+        self._lock = threading.Lock()
+        self.conexoes_abertas = 0
+        self.conexoes_fechadas = 0
+        self.conexoes_invalidadas = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        metricas[nome] = self
+
+    def registrar_espera(self, segundos: float, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+        if timeout:
+            logger.warning("Pool '%s': timeout após %.3fs aguardando conexão (pid %s).", self.nome, segundos, os.getpid())
+        elif segundos >= LIMITE_ESPERA_ALERTA:
+            logger.warning("Pool '%s': %.3fs aguardando conexão (pid %s).", self.nome, segundos, os.getpid())
+
+    def _incrementar(self, contador: str) -> None:
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def stats(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            minutos = max((time.monotonic() - self.iniciado_em) / 60, 1e-9)
+            esperas = self.checkouts + self.timeouts
+            return {
+                "nome": self.nome,
+                "pid": os.getpid(),
+                "tamanho": pool.size() if pool is not None else None,
+                "em_uso": pool.checkedout() if pool is not None else None,
+                "ociosas": pool.checkedin() if pool is not None else None,
+                # QueuePool.overflow() é negativo enquanto o pool base não foi todo aberto
+                "overflow": max(pool.overflow(), 0) if pool is not None else None,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "espera_media": (self.espera_total / esperas) if esperas else 0.0,
+                "espera_max": self.espera_max,
+                "conexoes_abertas": self.conexoes_abertas,
+                "conexoes_fechadas": self.conexoes_fechadas,
+                "conexoes_invalidadas": self.conexoes_invalidadas,
+                "conexoes_abertas_por_minuto": self.conexoes_abertas / minutos,
+            }
+
+
+class _EsperaMedida:
+    """Mixin que mede quanto tempo cada checkout espera por uma conexão livre."""
+
+    metricas_pool: MetricasPool = None
+
+    def _do_get(self):
+        inicio = time.monotonic()
+        try:
+            conexao = super()._do_get()
+        except exc.TimeoutError:
+            if self.metricas_pool is not None:
+                self.metricas_pool.registrar_espera(time.monotonic() - inicio, timeout=True)
+            raise
+        if self.metricas_pool is not None:
+            self.metricas_pool.registrar_espera(time.monotonic() - inicio)
+        return conexao
+
+    def recreate(self):
+        # dispose()/reset recria o pool: as métricas continuam valendo para o novo
+        novo = super().recreate()
+        novo.metricas_pool = self.metricas_pool
+        if self.metricas_pool is not None:
+            self.metricas_pool.pool = novo
+        return novo
+
+
+class QueuePoolMedido(_EsperaMedida, QueuePool):
+    pass
+
+
+class AsyncQueuePoolMedido(_EsperaMedida, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrumentar(nome: str, engine: Engine) -> MetricasPool:
+    """Liga as métricas ao pool da engine (síncrona ou `async_engine.sync_engine`)."""
+    m = MetricasPool(nome)
+    m.pool = engine.pool
+    engine.pool.metricas_pool = m
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        m._incrementar("conexoes_abertas")
+
+    @event.listens_for(engine, "close")
+    def _close(dbapi_connection, connection_record):
+        m._incrementar("conexoes_fechadas")
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        m._incrementar("conexoes_invalidadas")
+
+    return m
+
+
+def estatisticas() -> list:
+    """Estatísticas de todos os pools deste processo."""
+    return [m.stats() for m in metricas.values()]
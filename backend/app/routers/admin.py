@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+import logging
+
+from app import cache, pool, throttling
+from app.routers.auth import get_current_active_funcionario
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Administração"],
+    dependencies=[Depends(get_current_active_funcionario)]
+)
+logger = logging.getLogger(__name__)
+
+@router.get("/caches")
+def estatisticas_caches():
+    """
+    Estatísticas dos caches em memória deste processo (tamanho, hits, misses, evictions),
+    para dimensionar maxsize/TTL via variáveis de ambiente.
+    """
+    estatisticas = cache.estatisticas()
+    logger.debug("Estatísticas de %s caches consultadas.", len(estatisticas))
+    return estatisticas
+
+@router.get("/pool")
+def estatisticas_pool():
+    """
+    Estado dos pools de conexão deste worker: conexões em uso, ociosas e em overflow,
+    tempo de espera por conexão, timeouts e abertura/fechamento de conexões (churn).
+    """
+    estatisticas = pool.estatisticas()
+    logger.debug("Estatísticas de %s pools consultadas.", len(estatisticas))
+    return estatisticas
+
+@router.get("/throttling")
+def estatisticas_throttling():
+    """
+    Limites de login deste worker e quantas tentativas foram admitidas ou recusadas
+    (por IP, por username ou por excesso de verificações de senha simultâneas).
+    """
+    return throttling.estatisticas()
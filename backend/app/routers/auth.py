@@ -1,15 +1,15 @@
 from fastapi import Depends, HTTPException, status, APIRouter # Added APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm # Added OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from typing import Annotated # Para Python 3.9+
 from datetime import timedelta
 import logging # Import logging
 
 
-from app import schemas, models, crud, security 
+from app import schemas, models, crud, security, throttling
 
-from app.database import get_db
+from app.database import get_async_db
 
 router = APIRouter(tags=["Autenticação"]) # Define router for auth endpoints
 
@@ -49,120 +49,210 @@ async def get_current_user_data(
         role: str = payload.get("role")
         # Checagem redundante, mas garante robustez
         if username is None or user_id is None or role is None:
-            logger.warning(f"Token inválido ou incompleto recebido: {token[:20]}...")
+            logger.warning("Token inválido ou incompleto recebido: %s...", token[:20])
             raise credentials_exception
         token_data = schemas.TokenData(sub=username, user_id=user_id, role=role)
     except Exception as e:
-        logger.warning(f"Erro ao decodificar/validar token JWT: {e} - Token: {token[:20]}...")
+        logger.warning("Erro ao decodificar/validar token JWT: %s - Token: %s...", e, token[:20])
         raise credentials_exception
     return token_data
 
 
+# Atributos guardados no cache de principais (security.principal_cache), por papel.
+# A senha fica de fora: o login sempre consulta o banco.
+CAMPOS_PRINCIPAL = {
+    "funcionario": (models.Funcionario, ("id_funcionario", "nome", "cargo", "matricula_funcional", "is_active")),
+    "usuario_cliente": (models.Usuario, ("id_usuario", "nome", "telefone", "matricula", "email", "id_curso", "is_active")),
+}
+# Atributos que recebem as claims user_id e sub do token, no modo só-claims
+CLAIMS_PRINCIPAL = {
+    "funcionario": ("id_funcionario", "matricula_funcional"),
+    "usuario_cliente": ("id_usuario", "matricula"),
+}
+
+
+async def _carregar_principal(token_data: schemas.TokenData, db: AsyncSession):
+    """
+    Funcionário ou usuário do token, pelo cache de principais ou, na falta, pelo banco.
+    Devolve um objeto transiente (fora de sessão) com os atributos de CAMPOS_PRINCIPAL,
+    ou None se a matrícula não existe mais.
+    """
+    modelo, campos = CAMPOS_PRINCIPAL[token_data.role]
+    chave = (token_data.role, token_data.sub)
+    dados = security.principal_cache.get(chave)
+    if dados is None:
+        if token_data.role == "funcionario":
+            principal = await crud.get_funcionario_by_matricula_funcional_async(db, matricula_funcional=token_data.sub)
+        else:
+            principal = await crud.get_usuario_by_matricula_async(db, matricula=token_data.sub)
+        if principal is None:
+            return None
+        dados = {campo: getattr(principal, campo) for campo in campos}
+        security.principal_cache.set(chave, dados)
+    return modelo(**dados)
+
+
+def _principal_das_claims(token_data: schemas.TokenData):
+    """
+    Principal para o modo só-claims: o do cache, se houver, senão montado a partir do token
+    (id e matrícula apenas), sem acessar o banco. Uma desativação pode levar até a expiração
+    do token de acesso para valer aqui; use só em rotas de leitura.
+    """
+    modelo, _ = CAMPOS_PRINCIPAL[token_data.role]
+    dados = security.principal_cache.get((token_data.role, token_data.sub))
+    if dados is not None:
+        return modelo(**dados)
+    campo_id, campo_sub = CLAIMS_PRINCIPAL[token_data.role]
+    return modelo(**{campo_id: token_data.user_id, campo_sub: token_data.sub, "is_active": True})
+
+
 # Passo 1.2: Dependência para obter o Funcionário ativo atual
 async def get_current_active_funcionario(
     token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> models.Funcionario:
     """
-    Verifica se o token pertence a um Funcionário, busca o funcionário no banco
-    e verifica se ele está ativo.
+    Verifica se o token pertence a um Funcionário, busca o funcionário (cache de
+    principais ou banco) e verifica se ele está ativo.
     Retorna o objeto models.Funcionario.
     Lança HTTPException se o papel for incorreto, funcionário não encontrado ou inativo.
     """
     if token_data.role != "funcionario":
-        logger.warning(f"Tentativa de acesso à rota de funcionário com papel '{token_data.role}' para sub '{token_data.sub}'.")
+        logger.warning("Tentativa de acesso à rota de funcionário com papel '%s' para sub '%s'.", token_data.role, token_data.sub)
         raise permission_denied_exception # Papel incorreto
 
     # A matrícula funcional está no campo 'sub' do token_data
-    funcionario = crud.get_funcionario_by_matricula_funcional(db, matricula_funcional=token_data.sub)
+    funcionario = await _carregar_principal(token_data, db)
     
     if funcionario is None:
-        logger.warning(f"Funcionário com matrícula '{token_data.sub}' (do token) não encontrado no banco.")
+        logger.warning("Funcionário com matrícula '%s' (do token) não encontrado no banco.", token_data.sub)
         raise credentials_exception # Funcionário não encontrado (token pode ser válido, mas o usuário não existe mais)
     if not funcionario.is_active:
-        logger.warning(f"Funcionário '{funcionario.matricula_funcional}' (ID: {funcionario.id_funcionario}) está inativo.")
+        logger.warning("Funcionário '%s' (ID: %s) está inativo.", funcionario.matricula_funcional, funcionario.id_funcionario)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário inativo")
     
-    logger.debug(f"Funcionário ativo '{funcionario.matricula_funcional}' autenticado via token.")
+    logger.debug("Funcionário ativo '%s' autenticado via token.", funcionario.matricula_funcional)
     return funcionario
 
 
 # Passo 1.3: Dependência para obter o Usuário (cliente) ativo atual
 async def get_current_active_usuario_cliente(
     token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> models.Usuario:
     """
-    Verifica se o token pertence a um Usuário (cliente), busca o usuário no banco
-    e verifica se ele está ativo.
+    Verifica se o token pertence a um Usuário (cliente), busca o usuário (cache de
+    principais ou banco) e verifica se ele está ativo.
     Retorna o objeto models.Usuario.
     Lança HTTPException se o papel for incorreto, usuário não encontrado ou inativo.
     """
     if token_data.role != "usuario_cliente":
-        logger.warning(f"Tentativa de acesso à rota de usuário cliente com papel '{token_data.role}' para sub '{token_data.sub}'.")
+        logger.warning("Tentativa de acesso à rota de usuário cliente com papel '%s' para sub '%s'.", token_data.role, token_data.sub)
         raise permission_denied_exception # Papel incorreto
 
     # A matrícula do usuário está no campo 'sub' do token_data
-    usuario = crud.get_usuario_by_matricula(db, matricula=token_data.sub)
+    usuario = await _carregar_principal(token_data, db)
 
     if usuario is None:
-        logger.warning(f"Usuário com matrícula '{token_data.sub}' (do token) não encontrado no banco.")
+        logger.warning("Usuário com matrícula '%s' (do token) não encontrado no banco.", token_data.sub)
         raise credentials_exception # Usuário não encontrado
     if not usuario.is_active:
-        logger.warning(f"Usuário '{usuario.matricula}' (ID: {usuario.id_usuario}) está inativo.")
+        logger.warning("Usuário '%s' (ID: %s) está inativo.", usuario.matricula, usuario.id_usuario)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário inativo")
         
-    logger.debug(f"Usuário cliente ativo '{usuario.matricula}' autenticado via token.")
+    logger.debug("Usuário cliente ativo '%s' autenticado via token.", usuario.matricula)
     return usuario
 
 # Dependência para obter o usuário autenticado (funcionário OU cliente)
 async def get_current_user(
     token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> models.Usuario | models.Funcionario:
     """
     Retorna o usuário autenticado (funcionário ou cliente), validando se está ativo.
     Lança HTTPException se não encontrado ou inativo.
     """
-    if token_data.role == "funcionario":
-        funcionario = crud.get_funcionario_by_matricula_funcional(db, matricula_funcional=token_data.sub)
-        if funcionario is None:
-            logger.warning(f"Funcionário com matrícula '{token_data.sub}' não encontrado.")
-            raise credentials_exception
-        if not funcionario.is_active:
-            logger.warning(f"Funcionário '{funcionario.matricula_funcional}' está inativo.")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário inativo")
-        # Adiciona atributo de role para facilitar uso posterior
-        funcionario.role = "funcionario"
-        return funcionario
-    elif token_data.role == "usuario_cliente":
-        usuario = crud.get_usuario_by_matricula(db, matricula=token_data.sub)
-        if usuario is None:
-            logger.warning(f"Usuário com matrícula '{token_data.sub}' não encontrado.")
-            raise credentials_exception
-        if not usuario.is_active:
-            logger.warning(f"Usuário '{usuario.matricula}' está inativo.")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário inativo")
-        usuario.role = "usuario_cliente"
-        return usuario
-    else:
-        logger.warning(f"Papel desconhecido no token: {token_data.role}")
+    if token_data.role not in CAMPOS_PRINCIPAL:
+        logger.warning("Papel desconhecido no token: %s", token_data.role)
         raise permission_denied_exception
+    principal = await _carregar_principal(token_data, db)
+    if principal is None:
+        logger.warning("Principal '%s' com matrícula '%s' não encontrado.", token_data.role, token_data.sub)
+        raise credentials_exception
+    if not principal.is_active:
+        logger.warning("Principal '%s' com matrícula '%s' está inativo.", token_data.role, token_data.sub)
+        detalhe = "Funcionário inativo" if token_data.role == "funcionario" else "Usuário inativo"
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detalhe)
+    # Adiciona atributo de role para facilitar uso posterior
+    principal.role = token_data.role
+    return principal
+
+
+# Modo só-claims: para rotas de leitura que toleram defasagem, sem ida ao banco
+async def get_current_funcionario_claims(
+    token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
+) -> models.Funcionario:
+    """
+    Como get_current_active_funcionario, mas confia nas claims do token quando o funcionário
+    não está no cache de principais. Garante apenas id_funcionario e matricula_funcional.
+    """
+    if token_data.role != "funcionario":
+        logger.warning("Tentativa de acesso à rota de funcionário com papel '%s' para sub '%s'.", token_data.role, token_data.sub)
+        raise permission_denied_exception
+    funcionario = _principal_das_claims(token_data)
+    if not funcionario.is_active:
+        logger.warning("Funcionário '%s' (ID: %s) está inativo.", funcionario.matricula_funcional, funcionario.id_funcionario)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Funcionário inativo")
+    return funcionario
+
+
+async def get_current_usuario_cliente_claims(
+    token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
+) -> models.Usuario:
+    """
+    Como get_current_active_usuario_cliente, mas confia nas claims do token quando o usuário
+    não está no cache de principais. Garante apenas id_usuario e matricula.
+    """
+    if token_data.role != "usuario_cliente":
+        logger.warning("Tentativa de acesso à rota de usuário cliente com papel '%s' para sub '%s'.", token_data.role, token_data.sub)
+        raise permission_denied_exception
+    usuario = _principal_das_claims(token_data)
+    if not usuario.is_active:
+        logger.warning("Usuário '%s' (ID: %s) está inativo.", usuario.matricula, usuario.id_usuario)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário inativo")
+    return usuario
+
+
+async def _verificar_senha(db: AsyncSession, principal, form_data: OAuth2PasswordRequestForm) -> bool:
+    """
+    Confere a senha no pool de hash (fora do event loop). Se o hash gravado usa outro custo
+    ou esquema, grava o novo hash na mesma hora: mudar BCRYPT_ROUNDS migra as contas aos poucos.
+    """
+    valida, novo_hash = await security.verify_and_update_password_async(form_data.password, principal.hashed_password)
+    if valida and novo_hash:
+        principal.hashed_password = novo_hash
+        try:
+            await db.commit()
+            logger.info("Hash de senha de '%s' regravado com custo %s.", form_data.username, security.BCRYPT_ROUNDS)
+        except Exception as e:  # A senha confere: falhar a regravação não impede o login
+            await db.rollback()
+            logger.warning("Não foi possível regravar o hash de senha de '%s': %s", form_data.username, e)
+    return valida
 
 
 # --- Endpoints de Autenticação ---
 
-@router.post("/auth/token", response_model=schemas.Token)
+@router.post("/auth/token", response_model=schemas.Token, dependencies=[Depends(throttling.controlar_login)])
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], 
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    logger.info(f"Tentativa de login para username: {form_data.username}")
+    logger.info("Tentativa de login para username: %s", form_data.username)
     # Tenta autenticar como Funcionário primeiro
-    funcionario = crud.get_funcionario_by_matricula_funcional(db, matricula_funcional=form_data.username)
-    if funcionario and security.verify_password(form_data.password, funcionario.hashed_password):
+    funcionario = await crud.get_funcionario_by_matricula_funcional_async(db, matricula_funcional=form_data.username)
+    if funcionario and await _verificar_senha(db, funcionario, form_data):
         if not funcionario.is_active:
-            logger.warning(f"Tentativa de login falhou para funcionário inativo: {form_data.username}")
+            logger.warning("Tentativa de login falhou para funcionário inativo: %s", form_data.username)
             raise HTTPException(status_code=400, detail="Funcionário inativo")
         access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
         refresh_token_expires = timedelta(days=security.REFRESH_TOKEN_EXPIRE_DAYS)
@@ -174,14 +264,14 @@ async def login_for_access_token(
             data={"sub": funcionario.matricula_funcional, "user_id": funcionario.id_funcionario, "role": "funcionario"},
             expires_delta=refresh_token_expires
         )
-        logger.info(f"Login bem-sucedido para funcionário: {form_data.username}")
+        logger.info("Login bem-sucedido para funcionário: %s", form_data.username)
         return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
     # Se não for Funcionário, tenta autenticar como Usuário (cliente)
-    usuario = crud.get_usuario_by_matricula(db, matricula=form_data.username)
-    if usuario and security.verify_password(form_data.password, usuario.hashed_password):
+    usuario = await crud.get_usuario_by_matricula_async(db, matricula=form_data.username)
+    if usuario and await _verificar_senha(db, usuario, form_data):
         if not usuario.is_active:
-            logger.warning(f"Tentativa de login falhou para usuário inativo: {form_data.username}")
+            logger.warning("Tentativa de login falhou para usuário inativo: %s", form_data.username)
             raise HTTPException(status_code=400, detail="Usuário inativo")
         access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
         refresh_token_expires = timedelta(days=security.REFRESH_TOKEN_EXPIRE_DAYS)
@@ -193,10 +283,10 @@ async def login_for_access_token(
             data={"sub": usuario.matricula, "user_id": usuario.id_usuario, "role": "usuario_cliente"},
             expires_delta=refresh_token_expires
         )
-        logger.info(f"Login bem-sucedido para usuário cliente: {form_data.username}")
+        logger.info("Login bem-sucedido para usuário cliente: %s", form_data.username)
         return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
     
-    logger.warning(f"Tentativa de login falhou para username: {form_data.username} - Matrícula ou senha incorreta.")
+    logger.warning("Tentativa de login falhou para username: %s - Matrícula ou senha incorreta.", form_data.username)
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Matrícula ou senha incorreta",
@@ -223,8 +313,25 @@ async def refresh_access_token(refresh_token: str):
             data={"sub": payload["sub"], "user_id": payload["user_id"], "role": payload["role"]},
             expires_delta=refresh_token_expires
         )
-        logger.info(f"Refresh token bem-sucedido para sub: {payload['sub']}")
+        logger.info("Refresh token bem-sucedido para sub: %s", payload['sub'])
         return {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
     except Exception as e:
-        logger.warning(f"Falha ao usar refresh_token: {e}")
+        logger.warning("Falha ao usar refresh_token: %s", e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token inválido ou expirado")
+
+
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    token_data: Annotated[schemas.TokenData, Depends(get_current_user_data)],
+):
+    """
+    Revoga o token de acesso apresentado até a sua expiração.
+
+    A lista de revogados fica na memória do worker que atendeu o logout: com vários
+    workers, os demais seguem aceitando o token até o exp (ACCESS_TOKEN_EXPIRE_MINUTES).
+    O cliente deve descartar o token de qualquer forma.
+    """
+    security.revogar_token(token)
+    logger.info("Logout de '%s': token de acesso revogado.", token_data.sub)
+    return None
@@ -1,11 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app import crud, schemas
+from app.database import get_db, get_read_db
+from app import crud, schemas, models
+from app.routers.auth import get_current_active_funcionario
 from typing import List
+import logging
 
 router = APIRouter()  # Sem prefixo, sem tags
+logger = logging.getLogger(__name__)
 
 @router.get("", response_model=List[schemas.AutorReadBasic])
-def listar_autores(db: Session = Depends(get_db)):
-    return crud.get_autores(db)
+def listar_autores(
+    db: Session = Depends(get_read_db),
+    skip: int = 0,
+    limit: int = 100,
+    nome: str = Query(None, description="Busca por nome (substring)"),
+    similaridade: float = Query(None, ge=0, le=1, description="Busca por nome tolerante a erros de digitação (0 a 1)")
+):
+    return crud.get_autores(db, skip=skip, limit=limit, nome=nome, similaridade=similaridade)
+
+@router.put("/{autor_id}", response_model=schemas.AutorReadBasic)
+def atualizar_autor(
+    autor_id: int,
+    autor_update: schemas.AutorCreate,
+    db: Session = Depends(get_db),
+    current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
+):
+    logger.info("Funcionário '%s' tentando atualizar autor ID: %s", current_funcionario.matricula_funcional, autor_id)
+    autor = crud.update_autor(db, autor_id, autor_update)
+    if not autor:
+        logger.warning("Autor ID %s não encontrado para atualização.", autor_id)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Autor não encontrado")
+    logger.info("Autor ID %s atualizado com sucesso.", autor_id)
+    return autor
@@ -3,7 +3,7 @@ from typing import List
 from sqlalchemy.orm import Session # Import Session
 import logging # Import logging
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app import crud
 from app import schemas, models # Import models
 from app.routers.auth import get_current_active_funcionario # Import auth dependency
@@ -12,20 +12,20 @@ router = APIRouter()
 logger = logging.getLogger(__name__) # Logger para este módulo
 
 @router.get("", response_model=List[schemas.CategoriaReadBasic])
-def listar_categorias(db: Session = Depends(get_db), skip: int = 0, limit: int = 100): # Added skip and limit, typed db
-    logger.info(f"Listando categorias com skip={skip}, limit={limit}")
+def listar_categorias(db: Session = Depends(get_read_db), skip: int = 0, limit: int = 100): # Added skip and limit, typed db
+    logger.info("Listando categorias com skip=%s, limit=%s", skip, limit)
     categorias = crud.get_categorias(db, skip=skip, limit=limit)
-    logger.debug(f"Encontradas {len(categorias)} categorias.")
+    logger.debug("Encontradas %s categorias.", len(categorias))
     return categorias
 
 @router.get("/{categoria_id}", response_model=schemas.CategoriaRead)
-def obter_categoria(categoria_id: int, db: Session = Depends(get_db)): # Typed db
-    logger.info(f"Buscando categoria com ID: {categoria_id}")
+def obter_categoria(categoria_id: int, db: Session = Depends(get_read_db)): # Typed db
+    logger.info("Buscando categoria com ID: %s", categoria_id)
     cat = crud.get_categoria(db, categoria_id)
     if not cat:
-        logger.warning(f"Categoria com ID {categoria_id} não encontrada.")
+        logger.warning("Categoria com ID %s não encontrada.", categoria_id)
         raise HTTPException(status_code=404, detail="Categoria não encontrada")
-    logger.debug(f"Categoria ID {categoria_id} encontrada: {cat.nome}")
+    logger.debug("Categoria ID %s encontrada: %s", categoria_id, cat.nome)
     return cat
 
 @router.post("", response_model=schemas.CategoriaRead, status_code=status.HTTP_201_CREATED)
@@ -34,16 +34,16 @@ def criar_categoria(
     db: Session = Depends(get_db), 
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario) # Protected
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando criar categoria: {cat.nome}")
+    logger.info("Funcionário '%s' tentando criar categoria: %s", current_funcionario.matricula_funcional, cat.nome)
     try:
         nova_categoria = crud.create_categoria(db=db, categoria=cat)
-        logger.info(f"Categoria '{nova_categoria.nome}' (ID: {nova_categoria.id_categoria}) criada com sucesso por '{current_funcionario.matricula_funcional}'.")
+        logger.info("Categoria '%s' (ID: %s) criada com sucesso por '%s'.", nova_categoria.nome, nova_categoria.id_categoria, current_funcionario.matricula_funcional)
         return nova_categoria
     except HTTPException as e:
-        logger.error(f"Erro ao criar categoria '{cat.nome}' por '{current_funcionario.matricula_funcional}': {e.detail}")
+        logger.error("Erro ao criar categoria '%s' por '%s': %s", cat.nome, current_funcionario.matricula_funcional, e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao criar categoria '{cat.nome}' por '{current_funcionario.matricula_funcional}': {e}")
+        logger.exception("Erro inesperado ao criar categoria '%s' por '%s': %s", cat.nome, current_funcionario.matricula_funcional, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao criar categoria.")
 
 
@@ -53,14 +53,14 @@ def excluir_categoria(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario) # Protected
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando excluir categoria ID: {categoria_id}")
+    logger.info("Funcionário '%s' tentando excluir categoria ID: %s", current_funcionario.matricula_funcional, categoria_id)
     # crud.delete_categoria já verifica se a categoria existe e se tem livros associados,
     # e levanta HTTPException apropriada.
     deleted_categoria = crud.delete_categoria(db, categoria_id)
     if not deleted_categoria: # Should not happen if crud raises HTTPException for not found
-        logger.error(f"crud.delete_categoria retornou None para ID {categoria_id}, mas deveria ter levantado exceção se não encontrada.")
+        logger.error("crud.delete_categoria retornou None para ID %s, mas deveria ter levantado exceção se não encontrada.", categoria_id)
         raise HTTPException(status_code=404, detail="Categoria não encontrada para exclusão (ou erro interno no CRUD).")
-    logger.info(f"Categoria ID {categoria_id} excluída com sucesso por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Categoria ID %s excluída com sucesso por '%s'.", categoria_id, current_funcionario.matricula_funcional)
     return None # Return None for 204 No Content
 
 @router.put("/{categoria_id}", response_model=schemas.CategoriaRead)
@@ -70,19 +70,15 @@ def atualizar_categoria(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando atualizar categoria ID: {categoria_id}")
-    cat = crud.get_categoria(db, categoria_id)
-    if not cat:
-        logger.warning(f"Categoria com ID {categoria_id} não encontrada para atualização.")
-        raise HTTPException(status_code=404, detail="Categoria não encontrada")
+    logger.info("Funcionário '%s' tentando atualizar categoria ID: %s", current_funcionario.matricula_funcional, categoria_id)
     try:
-        for field, value in categoria_update.model_dump(exclude_unset=True).items():
-            setattr(cat, field, value)
-        db.commit()
-        db.refresh(cat)
-        logger.info(f"Categoria ID {categoria_id} atualizada com sucesso por '{current_funcionario.matricula_funcional}'.")
-        return cat
+        cat = crud.update_categoria(db, categoria_id, categoria_update)
     except Exception as e:
         db.rollback()
-        logger.exception(f"Erro ao atualizar categoria ID {categoria_id}: {e}")
+        logger.exception("Erro ao atualizar categoria ID %s: %s", categoria_id, e)
         raise HTTPException(status_code=500, detail="Erro ao atualizar categoria. Verifique se os dados são válidos e não violam restrições do banco.")
+    if not cat:
+        logger.warning("Categoria com ID %s não encontrada para atualização.", categoria_id)
+        raise HTTPException(status_code=404, detail="Categoria não encontrada")
+    logger.info("Categoria ID %s atualizada com sucesso por '%s'.", categoria_id, current_funcionario.matricula_funcional)
+    return cat
@@ -6,7 +6,7 @@ import logging
 from app.database import get_db
 from app import crud, schemas, models
 from app.routers.auth import get_current_active_funcionario
-from app.crud.crud_emprestimo import marcar_emprestimo_como_devolvido  # Importação direta
+from app.services import circulacao
 
 router = APIRouter(prefix="/devolucoes", tags=["Devoluções"])
 logger = logging.getLogger(__name__)
@@ -17,27 +17,39 @@ def registrar_devolucao(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' registrando devolução para empréstimo ID {devolucao.id_emprestimo}")
+    logger.info("Funcionário '%s' registrando devolução para empréstimo ID %s", current_funcionario.matricula_funcional, devolucao.id_emprestimo)
     devolucao_data = devolucao.model_copy(update={"id_funcionario_registro": current_funcionario.id_funcionario})
     try:
-        nova_devolucao = crud.create_devolucao(db, devolucao_data)
-        # Atualiza status do empréstimo e exemplar
-        marcar_emprestimo_como_devolvido(db, devolucao.id_emprestimo)
-        logger.info(f"Devolução ID {nova_devolucao.id_devolucao} registrada com sucesso para empréstimo ID {devolucao.id_emprestimo}.")
+        # Devolução, empréstimo, exemplar e fila de reservas em uma única transação
+        nova_devolucao = circulacao.registrar_devolucao(db, devolucao_data)
+        logger.info("Devolução ID %s registrada com sucesso para empréstimo ID %s.", nova_devolucao.id_devolucao, devolucao.id_emprestimo)
         return nova_devolucao
     except HTTPException as e:
-        logger.error(f"Erro ao registrar devolução: {e.detail}")
+        logger.error("Erro ao registrar devolução: %s", e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao registrar devolução: {e}")
+        logger.exception("Erro inesperado ao registrar devolução: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao registrar devolução.")
 
+@router.post("/batch", response_model=schemas.ResultadoLote)
+def registrar_devolucoes_lote(
+    lote: schemas.DevolucaoLoteCreate,
+    db: Session = Depends(get_db),
+    current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
+):
+    """
+    Registra a devolução de vários exemplares lidos no balcão (por código ou numero_tombo),
+    em uma única transação. O resultado vem por item; itens recusados trazem `codigo_rejeicao`.
+    """
+    logger.info("Funcionário '%s' registrando lote de devoluções", current_funcionario.matricula_funcional)
+    return circulacao.devolver_lote(db, lote, current_funcionario.id_funcionario)
+
 @router.get("/", response_model=List[schemas.DevolucaoRead])
 def listar_devolucoes(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' listando devoluções.")
+    logger.info("Funcionário '%s' listando devoluções.", current_funcionario.matricula_funcional)
     return crud.get_devolucoes(db)
 
 @router.get("/{devolucao_id}", response_model=schemas.DevolucaoRead)
@@ -48,9 +60,9 @@ def obter_devolucao(
 ):
     devolucao = crud.get_devolucao(db, devolucao_id)
     if not devolucao:
-        logger.warning(f"Devolução ID {devolucao_id} não encontrada.")
+        logger.warning("Devolução ID %s não encontrada.", devolucao_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Devolução não encontrada")
-    logger.info(f"Devolução ID {devolucao_id} acessada por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Devolução ID %s acessada por '%s'.", devolucao_id, current_funcionario.matricula_funcional)
     return devolucao
 
 @router.delete("/{devolucao_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -61,8 +73,8 @@ def excluir_devolucao(
 ):
     devolucao = crud.get_devolucao(db, devolucao_id)
     if not devolucao:
-        logger.warning(f"Devolução ID {devolucao_id} não encontrada para exclusão.")
+        logger.warning("Devolução ID %s não encontrada para exclusão.", devolucao_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Devolução não encontrada")
     crud.delete_devolucao(db, devolucao_id)
-    logger.info(f"Devolução ID {devolucao_id} excluída por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Devolução ID %s excluída por '%s'.", devolucao_id, current_funcionario.matricula_funcional)
     return None
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Union
-from app.database import get_db
+from app.database import get_async_db, get_db, get_read_async_db
 from app import crud, schemas, models
-from app.routers.auth import get_current_active_funcionario, get_current_active_usuario_cliente
+from app.services import circulacao
+from app.routers.auth import get_current_active_funcionario, get_current_usuario_cliente_claims
 import logging
 
 router = APIRouter()
@@ -16,17 +18,17 @@ def listar_emprestimos(
     limit: int = 100,
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' listando empréstimos.")
+    logger.info("Funcionário '%s' listando empréstimos.", current_funcionario.matricula_funcional)
     emprestimos = crud.get_emprestimos(db, skip=skip, limit=limit)
     return emprestimos
 
 @router.get("/me", response_model=List[schemas.EmprestimoRead])
-def listar_meus_emprestimos(
-    db: Session = Depends(get_db),
-    current_usuario: models.Usuario = Depends(get_current_active_usuario_cliente)
+async def listar_meus_emprestimos(
+    db: AsyncSession = Depends(get_read_async_db),
+    current_usuario: models.Usuario = Depends(get_current_usuario_cliente_claims)
 ):
-    logger.info(f"Usuário '{current_usuario.matricula}' listando seus empréstimos.")
-    return crud.get_emprestimos_by_usuario_id(db, current_usuario.id_usuario)
+    logger.info("Usuário '%s' listando seus empréstimos.", current_usuario.matricula)
+    return await crud.get_emprestimos_by_usuario_id_async(db, current_usuario.id_usuario)
 
 @router.get("/{emprestimo_id}", response_model=schemas.EmprestimoRead)
 def obter_emprestimo(
@@ -38,37 +40,50 @@ def obter_emprestimo(
 ):
     emprestimo = crud.get_emprestimo(db, emprestimo_id)
     if not emprestimo:
-        logger.warning(f"Empréstimo ID {emprestimo_id} não encontrado.")
+        logger.warning("Empréstimo ID %s não encontrado.", emprestimo_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Empréstimo não encontrado")
     # Se for usuário cliente, só pode ver o próprio empréstimo
     if isinstance(current_user, models.Usuario):
         if emprestimo.id_usuario != current_user.id_usuario:
-            logger.warning(f"Usuário '{current_user.matricula}' tentou acessar empréstimo de outro usuário.")
+            logger.warning("Usuário '%s' tentou acessar empréstimo de outro usuário.", current_user.matricula)
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-    logger.info(f"Empréstimo ID {emprestimo_id} acessado por '{getattr(current_user, 'matricula_funcional', getattr(current_user, 'matricula', ''))}'.")
+    logger.info("Empréstimo ID %s acessado por '%s'.", emprestimo_id, getattr(current_user, 'matricula_funcional', getattr(current_user, 'matricula', '')))
     return emprestimo
 
 @router.post("", response_model=schemas.EmprestimoRead, status_code=status.HTTP_201_CREATED)
-def criar_emprestimo(
+async def criar_emprestimo(
     emprestimo: schemas.EmprestimoCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando criar empréstimo para exemplar numero_tombo {emprestimo.numero_tombo}, usuário ID {emprestimo.id_usuario}")
+    logger.info("Funcionário '%s' tentando criar empréstimo para exemplar numero_tombo %s, usuário ID %s", current_funcionario.matricula_funcional, emprestimo.numero_tombo, emprestimo.id_usuario)
     # Sempre usa o funcionário autenticado, ignorando o campo enviado
     emprestimo_data_com_funcionario_correto = emprestimo.model_copy(update={"id_funcionario_registro": current_funcionario.id_funcionario})
     try:
-        novo_emprestimo = crud.create_emprestimo(db, emprestimo_data_com_funcionario_correto)
-        logger.info(f"Empréstimo ID {novo_emprestimo.id_emprestimo} criado com sucesso por '{current_funcionario.matricula_funcional}'.")
+        novo_emprestimo = await crud.create_emprestimo_async(db, emprestimo_data_com_funcionario_correto)
+        logger.info("Empréstimo ID %s criado com sucesso por '%s'.", novo_emprestimo.id_emprestimo, current_funcionario.matricula_funcional)
         return novo_emprestimo
     except HTTPException as e:
-        logger.error(f"Erro ao criar empréstimo por '{current_funcionario.matricula_funcional}': {e.detail}")
+        logger.error("Erro ao criar empréstimo por '%s': %s", current_funcionario.matricula_funcional, e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao criar empréstimo por '{current_funcionario.matricula_funcional}': {e}")
+        logger.exception("Erro inesperado ao criar empréstimo por '%s': %s", current_funcionario.matricula_funcional, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao criar empréstimo.")
 
 
+@router.post("/batch", response_model=schemas.ResultadoLote)
+def criar_emprestimos_lote(
+    lote: schemas.EmprestimoLoteCreate,
+    db: Session = Depends(get_db),
+    current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
+):
+    """
+    Empresta a um usuário vários exemplares lidos no balcão (por código ou numero_tombo),
+    em uma única transação. O resultado vem por item; itens recusados trazem `codigo_rejeicao`.
+    """
+    logger.info("Funcionário '%s' emprestando lote para usuário ID %s", current_funcionario.matricula_funcional, lote.id_usuario)
+    return circulacao.emprestar_lote(db, lote, current_funcionario.id_funcionario)
+
 @router.delete("/{emprestimo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def excluir_emprestimo(
     emprestimo_id: int,
@@ -78,12 +93,12 @@ def excluir_emprestimo(
     # Política: marcar como "cancelado" se ainda não devolvido, não deletar fisicamente
     emprestimo = crud.get_emprestimo(db, emprestimo_id)
     if not emprestimo:
-        logger.warning(f"Empréstimo ID {emprestimo_id} não encontrado para exclusão.")
+        logger.warning("Empréstimo ID %s não encontrado para exclusão.", emprestimo_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Empréstimo não encontrado")
     if emprestimo.status_emprestimo == "devolvido":
-        logger.warning(f"Tentativa de excluir empréstimo já devolvido (ID {emprestimo_id}).")
+        logger.warning("Tentativa de excluir empréstimo já devolvido (ID %s).", emprestimo_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não é possível excluir empréstimo já devolvido.")
     # Marcar como cancelado (ou implementar lógica específica)
     crud.cancelar_emprestimo(db, emprestimo_id)
-    logger.info(f"Empréstimo ID {emprestimo_id} marcado como cancelado por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Empréstimo ID %s marcado como cancelado por '%s'.", emprestimo_id, current_funcionario.matricula_funcional)
     return None
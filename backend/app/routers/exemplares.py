@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from app.database import get_db
+from app.database import get_async_db, get_db, get_read_async_db, get_read_db
 from app import crud, schemas, models
-from app.routers.auth import get_current_active_funcionario # Assuming only funcionarios manage exemplares
+from app.routers.auth import get_current_active_funcionario, get_current_funcionario_claims # Assuming only funcionarios manage exemplares
 from app.schemas_extra import ExemplarWithDevolucao
 from sqlalchemy.orm import joinedload
 
 router = APIRouter(
     prefix="/exemplares",
     tags=["Exemplares"],
-    dependencies=[Depends(get_current_active_funcionario)] # Protect all exemplar routes
+    # Leituras (inclusive o balcão por código de barras) só validam o token; escritas declaram get_current_active_funcionario
+    dependencies=[Depends(get_current_funcionario_claims)] # Protect all exemplar routes
 )
 logger = logging.getLogger(__name__)
 
@@ -22,58 +24,67 @@ def criar_exemplar_endpoint(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario) # Redundant due to router dependency, but explicit
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando criar exemplar: {exemplar.codigo_identificacao}")
+    logger.info("Funcionário '%s' tentando criar exemplar: %s", current_funcionario.matricula_funcional, exemplar.codigo_identificacao)
     try:
         novo_exemplar = crud.create_exemplar(db=db, exemplar=exemplar)
-        logger.info(f"Exemplar '{novo_exemplar.codigo_identificacao}' (numero_tombo: {novo_exemplar.numero_tombo}) criado com sucesso.")
+        logger.info("Exemplar '%s' (numero_tombo: %s) criado com sucesso.", novo_exemplar.codigo_identificacao, novo_exemplar.numero_tombo)
         return novo_exemplar
     except HTTPException as e:
-        logger.error(f"Erro ao criar exemplar '{exemplar.codigo_identificacao}': {e.detail}")
+        logger.error("Erro ao criar exemplar '%s': %s", exemplar.codigo_identificacao, e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao criar exemplar '{exemplar.codigo_identificacao}': {e}")
+        logger.exception("Erro inesperado ao criar exemplar '%s': %s", exemplar.codigo_identificacao, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao criar exemplar.")
 
+@router.get("/by-codigo", response_model=List[ExemplarWithDevolucao])
+async def obter_exemplares_por_codigos_endpoint(
+    codigos: List[str] = Query(..., description="Códigos de barras (codigo_identificacao); repita o parâmetro para vários"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Exemplares lidos no balcão, com livro, status e data prevista de devolução, na ordem pedida.
+    Códigos inexistentes são omitidos. Lê do primário: o status precisa refletir a última operação.
+    """
+    logger.info("Buscando %s exemplares por código de barras", len(codigos))
+    encontrados = await crud.get_exemplares_por_codigos_async(db, codigos)
+    return [encontrados[codigo] for codigo in dict.fromkeys(codigos) if codigo in encontrados]
+
+@router.get("/by-codigo/{codigo}", response_model=ExemplarWithDevolucao)
+async def obter_exemplar_por_codigo_endpoint(codigo: str, db: AsyncSession = Depends(get_async_db)):
+    logger.info("Buscando exemplar com código: %s", codigo)
+    encontrados = await crud.get_exemplares_por_codigos_async(db, [codigo])
+    if codigo not in encontrados:
+        logger.warning("Exemplar com código %s não encontrado.", codigo)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exemplar não encontrado")
+    return encontrados[codigo]
+
 @router.get("/{numero_tombo}", response_model=schemas.ExemplarRead)
 def obter_exemplar_endpoint(
     numero_tombo: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    logger.info(f"Buscando exemplar com numero_tombo: {numero_tombo}")
+    logger.info("Buscando exemplar com numero_tombo: %s", numero_tombo)
     db_exemplar = crud.get_exemplar(db, numero_tombo=numero_tombo)
     if db_exemplar is None:
-        logger.warning(f"Exemplar com numero_tombo {numero_tombo} não encontrado.")
+        logger.warning("Exemplar com numero_tombo %s não encontrado.", numero_tombo)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exemplar não encontrado")
-    logger.debug(f"Exemplar numero_tombo {numero_tombo} encontrado: {db_exemplar.codigo_identificacao}")
+    logger.debug("Exemplar numero_tombo %s encontrado: %s", numero_tombo, db_exemplar.codigo_identificacao)
     return db_exemplar
 
 @router.get("/", response_model=List[ExemplarWithDevolucao])
-def listar_exemplares_endpoint(
+async def listar_exemplares_endpoint(
     skip: int = 0,
     limit: int = 100,
     livro_id: Optional[int] = None, # Optional filter by livro_id
-    db: Session = Depends(get_db)
+    status_exemplar: Optional[str] = Query(None, alias="status", description="Filtra os exemplares do livro pelo status (requer livro_id)"),
+    db: AsyncSession = Depends(get_read_async_db)
     # current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Listando exemplares com skip={skip}, limit={limit}, livro_id={livro_id}")
-    if livro_id is not None:
-        exemplares = crud.get_exemplares_por_livro(db, livro_id=livro_id, skip=skip, limit=limit)
-    else:
-        exemplares = crud.get_exemplares(db, skip=skip, limit=limit)
-    exemplares_with_devolucao = []
-    for ex in exemplares:
-        data_prevista_devolucao = None
-        if ex.status == "emprestado":
-            emprestimo_ativo = db.query(models.Emprestimo).filter(
-                models.Emprestimo.numero_tombo == ex.numero_tombo,
-                models.Emprestimo.status_emprestimo == "ativo"
-            ).order_by(models.Emprestimo.data_prevista_devolucao.desc()).first()
-            if emprestimo_ativo:
-                data_prevista_devolucao = emprestimo_ativo.data_prevista_devolucao
-        ex_dict = ExemplarWithDevolucao.model_validate(ex).model_dump()
-        ex_dict["data_prevista_devolucao"] = data_prevista_devolucao
-        exemplares_with_devolucao.append(ex_dict)
-    logger.debug(f"Encontrados {len(exemplares_with_devolucao)} exemplares.")
+    logger.info("Listando exemplares com skip=%s, limit=%s, livro_id=%s, status=%s", skip, limit, livro_id, status_exemplar)
+    exemplares_with_devolucao = await crud.get_exemplares_com_devolucao_async(
+        db, skip=skip, limit=limit, livro_id=livro_id, status_exemplar=status_exemplar
+    )
+    logger.debug("Encontrados %s exemplares.", len(exemplares_with_devolucao))
     return exemplares_with_devolucao
 
 @router.put("/{numero_tombo}", response_model=schemas.ExemplarRead)
@@ -83,12 +94,12 @@ def atualizar_exemplar_endpoint(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando atualizar exemplar numero_tombo: {numero_tombo}")
+    logger.info("Funcionário '%s' tentando atualizar exemplar numero_tombo: %s", current_funcionario.matricula_funcional, numero_tombo)
     updated_exemplar = crud.update_exemplar(db, numero_tombo, exemplar_update)
     if not updated_exemplar:
-        logger.warning(f"Exemplar com numero_tombo {numero_tombo} não encontrado para atualização.")
+        logger.warning("Exemplar com numero_tombo %s não encontrado para atualização.", numero_tombo)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exemplar não encontrado")
-    logger.info(f"Exemplar numero_tombo {numero_tombo} atualizado com sucesso.")
+    logger.info("Exemplar numero_tombo %s atualizado com sucesso.", numero_tombo)
     return updated_exemplar
 
 @router.delete("/{numero_tombo}", status_code=status.HTTP_204_NO_CONTENT)
@@ -97,7 +108,7 @@ def excluir_exemplar_endpoint(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando excluir exemplar numero_tombo: {numero_tombo}")
+    logger.info("Funcionário '%s' tentando excluir exemplar numero_tombo: %s", current_funcionario.matricula_funcional, numero_tombo)
     crud.delete_exemplar(db, numero_tombo)
-    logger.info(f"Exemplar numero_tombo {numero_tombo} excluído (ou tentativa de exclusão processada).")
+    logger.info("Exemplar numero_tombo %s excluído (ou tentativa de exclusão processada).", numero_tombo)
     return None
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_read_async_db
 from app.crud import *
 import app.schemas as schemas # Adicionado import de schemas
-from app.routers.auth import get_current_active_funcionario # Proteção
+from app.routers.auth import get_current_active_funcionario, get_current_funcionario_claims # Proteção
 from app import models # Para current_funcionario type hint
 from app import crud
 from app.schemas_extra import ExemplarWithDevolucao
@@ -14,8 +15,8 @@ router = APIRouter()
 logger = logging.getLogger(__name__) # Logger para este módulo
 
 @router.get("", response_model=schemas.PaginatedLivros)
-def listar_livros(
-    db: Session = Depends(get_db),
+async def listar_livros(
+    db: AsyncSession = Depends(get_read_async_db),
     skip: int = 0,
     limit: int = 20,
     titulo: str = None,
@@ -24,14 +25,24 @@ def listar_livros(
     isbn: str = None,
     editora: str = None,
     ano_publicacao: int = None,
-    sort_by: str = "titulo",
-    sort_dir: str = "asc"
+    sort_by: str = None,
+    sort_dir: str = "asc",
+    cursor: str = None,
+    q: str = None,
+    similaridade: float = Query(None, ge=0, le=1, description="Busca tolerante a erros de digitação em titulo/autor/editora (0 a 1)"),
+    contagem: str = Query("auto", pattern="^(auto|exata|estimada)$", description="Como calcular `total`: auto, exata ou estimada")
 ):
     """
     Listar livros com paginação, filtro e ordenação, retornando total e items.
+    Se `cursor` for informado (vindo de `next_cursor`/`prev_cursor` de uma resposta anterior),
+    a página é buscada por keyset e `skip` é ignorado.
+    `q` faz busca textual por título, autor e editora, ordenada por relevância
+    (a menos que `sort_by` seja informado).
+    Se nada for encontrado, `sugestoes` traz termos parecidos para o usuário tentar.
+    Em buscas amplas `total` pode ser uma estimativa; `total_exato` indica qual é o caso.
     """
-    logger.info(f"Listando livros com skip={skip}, limit={limit}, titulo={titulo}, autor={autor}, categoria_id={categoria_id}, isbn={isbn}, editora={editora}, ano_publicacao={ano_publicacao}, sort_by={sort_by}, sort_dir={sort_dir}")
-    result = crud.get_livros_paginados(
+    logger.info("Listando livros com skip=%s, limit=%s, titulo=%s, autor=%s, categoria_id=%s, isbn=%s, editora=%s, ano_publicacao=%s, sort_by=%s, sort_dir=%s, cursor=%s, q=%s, similaridade=%s, contagem=%s", skip, limit, titulo, autor, categoria_id, isbn, editora, ano_publicacao, sort_by, sort_dir, cursor, q, similaridade, contagem)
+    result = await crud.get_livros_paginados_async(
         db,
         skip=skip,
         limit=limit,
@@ -42,19 +53,56 @@ def listar_livros(
         editora=editora,
         ano_publicacao=ano_publicacao,
         sort_by=sort_by,
-        sort_dir=sort_dir
+        sort_dir=sort_dir,
+        cursor=cursor,
+        q=q,
+        similaridade=similaridade,
+        contagem=contagem
     )
-    logger.debug(f"Encontrados {result['total']} livros (página atual: {len(result['items'])}).")
+    logger.debug("Encontrados %s livros (página atual: %s).", result['total'], len(result['items']))
     return result
 
+@router.get("/facetas", response_model=schemas.FacetasLivros)
+async def listar_facetas_livros(
+    db: AsyncSession = Depends(get_read_async_db),
+    titulo: str = None,
+    autor: str = None,
+    categoria_id: int = None,
+    isbn: str = None,
+    editora: str = None,
+    ano_publicacao: int = None,
+    q: str = None,
+    similaridade: float = Query(None, ge=0, le=1, description="Busca tolerante a erros de digitação em titulo/autor/editora (0 a 1)"),
+    limite: int = Query(20, ge=1, le=200, description="Máximo de valores por faceta, dos mais frequentes")
+):
+    """
+    Quantidade de livros por categoria, editora e ano de publicação para os mesmos filtros
+    de `listar_livros`. Em buscas amplas as contagens são estimadas; `total_exato` indica qual é o caso.
+    """
+    logger.info("Listando facetas de livros com titulo=%s, autor=%s, categoria_id=%s, isbn=%s, editora=%s, ano_publicacao=%s, q=%s, similaridade=%s, limite=%s", titulo, autor, categoria_id, isbn, editora, ano_publicacao, q, similaridade, limite)
+    facetas = await crud.get_facetas_livros_async(
+        db,
+        titulo=titulo,
+        autor=autor,
+        categoria_id=categoria_id,
+        isbn=isbn,
+        editora=editora,
+        ano_publicacao=ano_publicacao,
+        q=q,
+        similaridade=similaridade,
+        limite=limite
+    )
+    logger.debug("Facetas calculadas para %s livros.", facetas['total'])
+    return facetas
+
 @router.get("/{livro_id}", response_model=schemas.LivroRead)
-def obter_livro(livro_id: int, db: Session = Depends(get_db)):
-    logger.info(f"Buscando livro com ID: {livro_id}")
-    livro = crud.get_livro(db, livro_id)
+async def obter_livro(livro_id: int, db: AsyncSession = Depends(get_read_async_db)):
+    logger.info("Buscando livro com ID: %s", livro_id)
+    livro = await crud.get_livro_detalhe_async(db, livro_id)
     if not livro:
-        logger.warning(f"Livro com ID {livro_id} não encontrado.")
+        logger.warning("Livro com ID %s não encontrado.", livro_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Livro não encontrado")
-    logger.debug(f"Livro ID {livro_id} encontrado: {livro.titulo}")
+    logger.debug("Livro ID %s encontrado: %s", livro_id, livro['titulo'])
     return livro
 
 @router.post("", response_model=schemas.LivroRead, status_code=status.HTTP_201_CREATED)
@@ -63,16 +111,16 @@ def criar_livro(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando criar livro: {livro.titulo}")
+    logger.info("Funcionário '%s' tentando criar livro: %s", current_funcionario.matricula_funcional, livro.titulo)
     try:
         novo_livro = crud.create_livro(db=db, livro=livro)
-        logger.info(f"Livro '{novo_livro.titulo}' (ID: {novo_livro.id_livro}) criado com sucesso por '{current_funcionario.matricula_funcional}'.")
+        logger.info("Livro '%s' (ID: %s) criado com sucesso por '%s'.", novo_livro.titulo, novo_livro.id_livro, current_funcionario.matricula_funcional)
         return novo_livro
     except HTTPException as e:
-        logger.error(f"Erro ao criar livro '{livro.titulo}' por '{current_funcionario.matricula_funcional}': {e.detail}")
+        logger.error("Erro ao criar livro '%s' por '%s': %s", livro.titulo, current_funcionario.matricula_funcional, e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao criar livro '{livro.titulo}' por '{current_funcionario.matricula_funcional}': {e}")
+        logger.exception("Erro inesperado ao criar livro '%s' por '%s': %s", livro.titulo, current_funcionario.matricula_funcional, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao criar livro.")
 
 
@@ -82,41 +130,28 @@ def excluir_livro(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando excluir livro ID: {livro_id}")
+    logger.info("Funcionário '%s' tentando excluir livro ID: %s", current_funcionario.matricula_funcional, livro_id)
     # crud.delete_livro agora lida com a verificação de exemplares e levanta HTTPException
     deleted_livro = crud.delete_livro(db, livro_id)
     if deleted_livro is None and not crud.get_livro(db, livro_id): # Checa se realmente não existe mais
-         logger.warning(f"Livro ID {livro_id} não encontrado para exclusão por '{current_funcionario.matricula_funcional}'.")
+         logger.warning("Livro ID %s não encontrado para exclusão por '%s'.", livro_id, current_funcionario.matricula_funcional)
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Livro não encontrado")
 
-    logger.info(f"Livro ID {livro_id} excluído (ou tentativa de exclusão processada) por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Livro ID %s excluído (ou tentativa de exclusão processada) por '%s'.", livro_id, current_funcionario.matricula_funcional)
     return None
 
 @router.get("/{livro_id}/exemplares", response_model=List[ExemplarWithDevolucao])
-def listar_exemplares_por_livro(
+async def listar_exemplares_por_livro(
     livro_id: int,
-    db: Session = Depends(get_db),
-    current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
+    db: AsyncSession = Depends(get_read_async_db),
+    current_funcionario: models.Funcionario = Depends(get_current_funcionario_claims)
 ):
     """
     Retorna todos os exemplares de um livro específico, incluindo data prevista de devolução se emprestado.
     """
-    logger.info(f"Listando exemplares para livro ID {livro_id}")
-    exemplares = db.query(models.Exemplar).filter(models.Exemplar.id_livro == livro_id).all()
-    exemplares_with_devolucao = []
-    for ex in exemplares:
-        data_prevista_devolucao = None
-        if ex.status == "emprestado":
-            emprestimo_ativo = db.query(models.Emprestimo).filter(
-                models.Emprestimo.numero_tombo == ex.numero_tombo,
-                models.Emprestimo.status_emprestimo == "ativo"
-            ).order_by(models.Emprestimo.data_prevista_devolucao.desc()).first()
-            if emprestimo_ativo:
-                data_prevista_devolucao = emprestimo_ativo.data_prevista_devolucao
-        ex_dict = ExemplarWithDevolucao.model_validate(ex).model_dump()
-        ex_dict["data_prevista_devolucao"] = data_prevista_devolucao
-        exemplares_with_devolucao.append(ex_dict)
-    logger.debug(f"Encontrados {len(exemplares_with_devolucao)} exemplares para o livro ID {livro_id}")
+    logger.info("Listando exemplares para livro ID %s", livro_id)
+    exemplares_with_devolucao = await crud.get_exemplares_com_devolucao_async(db, livro_id=livro_id, limit=None)
+    logger.debug("Encontrados %s exemplares para o livro ID %s", len(exemplares_with_devolucao), livro_id)
     return exemplares_with_devolucao
 
 @router.put("/{livro_id}", response_model=schemas.LivroRead)
@@ -126,10 +161,10 @@ def atualizar_livro(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando atualizar livro ID: {livro_id}")
+    logger.info("Funcionário '%s' tentando atualizar livro ID: %s", current_funcionario.matricula_funcional, livro_id)
     livro = crud.update_livro(db, livro_id, livro_update)
     if not livro:
-        logger.warning(f"Livro ID {livro_id} não encontrado para atualização.")
+        logger.warning("Livro ID %s não encontrado para atualização.", livro_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Livro não encontrado")
-    logger.info(f"Livro ID {livro_id} atualizado com sucesso.")
+    logger.info("Livro ID %s atualizado com sucesso.", livro_id)
     return livro
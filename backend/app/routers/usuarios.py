@@ -3,6 +3,7 @@ from typing import List
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.crud import *
+from app import security
 import app.schemas as schemas
 import app.models as models
 from app.routers.auth import get_current_active_funcionario, get_current_active_usuario_cliente # Adicionado get_current_active_usuario_cliente
@@ -23,7 +24,7 @@ def listar_usuarios(
     sort_by: str = "nome",
     sort_dir: str = "asc"
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' listando usuários com skip={skip}, limit={limit}, matricula={matricula}")
+    logger.info("Funcionário '%s' listando usuários com skip=%s, limit=%s, matricula=%s", current_funcionario.matricula_funcional, skip, limit, matricula)
     if matricula:
         usuario = get_usuario_by_matricula(db, matricula=matricula)
         return [usuario] if usuario else []
@@ -35,13 +36,20 @@ def listar_usuarios(
         sort_by=sort_by,
         sort_dir=sort_dir
     )
-    logger.debug(f"Encontrados {len(usuarios)} usuários.")
+    logger.debug("Encontrados %s usuários.", len(usuarios))
     return usuarios
 
 @router.get("/me", response_model=schemas.UsuarioRead) # Endpoint para o usuário obter seus próprios dados
-async def read_users_me(current_user: models.Usuario = Depends(get_current_active_usuario_cliente)):
-    logger.info(f"Usuário '{current_user.matricula}' acessando seus próprios dados (/me).")
-    return current_user
+def read_users_me(
+    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_active_usuario_cliente)
+):
+    logger.info("Usuário '%s' acessando seus próprios dados (/me).", current_user.matricula)
+    # O principal da autenticação só traz os campos de autorização; o curso vem do banco
+    usuario = get_usuario(db, current_user.id_usuario)
+    if not usuario:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+    return usuario
 
 @router.get("/{usuario_id}", response_model=schemas.UsuarioRead)
 def obter_usuario(
@@ -49,12 +57,12 @@ def obter_usuario(
     db: Session = Depends(get_db), 
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' buscando usuário ID: {usuario_id}")
+    logger.info("Funcionário '%s' buscando usuário ID: %s", current_funcionario.matricula_funcional, usuario_id)
     usuario = get_usuario(db, usuario_id)
     if not usuario:
-        logger.warning(f"Usuário com ID {usuario_id} não encontrado.")
+        logger.warning("Usuário com ID %s não encontrado.", usuario_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
-    logger.debug(f"Usuário ID {usuario_id} encontrado: {usuario.matricula}")
+    logger.debug("Usuário ID %s encontrado: %s", usuario_id, usuario.matricula)
     return usuario
 
 @router.post("", response_model=schemas.UsuarioRead, status_code=status.HTTP_201_CREATED)
@@ -63,17 +71,17 @@ def criar_usuario(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando criar usuário: {usuario.matricula}")
+    logger.info("Funcionário '%s' tentando criar usuário: %s", current_funcionario.matricula_funcional, usuario.matricula)
     try:
         # A verificação de matrícula duplicada e de curso_id é feita no crud.create_usuario
         novo_usuario = create_usuario(db=db, usuario=usuario)
-        logger.info(f"Usuário '{novo_usuario.matricula}' (ID: {novo_usuario.id_usuario}) criado com sucesso por '{current_funcionario.matricula_funcional}'.")
+        logger.info("Usuário '%s' (ID: %s) criado com sucesso por '%s'.", novo_usuario.matricula, novo_usuario.id_usuario, current_funcionario.matricula_funcional)
         return novo_usuario
     except HTTPException as e:
-        logger.error(f"Erro ao criar usuário '{usuario.matricula}' por '{current_funcionario.matricula_funcional}': {e.detail}")
+        logger.error("Erro ao criar usuário '%s' por '%s': %s", usuario.matricula, current_funcionario.matricula_funcional, e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Erro inesperado ao criar usuário '{usuario.matricula}' por '{current_funcionario.matricula_funcional}': {e}")
+        logger.exception("Erro inesperado ao criar usuário '%s' por '%s': %s", usuario.matricula, current_funcionario.matricula_funcional, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao criar usuário.")
 
 
@@ -83,15 +91,15 @@ def excluir_usuario(
     db: Session = Depends(get_db), 
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando excluir usuário ID: {usuario_id}")
+    logger.info("Funcionário '%s' tentando excluir usuário ID: %s", current_funcionario.matricula_funcional, usuario_id)
     # crud.delete_usuario agora lida com as verificações e levanta HTTPExceptions
     deleted_usuario = delete_usuario(db, usuario_id)
     
     if deleted_usuario is None and not get_usuario(db, usuario_id): # Checa se realmente não existe mais
-         logger.warning(f"Usuário ID {usuario_id} não encontrado para exclusão por '{current_funcionario.matricula_funcional}'.")
+         logger.warning("Usuário ID %s não encontrado para exclusão por '%s'.", usuario_id, current_funcionario.matricula_funcional)
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
 
-    logger.info(f"Usuário ID {usuario_id} excluído (ou tentativa de exclusão processada) por '{current_funcionario.matricula_funcional}'.")
+    logger.info("Usuário ID %s excluído (ou tentativa de exclusão processada) por '%s'.", usuario_id, current_funcionario.matricula_funcional)
     return None
 
 @router.put("/{usuario_id}", response_model=schemas.UsuarioRead)
@@ -101,15 +109,17 @@ def atualizar_usuario(
     db: Session = Depends(get_db),
     current_funcionario: models.Funcionario = Depends(get_current_active_funcionario)
 ):
-    logger.info(f"Funcionário '{current_funcionario.matricula_funcional}' tentando atualizar usuário ID: {usuario_id}")
+    logger.info("Funcionário '%s' tentando atualizar usuário ID: %s", current_funcionario.matricula_funcional, usuario_id)
     db_usuario = get_usuario(db, usuario_id)
     if not db_usuario:
-        logger.warning(f"Usuário com ID {usuario_id} não encontrado para atualização.")
+        logger.warning("Usuário com ID %s não encontrado para atualização.", usuario_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+    matricula_anterior = db_usuario.matricula
     # Atualiza os campos permitidos
     for field, value in usuario_update.model_dump(exclude_unset=True).items():
         setattr(db_usuario, field, value)
     db.commit()
     db.refresh(db_usuario)
-    logger.info(f"Usuário ID {usuario_id} atualizado com sucesso por '{current_funcionario.matricula_funcional}'.")
+    security.invalidar_principal("usuario_cliente", matricula_anterior, db_usuario.matricula)
+    logger.info("Usuário ID %s atualizado com sucesso por '%s'.", usuario_id, current_funcionario.matricula_funcional)
     return db_usuario
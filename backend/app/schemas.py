@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import date
 
 # --- Schemas de Autenticação (Passo 3.3) ---
@@ -251,6 +251,35 @@ class DevolucaoRead(DevolucaoBase):
     emprestimo: EmprestimoReadBasic
     model_config = ConfigDict(from_attributes=True)
 
+# --- Circulação em lote (balcão com leitor de código de barras) ---
+class ItensLote(BaseModel):
+    codigos: List[str] = Field(default_factory=list, description="codigo_identificacao dos exemplares lidos")
+    numeros_tombo: List[int] = Field(default_factory=list)
+
+class EmprestimoLoteCreate(ItensLote):
+    id_usuario: int
+    data_retirada: date
+    data_prevista_devolucao: date
+
+class DevolucaoLoteCreate(ItensLote):
+    data_devolucao: date
+    observacoes: Optional[str] = None
+    id_usuario: Optional[int] = None  # Se informado, só aceita empréstimos deste usuário
+
+class ResultadoItemLote(BaseModel):
+    item: Union[str, int]  # Como foi enviado: código ou numero_tombo
+    numero_tombo: Optional[int] = None
+    sucesso: bool
+    id_emprestimo: Optional[int] = None
+    id_devolucao: Optional[int] = None
+    codigo_rejeicao: Optional[str] = None
+    detalhe: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    sucesso: int
+    falhas: int
+    itens: List[ResultadoItemLote]
+
 # --- Penalidade Schemas ---
 class PenalidadeBase(BaseModel):
     tipo_penalidade: str = Field(comment="Ex: multa, suspensao")
@@ -278,7 +307,23 @@ class PenalidadeRead(PenalidadeBase):
 # --- Paginação Schemas ---
 class PaginatedLivros(BaseModel):
     total: int
+    total_exato: bool = Field(True, description="False quando `total` é uma estimativa do banco e não uma contagem")
     items: List[LivroRead]
+    next_cursor: Optional[str] = Field(None, description="Cursor opaco da próxima página (paginação por keyset)")
+    prev_cursor: Optional[str] = Field(None, description="Cursor opaco da página anterior (paginação por keyset)")
+    sugestoes: List[str] = Field([], description="Termos parecidos (\"você quis dizer\") quando a busca não encontra livros")
+
+class FacetaValor(BaseModel):
+    valor: Optional[Union[int, str]] = Field(None, description="Valor agrupado (id_categoria, editora ou ano); null agrupa os livros sem o campo")
+    rotulo: Optional[str] = Field(None, description="Nome legível do valor (nome da categoria)")
+    total: int
+
+class FacetasLivros(BaseModel):
+    total: int
+    total_exato: bool = Field(True, description="False quando as contagens foram estimadas a partir de uma amostra")
+    categoria: List[FacetaValor] = []
+    editora: List[FacetaValor] = []
+    ano_publicacao: List[FacetaValor] = []
 
 class LivroUpdate(BaseModel):
     titulo: Optional[str] = None
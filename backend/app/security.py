@@ -1,26 +1,55 @@
+import asyncio
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from jose import JWTError, jwt
 from jose.exceptions import ExpiredSignatureError, JWTError as JoseJWTError
 from passlib.context import CryptContext
 
+from app.cache import TTLCache
+
 # --- Configuração para Hashing de Senhas (Passo 1.1) ---
 # Define os esquemas de hashing. bcrypt é o recomendado.
 # "deprecated="auto"" significa que hashes antigos (se você mudar os esquemas) ainda podem ser verificados.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# BCRYPT_ROUNDS é o custo (log2 das iterações): cada +1 dobra o tempo de hash e de verificação.
+# min/max iguais ao custo fazem needs_update apontar hashes com outro custo, que o login regrava.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Todo hash e verificação de senha roda neste pool limitado, fora do event loop: um pico
+# de logins enfileira aqui em vez de congelar o worker. O bcrypt libera o GIL, então
+# threads bastam para usar vários núcleos.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
 
 
 # --- Funções de Senha (Passos 1.2 e 1.3) ---
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha em texto plano corresponde à senha hasheada."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _hash_pool.submit(pwd_context.verify, plain_password, hashed_password).result()
 
 
 def get_password_hash(password: str) -> str:
     """Gera o hash de uma senha."""
-    return pwd_context.hash(password)
+    return _hash_pool.submit(pwd_context.hash, password).result()
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha e, se o hash estiver desatualizado (custo diferente de BCRYPT_ROUNDS
+    ou esquema obsoleto), devolve também o novo hash a gravar; senão o segundo item é None.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, pwd_context.verify_and_update, plain_password, hashed_password)
 
 
 # --- Configuração para Tokens JWT (Passo 2.1) ---
@@ -35,6 +64,62 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30  # O token de acesso expira em 30 minutos
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # Refresh token expira em 7 dias
 
 
+# --- Cache de principais autenticados ---
+# (papel, sub do token) → atributos do funcionário/usuário (sem a senha), para que as
+# dependências de autenticação não consultem o banco a cada requisição. Alterações de
+# cadastro invalidam a entrada neste worker; nos demais, a defasagem é limitada pelo TTL.
+principal_cache = TTLCache(
+    "principal",
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_MAX", "2048")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "30")),
+)
+
+
+def invalidar_principal(role: str, *subs: str) -> None:
+    """Remove do cache de principais as entradas do papel para cada matrícula informada."""
+    for sub in subs:
+        if sub:
+            principal_cache.invalidate((role, sub))
+
+
+# --- Cache de tokens verificados ---
+# sha256 do token de acesso → claims já validadas (assinatura, exp e campos obrigatórios),
+# guardadas até o exp do token. Quem repete o mesmo token não paga de novo a verificação
+# HS256. Hits, misses e hit_ratio aparecem em /admin/caches.
+token_cache = TTLCache(
+    "token_verificado",
+    maxsize=int(os.getenv("TOKEN_CACHE_MAX", "10000")),
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+# Digests de tokens revogados antes do exp, consultados antes do cache e da verificação
+# (por pertinência, sem entrar nas estatísticas de hit/miss: quase toda requisição é um
+# miss aqui). Valem só para este worker; cada entrada vive até o exp do token revogado.
+tokens_revogados = TTLCache(
+    "token_revogado",
+    maxsize=int(os.getenv("TOKEN_REVOGADO_MAX", "10000")),
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+def _digest_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def revogar_token(token: str) -> None:
+    """
+    Tira o token do cache de verificados e passa a recusá-lo até expirar.
+    A revogação fica na memória deste worker: os outros continuam aceitando o token.
+    """
+    digest = _digest_token(token)
+    token_cache.invalidate(digest)
+    try:
+        restante = jwt.get_unverified_claims(token)["exp"] - time.time()
+    except Exception:
+        restante = None
+    if restante is None or restante > 0:
+        tokens_revogados.set(digest, True, ttl=restante)
+
+
 # --- Função para Criar Token JWT (Passo 2.2) ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -89,19 +174,28 @@ def decode_refresh_token(token: str) -> dict:
 def decode_and_validate_token(token: str) -> dict:
     """
     Decodifica e valida um token JWT de acesso.
-    - Verifica assinatura, expiração e formato.
-    - Lança JWTError se inválido/expirado.
+    - Verifica assinatura, expiração e formato (ou usa as claims já validadas em cache).
+    - Lança JWTError se inválido/expirado/revogado.
     """
+    digest = _digest_token(token)
+    if digest in tokens_revogados:
+        raise JoseJWTError("Token JWT revogado.")
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         # Verificação extra de campos obrigatórios (sub, user_id, role)
         if not all(k in payload for k in ("sub", "user_id", "role")):
             raise JoseJWTError("Payload do token JWT está incompleto.")
-        return payload
     except ExpiredSignatureError:
         raise JoseJWTError("Token JWT expirado.")
     except JoseJWTError as e:
         raise JoseJWTError(f"Token JWT inválido: {e}")
+    restante = payload["exp"] - time.time() if "exp" in payload else None
+    if restante is None or restante > 0:
+        token_cache.set(digest, payload, ttl=restante)
+    return payload
 
 # Nota sobre Passo 2.3 (Decodificação e Validação de Token):
 # A funcionalidade para decodificar e validar tokens JWT será implementada
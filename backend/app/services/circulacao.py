@@ -0,0 +1,258 @@
+"""
+Operações de circulação (devolução, lotes do balcão) executadas como uma única unidade de trabalho:
+todas as validações e alterações acontecem na mesma transação, com um só commit, e a
+resposta é montada com os objetos já carregados, sem refresh depois do commit.
+"""
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from fastapi import HTTPException, status
+from .. import models, schemas
+from ..crud.crud_devolucao import _validar_funcionario_para_devolucao
+from ..crud.crud_emprestimo import REJEICOES_EMPRESTIMO
+from ..crud.crud_exemplar import definir_status_exemplar, definir_status_exemplares, travar_exemplar
+import logging
+
+logger = logging.getLogger(__name__)
+
+def proxima_reserva(db: Session, numero_tombo: int):
+    """Reserva ativa mais antiga do exemplar (fila por data da reserva), ou None."""
+    return db.query(models.Reserva).filter(
+        models.Reserva.numero_tombo == numero_tombo,
+        models.Reserva.status == "ativa"
+    ).order_by(models.Reserva.data_reserva, models.Reserva.id_reserva).first()
+
+def registrar_devolucao(db: Session, devolucao: schemas.DevolucaoCreate) -> schemas.DevolucaoRead:
+    """
+    Registra a devolução: valida empréstimo e funcionário, insere a devolução, encerra o
+    empréstimo e libera o exemplar, que fica 'reservado' para o primeiro da fila de reservas
+    ou volta a 'disponivel'.
+    """
+    logger.info("Tentando registrar devolução para empréstimo ID %s", devolucao.id_emprestimo)
+    # Trava o exemplar e depois o empréstimo (mesma ordem das demais operações de circulação):
+    # duas devoluções simultâneas do mesmo empréstimo ficam serializadas e a segunda é recusada
+    travar_exemplar(db, id_emprestimo=devolucao.id_emprestimo)
+    db_emprestimo = db.query(models.Emprestimo).populate_existing().filter(
+        models.Emprestimo.id_emprestimo == devolucao.id_emprestimo
+    ).with_for_update().first()
+    if not db_emprestimo:
+        logger.error("Empréstimo com ID %s não encontrado ao registrar devolução.", devolucao.id_emprestimo)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Empréstimo com ID {devolucao.id_emprestimo} não encontrado.")
+    if db_emprestimo.data_efetiva_devolucao is not None or db_emprestimo.status_emprestimo == "devolvido":
+        logger.warning("Empréstimo %s já foi devolvido.", devolucao.id_emprestimo)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Empréstimo {devolucao.id_emprestimo} já foi devolvido.")
+    db_funcionario = _validar_funcionario_para_devolucao(db, devolucao)
+    db_exemplar = db_emprestimo.exemplar  # Já na sessão (travado), sem nova consulta
+    # Só permite devolução se status for 'emprestado' ou 'reservado'
+    if db_exemplar and db_exemplar.status not in ["emprestado", "reservado"]:
+        logger.error("Tentativa de devolução de exemplar %s com status inválido: %s", db_exemplar.numero_tombo, db_exemplar.status)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Exemplar {db_exemplar.numero_tombo} não está emprestado nem reservado.")
+
+    db_devolucao = models.Devolucao(**devolucao.model_dump())
+    db_devolucao.funcionario_registro_devolucao = db_funcionario
+    db_devolucao.emprestimo = db_emprestimo
+    db_emprestimo.data_efetiva_devolucao = devolucao.data_devolucao
+    db_emprestimo.status_emprestimo = "devolvido"
+    db.add(db_devolucao)
+    if db_exemplar:
+        reserva = proxima_reserva(db, db_exemplar.numero_tombo)
+        definir_status_exemplar(db, db_exemplar, "reservado" if reserva else "disponivel")
+        if reserva:
+            logger.info("Exemplar %s separado para a reserva ID %s (usuário ID %s).", db_exemplar.numero_tombo, reserva.id_reserva, reserva.id_usuario)
+    db.flush()
+    # Serializa antes do commit: depois dele os objetos expiram e cada atributo custaria uma consulta
+    resposta = schemas.DevolucaoRead.model_validate(db_devolucao)
+    db.commit()
+    logger.info("Devolução ID %s registrada para empréstimo ID %s. Exemplar Nº Tombo %s status atualizado.", resposta.id_devolucao, db_emprestimo.id_emprestimo, db_exemplar.numero_tombo if db_exemplar else 'N/A')
+    return resposta
+
+
+# Recusas por item nos lotes; recusas de empréstimo reaproveitam REJEICOES_EMPRESTIMO
+REJEICOES_ITEM_LOTE = {
+    "codigo_nao_encontrado": "Exemplar com código {item} não encontrado.",
+    "item_repetido": "Exemplar {numero_tombo} aparece mais de uma vez no lote.",
+    "sem_emprestimo_ativo": "Exemplar {numero_tombo} não possui empréstimo ativo.",
+    "emprestimo_de_outro_usuario": "Exemplar {numero_tombo} está emprestado para outro usuário.",
+    "exemplar_nao_emprestado": "Exemplar {numero_tombo} não está emprestado nem reservado.",
+}
+
+def _exemplares_do_lote(db: Session, lote: schemas.ItensLote):
+    """
+    Carrega (e trava) em uma consulta os exemplares do lote, com o livro.
+    Devolve pares (item enviado, exemplar ou None), na ordem: códigos e depois numeros_tombo.
+    """
+    itens = list(lote.codigos) + list(lote.numeros_tombo)
+    if not itens:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe ao menos um código ou numero_tombo.")
+    exemplares = db.query(models.Exemplar).options(joinedload(models.Exemplar.livro)).filter(or_(
+        models.Exemplar.codigo_identificacao.in_(lote.codigos),
+        models.Exemplar.numero_tombo.in_(lote.numeros_tombo)
+    )).order_by(models.Exemplar.numero_tombo).with_for_update(of=models.Exemplar).all()  # Ordem fixa de travamento entre lotes
+    por_codigo = {ex.codigo_identificacao: ex for ex in exemplares}
+    por_tombo = {ex.numero_tombo: ex for ex in exemplares}
+    return [(c, por_codigo.get(c)) for c in lote.codigos] + [(t, por_tombo.get(t)) for t in lote.numeros_tombo]
+
+def _validar_participantes_lote(db: Session, contexto: dict):
+    """Valida uma vez, para o lote todo, o funcionário e (se informado) o usuário; recusa o lote inteiro se inválidos."""
+    verificacoes = []
+    if contexto["id_usuario"] is not None:
+        db_usuario = db.query(models.Usuario).filter(models.Usuario.id_usuario == contexto["id_usuario"]).first()
+        verificacoes += [
+            ("usuario_nao_encontrado", db_usuario is None),
+            ("usuario_inativo", db_usuario is not None and not db_usuario.is_active),
+        ]
+    db_funcionario = db.query(models.Funcionario).filter(models.Funcionario.id_funcionario == contexto["id_funcionario_registro"]).first()
+    verificacoes += [
+        ("funcionario_nao_encontrado", db_funcionario is None),
+        ("funcionario_inativo", db_funcionario is not None and not db_funcionario.is_active),
+    ]
+    for codigo, recusado in verificacoes:
+        if recusado:
+            status_code, mensagem = REJEICOES_EMPRESTIMO[codigo]
+            logger.warning("Lote recusado (%s).", codigo)
+            raise HTTPException(status_code=status_code, detail=mensagem.format(**contexto), headers={"X-Codigo-Rejeicao": codigo})
+
+def _recusa(item, ex, codigo: str, **contexto) -> schemas.ResultadoItemLote:
+    campos = {"item": item, "numero_tombo": ex.numero_tombo if ex else item, **contexto}
+    mensagem = REJEICOES_ITEM_LOTE.get(codigo) or REJEICOES_EMPRESTIMO[codigo][1]
+    return schemas.ResultadoItemLote(
+        item=item, numero_tombo=ex.numero_tombo if ex else None, sucesso=False,
+        codigo_rejeicao=codigo, detalhe=mensagem.format(**campos)
+    )
+
+def _resultado_lote(resultados) -> schemas.ResultadoLote:
+    sucesso = sum(1 for r in resultados if r.sucesso)
+    return schemas.ResultadoLote(sucesso=sucesso, falhas=len(resultados) - sucesso, itens=resultados)
+
+def emprestar_lote(db: Session, lote: schemas.EmprestimoLoteCreate, id_funcionario: int) -> schemas.ResultadoLote:
+    """
+    Empresta ao mesmo usuário todos os exemplares lidos no balcão. Usuário e funcionário são
+    validados uma vez; exemplares e reservas são carregados em consultas únicas para o lote.
+    Itens recusados (inclusive por conflito no INSERT) não impedem os demais; tudo é gravado
+    com um só commit.
+    """
+    logger.info("Tentando emprestar lote de %s exemplares para usuário ID %s", len(lote.codigos) + len(lote.numeros_tombo), lote.id_usuario)
+    contexto = {"id_usuario": lote.id_usuario, "id_funcionario_registro": id_funcionario}
+    _validar_participantes_lote(db, contexto)
+    itens = _exemplares_do_lote(db, lote)
+    tombos = [ex.numero_tombo for _, ex in itens if ex]
+    reservas = {r.numero_tombo: r for r in db.query(models.Reserva).filter(
+        models.Reserva.numero_tombo.in_(tombos),
+        models.Reserva.id_usuario == lote.id_usuario,
+        models.Reserva.status == "ativa"
+    )}
+
+    resultados, atendidas, mudancas, vistos = [], [], [], set()
+    for item, ex in itens:
+        if ex is None:
+            codigo = "codigo_nao_encontrado" if isinstance(item, str) else "exemplar_nao_encontrado"
+        elif ex.numero_tombo in vistos:
+            codigo = "item_repetido"
+        elif ex.livro and ex.livro.status_geral == "descatalogado":
+            codigo = "livro_descatalogado"
+        elif ex.status == "reservado" and ex.numero_tombo not in reservas:
+            codigo = "reservado_outro_usuario"
+        elif ex.status not in ("disponivel", "reservado"):
+            codigo = "exemplar_indisponivel"
+        else:
+            codigo = None
+        if codigo:
+            resultados.append(_recusa(item, ex, codigo, **contexto))
+            continue
+        vistos.add(ex.numero_tombo)
+        db_emprestimo = models.Emprestimo(
+            data_retirada=lote.data_retirada,
+            data_prevista_devolucao=lote.data_prevista_devolucao,
+            status_emprestimo="ativo",
+            id_usuario=lote.id_usuario,
+            numero_tombo=ex.numero_tombo,
+            id_funcionario_registro=id_funcionario
+        )
+        # Cada empréstimo em seu savepoint: só o INSERT está pendente aqui (reservas e status
+        # são gravados depois do laço), então uma recusa não desfaz os itens anteriores
+        try:
+            with db.begin_nested():
+                db.add(db_emprestimo)
+                db.flush()
+        except IntegrityError:
+            # uq_emprestimo_ativo_exemplar: segunda linha de defesa contra empréstimo duplo
+            resultados.append(_recusa(item, ex, "exemplar_indisponivel", **contexto))
+            continue
+        if ex.status == "reservado":
+            atendidas.append(reservas[ex.numero_tombo])
+        resultados.append(schemas.ResultadoItemLote(
+            item=item, numero_tombo=ex.numero_tombo, sucesso=True, id_emprestimo=db_emprestimo.id_emprestimo
+        ))
+        mudancas.append((ex, "emprestado"))
+
+    for reserva in atendidas:
+        reserva.status = "atendida"
+    definir_status_exemplares(db, mudancas)
+    db.commit()
+    resposta = _resultado_lote(resultados)
+    logger.info("Lote de empréstimos para usuário ID %s: %s criados, %s recusados.", lote.id_usuario, resposta.sucesso, resposta.falhas)
+    return resposta
+
+def devolver_lote(db: Session, lote: schemas.DevolucaoLoteCreate, id_funcionario: int) -> schemas.ResultadoLote:
+    """
+    Registra a devolução de todos os exemplares lidos no balcão: empréstimos ativos e filas de
+    reserva são carregados em consultas únicas para o lote; um só commit no final.
+    """
+    logger.info("Tentando devolver lote de %s exemplares", len(lote.codigos) + len(lote.numeros_tombo))
+    _validar_participantes_lote(db, {"id_usuario": None, "id_funcionario_registro": id_funcionario})
+    itens = _exemplares_do_lote(db, lote)
+    tombos = [ex.numero_tombo for _, ex in itens if ex]
+    # A trava com o filtro de status descarta empréstimos devolvidos por outra transação enquanto esperávamos
+    emprestimos = {e.numero_tombo: e for e in db.query(models.Emprestimo).filter(
+        models.Emprestimo.numero_tombo.in_(tombos),
+        models.Emprestimo.status_emprestimo == "ativo"
+    ).with_for_update()}
+    fila = {}
+    for reserva in db.query(models.Reserva).filter(
+        models.Reserva.numero_tombo.in_(tombos),
+        models.Reserva.status == "ativa"
+    ).order_by(models.Reserva.numero_tombo, models.Reserva.data_reserva, models.Reserva.id_reserva):
+        fila.setdefault(reserva.numero_tombo, reserva)
+
+    resultados, novas, mudancas, vistos = [], [], [], set()
+    for item, ex in itens:
+        db_emprestimo = emprestimos.get(ex.numero_tombo) if ex else None
+        if ex is None:
+            codigo = "codigo_nao_encontrado" if isinstance(item, str) else "exemplar_nao_encontrado"
+        elif ex.numero_tombo in vistos:
+            codigo = "item_repetido"
+        elif db_emprestimo is None:
+            codigo = "sem_emprestimo_ativo"
+        elif lote.id_usuario is not None and db_emprestimo.id_usuario != lote.id_usuario:
+            codigo = "emprestimo_de_outro_usuario"
+        elif ex.status not in ("emprestado", "reservado"):
+            codigo = "exemplar_nao_emprestado"
+        else:
+            codigo = None
+        if codigo:
+            resultados.append(_recusa(item, ex, codigo))
+            continue
+        vistos.add(ex.numero_tombo)
+        db_emprestimo.data_efetiva_devolucao = lote.data_devolucao
+        db_emprestimo.status_emprestimo = "devolvido"
+        db_devolucao = models.Devolucao(
+            data_devolucao=lote.data_devolucao,
+            observacoes=lote.observacoes,
+            id_funcionario_registro=id_funcionario,
+            id_emprestimo=db_emprestimo.id_emprestimo
+        )
+        novas.append((len(resultados), db_devolucao))
+        resultados.append(schemas.ResultadoItemLote(
+            item=item, numero_tombo=ex.numero_tombo, sucesso=True, id_emprestimo=db_emprestimo.id_emprestimo
+        ))
+        mudancas.append((ex, "reservado" if ex.numero_tombo in fila else "disponivel"))
+
+    db.add_all([d for _, d in novas])
+    definir_status_exemplares(db, mudancas)
+    db.flush()
+    for posicao, db_devolucao in novas:
+        resultados[posicao].id_devolucao = db_devolucao.id_devolucao
+    db.commit()
+    resposta = _resultado_lote(resultados)
+    logger.info("Lote de devoluções: %s registradas, %s recusadas.", resposta.sucesso, resposta.falhas)
+    return resposta
@@ -0,0 +1,182 @@
+"""
+Controle de admissão do login (/auth/token), para proteger a CPU gasta com bcrypt.
+
+Cada tentativa consome uma ficha do token bucket do username e, se LOGIN_LIMITE_IP > 0,
+do bucket do IP do cliente. Além disso, há um teto de logins simultâneos em verificação
+de senha por worker. Quem passa do limite recebe 429 na hora, antes de qualquer consulta
+ao banco ou hash.
+
+O limite por IP é opcional porque o navegador chega ao backend pelo proxy do frontend
+(rewrite /api do Next.js): sem configuração, todo login teria o IP do proxy e o limite
+viraria global. Para ativá-lo, liste os proxies em LOGIN_PROXIES_CONFIAVEIS (IPs ou
+redes, separados por vírgula): das requisições vindas deles, o IP do cliente é lido do
+X-Forwarded-For.
+
+O estado dos buckets fica num backend plugável (LOGIN_THROTTLE_BACKEND, no formato
+"modulo:Classe"). O padrão guarda tudo na memória do processo: com vários workers, cada
+um aplica os limites por conta própria. Para limites compartilhados entre workers, use
+um backend sobre armazenamento comum (ex.: Redis) que implemente BackendLimites.
+"""
+import importlib
+import ipaddress
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+logger = logging.getLogger(__name__)
+
+# Fichas por bucket (rajada máxima) e tempo, em segundos, para reabastecer o bucket inteiro
+LOGIN_LIMITE_USUARIO = int(os.getenv("LOGIN_LIMITE_USUARIO", "5"))
+LOGIN_JANELA_USUARIO = float(os.getenv("LOGIN_JANELA_USUARIO", "60"))
+LOGIN_LIMITE_IP = int(os.getenv("LOGIN_LIMITE_IP", "0"))  # 0 desativa o limite por IP
+LOGIN_JANELA_IP = float(os.getenv("LOGIN_JANELA_IP", "60"))
+# Logins em verificação de senha ao mesmo tempo neste worker
+LOGIN_MAX_VERIFICACOES = int(os.getenv("LOGIN_MAX_VERIFICACOES", "16"))
+# Buckets guardados pelo backend em memória
+LOGIN_THROTTLE_MAX_CHAVES = int(os.getenv("LOGIN_THROTTLE_MAX_CHAVES", "100000"))
+# Proxies reversos cujo X-Forwarded-For é aceito como origem da requisição
+PROXIES_CONFIAVEIS = [
+    ipaddress.ip_network(rede.strip(), strict=False)
+    for rede in os.getenv("LOGIN_PROXIES_CONFIAVEIS", "").split(",") if rede.strip()
+]
+
+
+class BackendLimites(ABC):
+    """Estado compartilhado dos token buckets. Implementações precisam ser atômicas por chave."""
+
+    @abstractmethod
+    def consumir(self, chave: str, capacidade: int, janela: float) -> float:
+        """
+        Tenta tirar uma ficha do bucket `chave` (cheio com `capacidade` fichas, reabastecido
+        por completo em `janela` segundos). Devolve 0 se conseguiu; senão, quantos segundos
+        faltam para haver uma ficha.
+        """
+
+
+class BackendMemoria(BackendLimites):
+    """Buckets na memória do processo, com no máximo `max_chaves` chaves (as mais antigas saem)."""
+
+    def __init__(self, max_chaves: int = LOGIN_THROTTLE_MAX_CHAVES):
+        self.max_chaves = max_chaves
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: str, capacidade: int, janela: float) -> float:
+        taxa = capacidade / janela
+        agora = time.monotonic()
+        with self._lock:
+            fichas, atualizado_em = self._buckets.get(chave, (float(capacidade), agora))
+            fichas = min(float(capacidade), fichas + (agora - atualizado_em) * taxa)
+            if fichas >= 1:
+                fichas -= 1
+                espera = 0.0
+            else:
+                espera = (1 - fichas) / taxa
+            self._buckets[chave] = (fichas, agora)
+            self._buckets.move_to_end(chave)
+            while len(self._buckets) > self.max_chaves:
+                self._buckets.popitem(last=False)
+            return espera
+
+
+def _carregar_backend() -> BackendLimites:
+    caminho = os.getenv("LOGIN_THROTTLE_BACKEND")
+    if not caminho:
+        return BackendMemoria()
+    modulo, _, classe = caminho.partition(":")
+    logger.info("Usando backend de limites de login '%s'.", caminho)
+    return getattr(importlib.import_module(modulo), classe)()
+
+
+backend: BackendLimites = _carregar_backend()
+_verificacoes = threading.BoundedSemaphore(LOGIN_MAX_VERIFICACOES)
+
+# Contadores de admissão deste processo
+_contadores_lock = threading.Lock()
+contadores: Dict[str, int] = {"admitidos": 0, "recusados_usuario": 0, "recusados_ip": 0, "recusados_concorrencia": 0}
+
+
+def _contar(nome: str) -> None:
+    with _contadores_lock:
+        contadores[nome] += 1
+
+
+def _recusar(motivo: str, espera: float) -> HTTPException:
+    _contar(f"recusados_{motivo}")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Muitas tentativas de login. Tente novamente em instantes.",
+        headers={"Retry-After": str(max(1, int(espera + 0.999)))},
+    )
+
+
+def _confiavel(ip: str) -> bool:
+    try:
+        endereco = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(endereco in rede for rede in PROXIES_CONFIAVEIS)
+
+
+def ip_cliente(request: Request) -> str:
+    """
+    IP de origem do login: o da conexão ou, se ela vem de um proxy confiável, o último
+    endereço do X-Forwarded-For que não é de um proxy confiável (os anteriores podem ter
+    sido forjados pelo cliente).
+    """
+    ip = request.client.host if request.client else "desconhecido"
+    if not _confiavel(ip):
+        return ip
+    encaminhados = [e.strip() for e in request.headers.get("x-forwarded-for", "").split(",") if e.strip()]
+    for encaminhado in reversed(encaminhados):
+        if not _confiavel(encaminhado):
+            return encaminhado
+    return encaminhados[0] if encaminhados else ip
+
+
+async def controlar_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    """
+    Dependência do /auth/token: aplica os buckets por IP e por username e reserva uma vaga
+    de verificação de senha durante o login. Lança 429 (com Retry-After) se passar do limite.
+    """
+    ip = ip_cliente(request)
+    if LOGIN_LIMITE_IP > 0:
+        espera = backend.consumir(f"login:ip:{ip}", LOGIN_LIMITE_IP, LOGIN_JANELA_IP)
+        if espera:
+            logger.warning("Login recusado por limite de IP: %s", ip)
+            raise _recusar("ip", espera)
+    espera = backend.consumir(f"login:usuario:{form_data.username.strip().lower()}", LOGIN_LIMITE_USUARIO, LOGIN_JANELA_USUARIO)
+    if espera:
+        logger.warning("Login recusado por limite de username: %s (IP %s)", form_data.username, ip)
+        raise _recusar("usuario", espera)
+    if not _verificacoes.acquire(blocking=False):
+        logger.warning("Login recusado: %s verificações de senha já em andamento.", LOGIN_MAX_VERIFICACOES)
+        raise _recusar("concorrencia", 1)
+    _contar("admitidos")
+    try:
+        yield
+    finally:
+        _verificacoes.release()
+
+
+def estatisticas() -> dict:
+    """Limites configurados e contadores de admissão do login neste processo."""
+    with _contadores_lock:
+        return {
+            "pid": os.getpid(),
+            "backend": type(backend).__name__,
+            "limite_usuario": LOGIN_LIMITE_USUARIO,
+            "janela_usuario": LOGIN_JANELA_USUARIO,
+            "limite_ip": LOGIN_LIMITE_IP,
+            "janela_ip": LOGIN_JANELA_IP,
+            "proxies_confiaveis": [str(rede) for rede in PROXIES_CONFIAVEIS],
+            "max_verificacoes": LOGIN_MAX_VERIFICACOES,
+            **contadores,
+        }
@@ -0,0 +1,31 @@
+"""
+Configuração do gunicorn (lida automaticamente do diretório de trabalho).
+
+Prepara o modo multiprocesso do prometheus_client: os workers gravam as métricas em
+PROMETHEUS_MULTIPROC_DIR e o /metrics de qualquer worker soma todos (ver app/metrics.py).
+Opções passadas na linha de comando têm precedência sobre as daqui.
+"""
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Definido aqui, antes do fork e de qualquer import do prometheus_client (que escolhe o tipo
+# de armazenamento das métricas ao ser importado), para que os workers já nasçam em modo
+# multiprocesso. Por isso o master só importa o prometheus_client dentro de child_exit.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/bibliodex_metricas")
+
+
+def on_starting(server):
+    # Arquivos de uma execução anterior somariam métricas de workers que não existem mais
+    diretorio = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Tira o worker encerrado dos gauges "livesum" (em andamento, pools, caches)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
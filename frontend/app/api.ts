@@ -326,7 +326,11 @@ const api = {
 // Exemplo de função para buscar livros paginados/filtrados
 export interface PaginatedLivros {
   total: number;
+  total_exato?: boolean;
   items: LivroRead[];
+  next_cursor?: string | null;
+  prev_cursor?: string | null;
+  sugestoes?: string[];
 }
 
 export async function fetchLivros(params: {
@@ -340,6 +344,10 @@ export async function fetchLivros(params: {
   ano_publicacao?: number;
   sort_by?: string;
   sort_dir?: string;
+  cursor?: string;
+  q?: string;
+  similaridade?: number;
+  contagem?: "auto" | "exata" | "estimada";
 }): Promise<{ data: PaginatedLivros }> {
   // Remove parâmetros undefined antes de enviar
   const cleanParams = Object.fromEntries(
@@ -348,6 +356,38 @@ export async function fetchLivros(params: {
   return api.get<PaginatedLivros>("/livros", cleanParams);
 }
 
+export interface FacetaValor {
+  valor: number | string | null;
+  rotulo?: string | null;
+  total: number;
+}
+
+export interface FacetasLivros {
+  total: number;
+  total_exato: boolean;
+  categoria: FacetaValor[];
+  editora: FacetaValor[];
+  ano_publicacao: FacetaValor[];
+}
+
+// Contagens por categoria / editora / ano para os mesmos filtros de fetchLivros
+export async function fetchLivroFacetas(params: {
+  titulo?: string;
+  autor?: string;
+  categoria_id?: number;
+  isbn?: string;
+  editora?: string;
+  ano_publicacao?: number;
+  q?: string;
+  similaridade?: number;
+  limite?: number;
+}): Promise<{ data: FacetasLivros }> {
+  const cleanParams = Object.fromEntries(
+    Object.entries(params).filter(([_, v]) => v !== undefined && v !== null)
+  );
+  return api.get<FacetasLivros>("/livros/facetas", cleanParams);
+}
+
 // Função para buscar detalhes de um livro específico (com exemplares)
 export async function fetchLivroDetalhes(id_livro: string | number) {
   return api.get(`/livros/${id_livro}`);
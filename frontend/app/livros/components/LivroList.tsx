@@ -12,6 +12,12 @@ interface LivroListProps {
   abrirModalReserva: (livro: any) => void; // nova prop
 }
 
+// A listagem traz os contadores do livro (a lista de exemplares não vem mais preenchida)
+function temExemplarDisponivel(livro: any): boolean {
+  if (typeof livro.exemplares_disponiveis === "number") return livro.exemplares_disponiveis > 0;
+  return Array.isArray(livro.exemplares) && livro.exemplares.some((ex: any) => ex.status === "disponivel");
+}
+
 export default function LivroList({ livros, isAuthenticated, abrirModalEmprestimo, abrirModalReserva }: LivroListProps) {
   const { user } = useAuth();
 
@@ -115,21 +121,19 @@ export default function LivroList({ livros, isAuthenticated, abrirModalEmprestim
                 <button
                   className={
                     (String(livro.status_geral).trim().toLowerCase() === "descatalogado" ||
-                      !Array.isArray(livro.exemplares) ||
-                      !livro.exemplares.some((ex: any) => ex.status === "disponivel"))
+                      !temExemplarDisponivel(livro))
                       ? "px-3 py-1 bg-blue-300 text-gray-700 rounded w-fit cursor-not-allowed opacity-60"
                       : "px-3 py-1 bg-blue-700 text-white rounded hover:bg-blue-800 w-fit"
                   }
                   onClick={() => abrirModalEmprestimo(livro)}
                   disabled={
                     String(livro.status_geral).trim().toLowerCase() === "descatalogado" ||
-                    !Array.isArray(livro.exemplares) ||
-                    !livro.exemplares.some((ex: any) => ex.status === "disponivel")
+                    !temExemplarDisponivel(livro)
                   }
                   title={
                     String(livro.status_geral).trim().toLowerCase() === "descatalogado"
                       ? "Não é permitido emprestar livros descatalogados."
-                      : !Array.isArray(livro.exemplares) || !livro.exemplares.some((ex: any) => ex.status === "disponivel")
+                      : !temExemplarDisponivel(livro)
                         ? "Não há exemplares disponíveis para empréstimo."
                         : undefined
                   }
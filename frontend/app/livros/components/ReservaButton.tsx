@@ -11,12 +11,13 @@ export default function ReservaButton({ livro, statusLivro, abrirModalReserva }:
   const podeReservar = status === "ativo" || status === "indisponivel";
   const desabilitado = !podeReservar;
 
-  // Desabilita o botão se todos os exemplares disponíveis estão reservados
-  const todosReservados = Array.isArray(livro.exemplares)
-    ? livro.exemplares.every((ex: any) => Array.isArray(ex.status)
+  // Desabilita o botão se não há exemplar que possa ser reservado. Com os contadores da
+  // listagem, só se sabe que não há exemplares; os já reservados são recusados pelo backend.
+  const todosReservados = typeof livro.total_exemplares === "number"
+    ? livro.total_exemplares === 0
+    : Array.isArray(livro.exemplares) && livro.exemplares.length > 0 && livro.exemplares.every((ex: any) => Array.isArray(ex.status)
         ? ex.status.includes('reservado')
-        : ex.status === 'reservado')
-    : false;
+        : ex.status === 'reservado');
 
   if (!isAuthenticated) return null;
   if (desabilitado || todosReservados) return (
@@ -34,7 +35,7 @@ export default function ReservaButton({ livro, statusLivro, abrirModalReserva }:
       }
       onClick={() => abrirModalReserva(livro)}
       disabled={todosReservados}
-      title={todosReservados ? "Todos os exemplares deste livro já estão reservados." : undefined}
+      title={todosReservados ? "Não há exemplares deste livro disponíveis para reserva." : undefined}
     >
       Reservar
     </button>
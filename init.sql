@@ -17,6 +17,8 @@ CREATE TABLE IF NOT EXISTS livro (
     ano_publicacao INTEGER,
     status_geral VARCHAR, -- Status geral do título, ex: ativo, descatalogado
     id_categoria INTEGER NOT NULL,
+    total_exemplares INTEGER NOT NULL DEFAULT 0,
+    exemplares_disponiveis INTEGER NOT NULL DEFAULT 0,
     CONSTRAINT fk_categoria
         FOREIGN KEY(id_categoria)
         REFERENCES categoria(id_categoria)
@@ -27,6 +29,15 @@ COMMENT ON COLUMN livro.status_geral IS 'Status geral do título, ex: ativo, des
 COMMENT ON COLUMN livro.edicao IS 'Edição do livro, ex: 1ª, 2ª, revisada';
 COMMENT ON COLUMN livro.editora IS 'Editora do livro';
 COMMENT ON COLUMN livro.isbn IS 'ISBN do livro';
+COMMENT ON COLUMN livro.total_exemplares IS 'Quantidade de exemplares do livro. Mantido pela aplicação na mesma transação de cada operação.';
+COMMENT ON COLUMN livro.exemplares_disponiveis IS 'Quantidade de exemplares sem empréstimo ativo nem reserva ativa. Mantido pela aplicação.';
+
+-- Índices para paginação por keyset: (coluna de ordenação, id_livro)
+CREATE INDEX IF NOT EXISTS idx_livro_titulo_id ON livro (titulo, id_livro);
+CREATE INDEX IF NOT EXISTS idx_livro_editora_id ON livro (editora, id_livro);
+CREATE INDEX IF NOT EXISTS idx_livro_ano_publicacao_id ON livro (ano_publicacao, id_livro);
+CREATE INDEX IF NOT EXISTS idx_livro_edicao_id ON livro (edicao, id_livro);
+CREATE INDEX IF NOT EXISTS idx_livro_isbn_id ON livro (isbn, id_livro);
 
 -- Tabela: autor
 CREATE TABLE IF NOT EXISTS autor (
@@ -50,6 +61,8 @@ CREATE TABLE IF NOT EXISTS escrito_por (
         REFERENCES livro(id_livro)
         ON DELETE CASCADE
 );
+-- A PK (id_autor, id_livro) atende "livros do autor X"; o índice inverso atende a checagem por livro
+CREATE INDEX IF NOT EXISTS idx_escrito_por_livro_autor ON escrito_por (id_livro, id_autor);
 COMMENT ON TABLE escrito_por IS 'Tabela de associação entre autores e livros (muitos-para-muitos).';
 
 -- Tabela: curso
@@ -106,6 +119,8 @@ COMMENT ON TABLE exemplar IS 'Tabela para armazenar os exemplares físicos dos l
 COMMENT ON COLUMN exemplar.codigo_identificacao IS 'Código único do exemplar, ex: código de barras';
 COMMENT ON COLUMN exemplar.status IS 'Status: disponivel, emprestado, reservado, em_manutencao, perdido, descartado';
 COMMENT ON COLUMN exemplar.localizacao IS 'Localização física do exemplar na biblioteca.';
+-- Exemplares de um livro por status (ex.: disponíveis do livro X)
+CREATE INDEX IF NOT EXISTS idx_exemplar_livro_status ON exemplar (id_livro, status);
 
 -- Tabela: emprestimo
 CREATE TABLE IF NOT EXISTS emprestimo (
@@ -132,6 +147,12 @@ CREATE TABLE IF NOT EXISTS emprestimo (
 );
 COMMENT ON TABLE emprestimo IS 'Tabela para registrar os empréstimos de exemplares.';
 COMMENT ON COLUMN emprestimo.status_emprestimo IS 'Status: ativo, devolvido, atrasado';
+-- Empréstimo ativo de cada exemplar (data prevista de devolução nas listagens de exemplares)
+CREATE INDEX IF NOT EXISTS idx_emprestimo_ativo_tombo ON emprestimo (numero_tombo, data_prevista_devolucao DESC)
+    WHERE status_emprestimo = 'ativo';
+-- No máximo um empréstimo ativo por exemplar (garantia contra empréstimo duplo)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_emprestimo_ativo_exemplar ON emprestimo (numero_tombo)
+    WHERE status_emprestimo = 'ativo';
 
 -- Tabela: reserva
 CREATE TABLE IF NOT EXISTS reserva (
@@ -157,6 +178,9 @@ CREATE TABLE IF NOT EXISTS reserva (
 );
 COMMENT ON TABLE reserva IS 'Tabela para registrar as reservas de livros/exemplares.';
 COMMENT ON COLUMN reserva.status IS 'Status: ativa, cancelada, expirada, atendida';
+-- Fila de reservas ativas de cada exemplar (ordem de atendimento: data_reserva, id_reserva)
+CREATE INDEX IF NOT EXISTS idx_reserva_ativa_tombo ON reserva (numero_tombo, data_reserva, id_reserva)
+    WHERE status = 'ativa';
 
 -- Tabela: devolucao
 CREATE TABLE IF NOT EXISTS devolucao (
@@ -200,6 +224,82 @@ COMMENT ON TABLE penalidade IS 'Tabela para registrar penalidades aplicadas aos
 COMMENT ON COLUMN penalidade.tipo_penalidade IS 'Ex: multa, suspensao';
 COMMENT ON COLUMN penalidade.status IS 'Status: ativa, paga, cumprida, cancelada';
 
+-- Busca full-text de livros (GET /livros?q=): stemming em português, sem acentos
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    END IF;
+END $$;
+
+ALTER TABLE livro ADD COLUMN IF NOT EXISTS busca_vector TSVECTOR;
+COMMENT ON COLUMN livro.busca_vector IS 'Documento full-text de título (peso A), autores (B) e editora (C). Mantido por triggers.';
+
+-- Documento de busca de um livro: título, nomes dos autores e editora
+CREATE OR REPLACE FUNCTION livro_documento_busca(p_id_livro INTEGER, p_titulo VARCHAR, p_editora VARCHAR)
+RETURNS TSVECTOR LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('portuguese_unaccent', coalesce(p_titulo, '')), 'A')
+        || setweight(to_tsvector('portuguese_unaccent', coalesce((
+               SELECT string_agg(a.nome, ' ')
+               FROM escrito_por ep JOIN autor a ON a.id_autor = ep.id_autor
+               WHERE ep.id_livro = p_id_livro
+           ), '')), 'B')
+        || setweight(to_tsvector('portuguese_unaccent', coalesce(p_editora, '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION livro_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.busca_vector := livro_documento_busca(NEW.id_livro, NEW.titulo, NEW.editora);
+    RETURN NEW;
+END $$;
+
+CREATE OR REPLACE FUNCTION escrito_por_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE livro SET busca_vector = livro_documento_busca(id_livro, titulo, editora) WHERE id_livro = OLD.id_livro;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE livro SET busca_vector = livro_documento_busca(id_livro, titulo, editora) WHERE id_livro = NEW.id_livro;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION autor_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE livro l SET busca_vector = livro_documento_busca(l.id_livro, l.titulo, l.editora)
+    FROM escrito_por ep
+    WHERE ep.id_autor = NEW.id_autor AND ep.id_livro = l.id_livro;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_livro_busca_vector ON livro;
+CREATE TRIGGER trg_livro_busca_vector
+    BEFORE INSERT OR UPDATE OF titulo, editora ON livro
+    FOR EACH ROW EXECUTE FUNCTION livro_busca_vector_trigger();
+
+DROP TRIGGER IF EXISTS trg_escrito_por_busca_vector ON escrito_por;
+CREATE TRIGGER trg_escrito_por_busca_vector
+    AFTER INSERT OR UPDATE OR DELETE ON escrito_por
+    FOR EACH ROW EXECUTE FUNCTION escrito_por_busca_vector_trigger();
+
+DROP TRIGGER IF EXISTS trg_autor_busca_vector ON autor;
+CREATE TRIGGER trg_autor_busca_vector
+    AFTER UPDATE OF nome ON autor
+    FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+    EXECUTE FUNCTION autor_busca_vector_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_livro_busca_vector ON livro USING GIN (busca_vector);
+
+-- Busca por substring (ILIKE '%termo%') e tolerante a erros (operador %>) via trigramas
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_livro_titulo_trgm ON livro USING GIN (titulo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_livro_editora_trgm ON livro USING GIN (editora gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_autor_nome_trgm ON autor USING GIN (nome gin_trgm_ops);
+
 -- Índices customizados (descomente para versão otimizada)
 -- CREATE INDEX IF NOT EXISTS idx_livro_id_livro ON livro(id_livro);
 -- CREATE INDEX IF NOT EXISTS idx_autor_id_autor ON autor(id_autor);
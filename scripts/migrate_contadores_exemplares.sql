@@ -0,0 +1,44 @@
+-- Migração: contadores de exemplares por livro (livro.total_exemplares e livro.exemplares_disponiveis).
+-- A aplicação mantém os contadores na mesma transação de empréstimos, devoluções, reservas e
+-- criação/exclusão de exemplares; este script cria as colunas e recalcula os valores a partir
+-- de exemplar.status (preenchido por scripts/migrate_exemplar_status.sql, que deve rodar antes).
+-- Também serve para recalcular depois de cargas feitas direto no banco (scripts/populate_*.py),
+-- que não passam pela aplicação.
+-- Rode fora de uma transação explícita (psql -f): o recálculo faz COMMIT a cada lote.
+
+ALTER TABLE livro ADD COLUMN IF NOT EXISTS total_exemplares INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE livro ADD COLUMN IF NOT EXISTS exemplares_disponiveis INTEGER NOT NULL DEFAULT 0;
+COMMENT ON COLUMN livro.total_exemplares IS 'Quantidade de exemplares do livro. Mantido pela aplicação na mesma transação de cada operação.';
+COMMENT ON COLUMN livro.exemplares_disponiveis IS 'Quantidade de exemplares sem empréstimo ativo nem reserva ativa. Mantido pela aplicação.';
+
+-- Recálculo em lotes de id_livro a partir de exemplar.status
+DO $$
+DECLARE
+    v_inicio INTEGER := 0;
+    v_max INTEGER;
+    v_lote CONSTANT INTEGER := 50000;
+BEGIN
+    SELECT coalesce(max(id_livro), 0) INTO v_max FROM livro;
+    WHILE v_inicio <= v_max LOOP
+        UPDATE livro l
+        SET total_exemplares = coalesce(c.total, 0),
+            exemplares_disponiveis = coalesce(c.disponiveis, 0)
+        FROM livro l2
+        LEFT JOIN (
+            SELECT ex.id_livro,
+                   count(*) AS total,
+                   count(*) FILTER (WHERE ex.status = 'disponivel') AS disponiveis
+            FROM exemplar ex
+            WHERE ex.id_livro > v_inicio AND ex.id_livro <= v_inicio + v_lote
+            GROUP BY ex.id_livro
+        ) c ON c.id_livro = l2.id_livro
+        WHERE l.id_livro = l2.id_livro
+          AND l2.id_livro > v_inicio AND l2.id_livro <= v_inicio + v_lote
+          AND (l.total_exemplares, l.exemplares_disponiveis)
+              IS DISTINCT FROM (coalesce(c.total, 0), coalesce(c.disponiveis, 0));
+        COMMIT;
+        v_inicio := v_inicio + v_lote;
+    END LOOP;
+END $$;
+
+ANALYZE livro;
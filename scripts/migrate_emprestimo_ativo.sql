@@ -0,0 +1,10 @@
+-- Migração: índice parcial dos empréstimos ativos por exemplar.
+-- Atende o DISTINCT ON (numero_tombo) ... ORDER BY numero_tombo, data_prevista_devolucao DESC
+-- das listagens de exemplares (GET /exemplares e GET /livros/{id}/exemplares).
+-- CONCURRENTLY: rode fora de uma transação explícita.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_emprestimo_ativo_tombo
+    ON emprestimo (numero_tombo, data_prevista_devolucao DESC)
+    WHERE status_emprestimo = 'ativo';
+
+ANALYZE emprestimo;
@@ -0,0 +1,14 @@
+-- Migração: no máximo um empréstimo ativo por exemplar.
+-- Antes de criar o índice, confira se há exemplares com mais de um empréstimo ativo
+-- (a criação falha se houver); corrija-os encerrando os empréstimos indevidos.
+-- CONCURRENTLY: rode fora de uma transação explícita.
+
+SELECT numero_tombo, count(*) AS emprestimos_ativos
+FROM emprestimo
+WHERE status_emprestimo = 'ativo'
+GROUP BY numero_tombo
+HAVING count(*) > 1;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_emprestimo_ativo_exemplar
+    ON emprestimo (numero_tombo)
+    WHERE status_emprestimo = 'ativo';
@@ -0,0 +1,9 @@
+-- Migração: índice (id_livro, id_autor) em escrito_por.
+-- A PK (id_autor, id_livro) já atende "livros do autor X". O filtro de autor de GET /livros
+-- é um EXISTS em escrito_por por livro, e quando a página segue um índice de ordenação
+-- (ex.: idx_livro_titulo_id) o planejador checa livro a livro: isso pede id_livro à esquerda.
+-- CONCURRENTLY: rode fora de uma transação explícita.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_escrito_por_livro_autor ON escrito_por (id_livro, id_autor);
+
+ANALYZE escrito_por;
@@ -0,0 +1,44 @@
+-- Migração: exemplar.status passa a ser a fonte de verdade do status do exemplar.
+-- Até aqui a aplicação derivava o status de empréstimos e reservas e a coluna não era
+-- atualizada. Este script recalcula a coluna em lotes (empréstimo ativo -> 'emprestado',
+-- reserva ativa -> 'reservado'; 'em_manutencao', 'perdido' e 'descartado' são mantidos;
+-- o resto vira 'disponivel') e cria o índice (id_livro, status).
+-- Rode fora de uma transação explícita (psql -f) e depois rode
+-- scripts/migrate_contadores_exemplares.sql para recalcular os contadores dos livros.
+
+DO $$
+DECLARE
+    v_inicio INTEGER := 0;
+    v_max INTEGER;
+    v_lote CONSTANT INTEGER := 50000;
+BEGIN
+    SELECT coalesce(max(numero_tombo), 0) INTO v_max FROM exemplar;
+    WHILE v_inicio <= v_max LOOP
+        UPDATE exemplar ex
+        SET status = s.novo_status
+        FROM (
+            SELECT e2.numero_tombo,
+                   CASE
+                       WHEN EXISTS (SELECT 1 FROM emprestimo em
+                                    WHERE em.numero_tombo = e2.numero_tombo AND em.status_emprestimo = 'ativo')
+                           THEN 'emprestado'
+                       WHEN EXISTS (SELECT 1 FROM reserva r
+                                    WHERE r.numero_tombo = e2.numero_tombo AND r.status = 'ativa')
+                           THEN 'reservado'
+                       WHEN e2.status IN ('em_manutencao', 'perdido', 'descartado')
+                           THEN e2.status
+                       ELSE 'disponivel'
+                   END AS novo_status
+            FROM exemplar e2
+            WHERE e2.numero_tombo > v_inicio AND e2.numero_tombo <= v_inicio + v_lote
+        ) s
+        WHERE ex.numero_tombo = s.numero_tombo
+          AND ex.status IS DISTINCT FROM s.novo_status;
+        COMMIT;
+        v_inicio := v_inicio + v_lote;
+    END LOOP;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exemplar_livro_status ON exemplar (id_livro, status);
+
+ANALYZE exemplar;
@@ -0,0 +1,92 @@
+-- Migração: busca full-text de livros (GET /livros?q=).
+-- Cria a configuração portuguese_unaccent, a coluna livro.busca_vector, os triggers que a
+-- mantêm (livro, escrito_por e autor), preenche as linhas existentes em lotes e cria o
+-- índice GIN. Rode fora de uma transação explícita (psql -f): o preenchimento faz COMMIT
+-- a cada lote e o índice é criado com CONCURRENTLY.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    END IF;
+END $$;
+
+ALTER TABLE livro ADD COLUMN IF NOT EXISTS busca_vector TSVECTOR;
+COMMENT ON COLUMN livro.busca_vector IS 'Documento full-text de título (peso A), autores (B) e editora (C). Mantido por triggers.';
+
+-- Documento de busca de um livro: título, nomes dos autores e editora
+CREATE OR REPLACE FUNCTION livro_documento_busca(p_id_livro INTEGER, p_titulo VARCHAR, p_editora VARCHAR)
+RETURNS TSVECTOR LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('portuguese_unaccent', coalesce(p_titulo, '')), 'A')
+        || setweight(to_tsvector('portuguese_unaccent', coalesce((
+               SELECT string_agg(a.nome, ' ')
+               FROM escrito_por ep JOIN autor a ON a.id_autor = ep.id_autor
+               WHERE ep.id_livro = p_id_livro
+           ), '')), 'B')
+        || setweight(to_tsvector('portuguese_unaccent', coalesce(p_editora, '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION livro_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.busca_vector := livro_documento_busca(NEW.id_livro, NEW.titulo, NEW.editora);
+    RETURN NEW;
+END $$;
+
+CREATE OR REPLACE FUNCTION escrito_por_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE livro SET busca_vector = livro_documento_busca(id_livro, titulo, editora) WHERE id_livro = OLD.id_livro;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE livro SET busca_vector = livro_documento_busca(id_livro, titulo, editora) WHERE id_livro = NEW.id_livro;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION autor_busca_vector_trigger() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE livro l SET busca_vector = livro_documento_busca(l.id_livro, l.titulo, l.editora)
+    FROM escrito_por ep
+    WHERE ep.id_autor = NEW.id_autor AND ep.id_livro = l.id_livro;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_livro_busca_vector ON livro;
+CREATE TRIGGER trg_livro_busca_vector
+    BEFORE INSERT OR UPDATE OF titulo, editora ON livro
+    FOR EACH ROW EXECUTE FUNCTION livro_busca_vector_trigger();
+
+DROP TRIGGER IF EXISTS trg_escrito_por_busca_vector ON escrito_por;
+CREATE TRIGGER trg_escrito_por_busca_vector
+    AFTER INSERT OR UPDATE OR DELETE ON escrito_por
+    FOR EACH ROW EXECUTE FUNCTION escrito_por_busca_vector_trigger();
+
+DROP TRIGGER IF EXISTS trg_autor_busca_vector ON autor;
+CREATE TRIGGER trg_autor_busca_vector
+    AFTER UPDATE OF nome ON autor
+    FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+    EXECUTE FUNCTION autor_busca_vector_trigger();
+
+-- Preenchimento em lotes de id_livro para não segurar uma transação longa sobre ~25M linhas
+DO $$
+DECLARE
+    v_inicio INTEGER := 0;
+    v_max INTEGER;
+    v_lote CONSTANT INTEGER := 50000;
+BEGIN
+    SELECT coalesce(max(id_livro), 0) INTO v_max FROM livro;
+    WHILE v_inicio <= v_max LOOP
+        UPDATE livro SET busca_vector = livro_documento_busca(id_livro, titulo, editora)
+        WHERE id_livro > v_inicio AND id_livro <= v_inicio + v_lote;
+        COMMIT;
+        v_inicio := v_inicio + v_lote;
+    END LOOP;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_busca_vector ON livro USING GIN (busca_vector);
+
+ANALYZE livro;
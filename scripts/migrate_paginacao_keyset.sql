@@ -0,0 +1,12 @@
+-- Migração: índices para a paginação por keyset de GET /livros.
+-- Cada índice cobre (coluna de ordenação, id_livro), a mesma tupla codificada no cursor.
+-- CONCURRENTLY evita bloquear escritas na tabela livro (~25M linhas) durante a criação;
+-- por isso este script não pode rodar dentro de uma transação.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_titulo_id ON livro (titulo, id_livro);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_editora_id ON livro (editora, id_livro);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_ano_publicacao_id ON livro (ano_publicacao, id_livro);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_edicao_id ON livro (edicao, id_livro);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_isbn_id ON livro (isbn, id_livro);
+
+ANALYZE livro;
@@ -0,0 +1,11 @@
+-- Migração: índice parcial das reservas ativas por exemplar.
+-- Atende a escolha do exemplar ao reservar por id_livro (NOT EXISTS de reserva ativa),
+-- a verificação de reserva no checkout e a fila de reservas na devolução
+-- (ORDER BY data_reserva, id_reserva).
+-- CONCURRENTLY: rode fora de uma transação explícita.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reserva_ativa_tombo
+    ON reserva (numero_tombo, data_reserva, id_reserva)
+    WHERE status = 'ativa';
+
+ANALYZE reserva;
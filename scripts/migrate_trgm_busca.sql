@@ -0,0 +1,13 @@
+-- Migração: índices de trigramas (pg_trgm) para as buscas de GET /livros e GET /autores.
+-- Atendem tanto ILIKE '%termo%' (substring) quanto o operador %> (similaridade de palavra,
+-- usado quando o parâmetro `similaridade` é informado) e as sugestões "você quis dizer".
+-- CONCURRENTLY não bloqueia escritas; rode fora de uma transação explícita (psql -f).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_titulo_trgm ON livro USING GIN (titulo gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_livro_editora_trgm ON livro USING GIN (editora gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_autor_nome_trgm ON autor USING GIN (nome gin_trgm_ops);
+
+ANALYZE livro;
+ANALYZE autor;
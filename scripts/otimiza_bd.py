@@ -79,8 +79,8 @@ CREATE INDEX IF NOT EXISTS idx_livro_editora ON livro (editora);
 """)
 conn.commit()
 
-# Observação: Em um cenário real, com títulos variados e buscas por palavras-chave,
-# um índice Full-Text Search (GIN) seria mais adequado para acelerar buscas textuais.
+# Observação: buscas por palavras-chave usam o índice Full-Text Search (GIN) de
+# livro.busca_vector, criado por scripts/migrate_fts_livro.sql (GET /livros?q=).
 
 
 
@@ -45,6 +45,8 @@ def main():
 
     today = date.today()
     total_inserted = 0
+    # uq_emprestimo_ativo_exemplar: no máximo um empréstimo ativo por exemplar
+    tombos_com_emprestimo_ativo = set()
 
     for offset in range(0, LOAN_COUNT, BATCH_SIZE):
         batch = []
@@ -56,31 +58,34 @@ def main():
             prazo = random.randint(7, MAX_LOAN_DAYS)
             data_prevista_devolucao = data_retirada + timedelta(days=prazo)
 
-            # Define data_efetiva_devolucao (75% devolvido, 25% pendente)
-            if random.random() < 0.75:
+            usuario_id     = random.choice(usuarios)
+            numero_tombo   = random.choice(exemplares)
+            funcionario_id = random.choice(funcionarios)
+
+            # Define data_efetiva_devolucao (75% devolvido, 25% pendente; devolvido se o exemplar já tem empréstimo ativo)
+            if random.random() < 0.75 or numero_tombo in tombos_com_emprestimo_ativo:
                 days = random.randint(1, prazo)
                 data_efetiva_devolucao = data_retirada + timedelta(days=days)
                 if data_efetiva_devolucao > today:
                     data_efetiva_devolucao = today
+                status_emprestimo = "devolvido"
             else:
                 data_efetiva_devolucao = None
+                status_emprestimo = "ativo"
+                tombos_com_emprestimo_ativo.add(numero_tombo)
 
-            usuario_id     = random.choice(usuarios)
-            numero_tombo   = random.choice(exemplares)
-            funcionario_id = random.choice(funcionarios)
-
-            batch.append((data_retirada, data_prevista_devolucao, data_efetiva_devolucao,
+            batch.append((data_retirada, data_prevista_devolucao, data_efetiva_devolucao, status_emprestimo,
                           usuario_id, numero_tombo, funcionario_id))
 
         execute_values(
             cur,
             """
             INSERT INTO emprestimo
-              (data_retirada, data_prevista_devolucao, data_efetiva_devolucao, id_usuario, numero_tombo, id_funcionario_registro)
+              (data_retirada, data_prevista_devolucao, data_efetiva_devolucao, status_emprestimo, id_usuario, numero_tombo, id_funcionario_registro)
             VALUES %s
             """,
             batch,
-            template="(%s, %s, %s, %s, %s, %s)"
+            template="(%s, %s, %s, %s, %s, %s, %s)"
         )
         conn.commit()
         total_inserted = upper
@@ -89,6 +94,7 @@ def main():
     cur.close()
     conn.close()
     print("População de empréstimos concluída.")
+    print("Recalcule status e contadores com scripts/migrate_exemplar_status.sql e scripts/migrate_contadores_exemplares.sql")
 
 if __name__ == "__main__":
     main()
@@ -60,6 +60,7 @@ def main():
     cur.close()
     conn.close()
     print(f"População de exemplares concluída. Total inserido: {total}")
+    print("Recalcule status e contadores com scripts/migrate_exemplar_status.sql e scripts/migrate_contadores_exemplares.sql")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+"""
+Teste de estresse da circulação concorrente (checkout, reserva e devolução).
+
+Para cada exemplar disponível escolhido, várias threads (cada uma com a sua sessão, como
+workers diferentes) tentam ao mesmo tempo emprestar o exemplar a usuários diferentes e
+reservá-lo; depois outras threads tentam devolver o mesmo empréstimo ao mesmo tempo.
+Ao final confere no banco que:
+  - cada exemplar teve no máximo um empréstimo e uma reserva aceitos, e uma só devolução;
+  - nenhum exemplar tem mais de um empréstimo ativo;
+  - exemplar.status e livro.exemplares_disponiveis batem com empréstimos e reservas.
+
+ATENÇÃO: grava empréstimos, reservas e devoluções reais; use um banco de teste.
+Uso (no diretório backend/): DATABASE_URL=... python ../scripts/stress_emprestimo_concorrente.py
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi import HTTPException  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.crud.crud_emprestimo import create_emprestimo  # noqa: E402
+from app.crud.crud_reserva import create_reserva  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.services.circulacao import registrar_devolucao  # noqa: E402
+
+# ────── CONFIGURAÇÃO ──────
+EXEMPLARES = int(os.getenv("STRESS_EXEMPLARES", "20"))   # Exemplares disputados
+CONCORRENTES = int(os.getenv("STRESS_CONCORRENTES", "8"))  # Threads por exemplar em cada fase
+
+
+def em_paralelo(tarefas):
+    """Executa as tarefas em threads liberadas juntas por uma barreira; devolve os resultados."""
+    barreira = threading.Barrier(len(tarefas))
+    resultados = [None] * len(tarefas)
+
+    def rodar(i, tarefa):
+        db = SessionLocal()
+        try:
+            barreira.wait()
+            resultados[i] = ("ok", tarefa(db))
+        except HTTPException as e:
+            db.rollback()
+            resultados[i] = ("recusado", e.detail)
+        except Exception as e:  # Erros inesperados (deadlock, violação de índice) reprovam o teste
+            db.rollback()
+            resultados[i] = ("erro", repr(e))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=rodar, args=(i, t)) for i, t in enumerate(tarefas)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return resultados
+
+
+def main():
+    db = SessionLocal()
+    tombos = [t for (t,) in db.query(models.Exemplar.numero_tombo).join(models.Livro).filter(
+        models.Exemplar.status == "disponivel",
+        models.Livro.status_geral != "descatalogado"
+    ).order_by(models.Exemplar.numero_tombo).limit(EXEMPLARES)]
+    usuarios = [u for (u,) in db.query(models.Usuario.id_usuario).filter(
+        models.Usuario.is_active.is_(True)
+    ).limit(CONCORRENTES * 2)]
+    funcionario = db.query(models.Funcionario.id_funcionario).filter(models.Funcionario.is_active.is_(True)).scalar()
+    db.close()
+    if len(tombos) < EXEMPLARES or len(usuarios) < CONCORRENTES * 2 or funcionario is None:
+        print("Dados insuficientes: rode os scripts populate_* antes.")
+        return 1
+
+    hoje = date.today()
+    falhas = []
+
+    # Fase 1: checkouts e reservas simultâneos do mesmo exemplar
+    for tombo in tombos:
+        tarefas = [
+            (lambda db, u=u: create_emprestimo(db, schemas.EmprestimoCreate(
+                data_retirada=hoje, data_prevista_devolucao=hoje + timedelta(days=14),
+                id_usuario=u, numero_tombo=tombo, id_funcionario_registro=funcionario
+            )).id_emprestimo)
+            for u in usuarios[:CONCORRENTES]
+        ] + [
+            (lambda db, u=u: create_reserva(db, schemas.ReservaCreate(
+                data_reserva=hoje, id_usuario=u, numero_tombo=tombo
+            )).id_reserva)
+            for u in usuarios[CONCORRENTES:CONCORRENTES * 2]
+        ]
+        resultados = em_paralelo(tarefas)
+        emprestimos = [r for tipo, r in resultados[:CONCORRENTES] if tipo == "ok"]
+        reservas = [r for tipo, r in resultados[CONCORRENTES:] if tipo == "ok"]
+        erros = [r for tipo, r in resultados if tipo == "erro"]
+        # Vence um checkout; ou uma reserva chega antes e todos os checkouts são recusados.
+        # Reservas de usuários diferentes sobre o mesmo exemplar: no máximo uma ativa.
+        if len(emprestimos) > 1 or len(reservas) > 1 or not (emprestimos or reservas) or erros:
+            falhas.append(f"Exemplar {tombo}: {len(emprestimos)} empréstimos e {len(reservas)} reservas aceitos, erros: {erros}")
+            continue
+        if not emprestimos:
+            continue
+
+        # Fase 2: devoluções simultâneas do mesmo empréstimo
+        resultados = em_paralelo([
+            (lambda db: registrar_devolucao(db, schemas.DevolucaoCreate(
+                data_devolucao=hoje, id_emprestimo=emprestimos[0], id_funcionario_registro=funcionario
+            )).id_devolucao)
+            for _ in range(CONCORRENTES)
+        ])
+        contagem = Counter(tipo for tipo, _ in resultados)
+        if contagem["ok"] != 1 or contagem["erro"]:
+            falhas.append(f"Exemplar {tombo}: {contagem['ok']} devoluções aceitas, erros: {[r for t, r in resultados if t == 'erro']}")
+
+    # Conferência final no banco
+    with SessionLocal() as db:
+        duplicados = db.execute(text(
+            "SELECT numero_tombo FROM emprestimo WHERE status_emprestimo = 'ativo' "
+            "GROUP BY numero_tombo HAVING count(*) > 1"
+        )).scalars().all()
+        if duplicados:
+            falhas.append(f"Exemplares com mais de um empréstimo ativo: {duplicados}")
+        divergentes = db.execute(text("""
+            SELECT e.numero_tombo, e.status FROM exemplar e
+            WHERE e.numero_tombo = ANY(:tombos) AND e.status <> CASE
+                WHEN EXISTS (SELECT 1 FROM emprestimo em WHERE em.numero_tombo = e.numero_tombo AND em.status_emprestimo = 'ativo') THEN 'emprestado'
+                WHEN EXISTS (SELECT 1 FROM reserva r WHERE r.numero_tombo = e.numero_tombo AND r.status = 'ativa') THEN 'reservado'
+                ELSE 'disponivel' END
+        """), {"tombos": tombos}).all()
+        if divergentes:
+            falhas.append(f"Status divergente: {divergentes}")
+        contadores = db.execute(text("""
+            SELECT l.id_livro, l.exemplares_disponiveis, count(e.*) FILTER (WHERE e.status = 'disponivel')
+            FROM livro l JOIN exemplar e ON e.id_livro = l.id_livro
+            WHERE l.id_livro IN (SELECT id_livro FROM exemplar WHERE numero_tombo = ANY(:tombos))
+            GROUP BY l.id_livro, l.exemplares_disponiveis
+            HAVING l.exemplares_disponiveis <> count(e.*) FILTER (WHERE e.status = 'disponivel')
+        """), {"tombos": tombos}).all()
+        if contadores:
+            falhas.append(f"Contadores divergentes (id_livro, contador, real): {contadores}")
+
+    if falhas:
+        print("FALHOU:")
+        for falha in falhas:
+            print(f"  - {falha}")
+        return 1
+    print(f"OK: {len(tombos)} exemplares disputados por {CONCORRENTES} checkouts e {CONCORRENTES} reservas cada, sem empréstimo duplo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())